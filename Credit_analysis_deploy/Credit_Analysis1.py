@@ -2,171 +2,84 @@ import streamlit as st
 import pandas as pd
 from collections import defaultdict
 import re
+import io
 import pdfplumber
-import docx 
-import fitz  # PyMuPDF
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from risk_core.instrumentation import timed, stage, record, start_request, finish_request, render_debug_panel
+from risk_core.docx_stream import extract_docx_text
+from risk_core.pdf_cache import pdf_text, password_candidates
+from risk_core.uploads import upload_digest, upload_source, upload_text
+from risk_core.document import Document, as_document
+from risk_core.workers import run_job
+from risk_core.crb_pages import CRB_ANCHORS
+from risk_core.rendering import show_text, show_table
+from risk_core.crb_accounts import parse_accounts, LoanIntervals
+from risk_core.features import document_fingerprint, features_for_document
+from risk_core.rules import categorize, scorecard, current_rules
+from risk_core.policy import evaluate as evaluate_policy
+from risk_core.parsers import mpesa_from_text, mpesa_ledger, bank_from_text, summarize, extract_crb_data as parse_crb
+from risk_core.counterparties import CounterpartyGraph
+from risk_core.applicants import crb_identifiers, bank_identifiers, mpesa_identifiers, match_applicants, consolidate
+from risk_core.assessment_cache import upload_fingerprint, assessment_key, load_assessment, save_assessment
 
 st.set_page_config(page_title="Risk Assessment Tool", layout="centered")
 st.title("Risk Assessment Tool")
+start_request("credit_analysis1")
 
 # FILE TEXT EXTRACTOR 
-def extract_text(file, password=None):
+@timed()
+def extract_text(file, password=None, candidates=(), sections=None):
+    record(bytes=file.size)
     if file.type == "application/pdf":
         try:
-            file_bytes = file.read()
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            if doc.needs_pass and (not password or not doc.authenticate(password)):
-                raise ValueError("PDF is encrypted and password is missing or incorrect.")
+            with upload_source(file) as source:
+                extracted_text, pages = run_job(pdf_text, source, password, tuple(candidates), sections,
+                                                digest=upload_digest(file))
+            record(pages=pages)
             #return "\n".join(page.get_text() for page in doc)
-            extracted_text = "\n".join(page.get_text() for page in doc)
         except Exception as e:
             st.error(f"Failed to extract text from PDF: {e}")
             return ""
     elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        doc = docx.Document(file)
-        #return "\n".join(p.text for p in doc.paragraphs)
-        extracted_text = "\n".join(p.text for p in doc.paragraphs)
+        with upload_source(file) as source:
+            extracted_text = run_job(extract_docx_text, source)
     else:
         #return file.read().decode("utf-8")
-        extracted_text = file.read().decode("utf-8")
+        extracted_text = upload_text(file)
 
-    name_match = re.search(r"REPORTED NAMES:\s*(.*)", extracted_text)
-    customer_name = name_match.group(1).strip() if name_match else None
-    return extracted_text #customer_name
+    return Document(extracted_text)
 
 # M-PESA SECTION 
 import re
 
 def categorize_mpesa(details):
-    text = details.lower().strip()
-
-    # Define category patterns
-    fuel_keywords = r"(fuel|petroleum|gas|diesel|oil|petrol|shell|totalenergies|petrol|rubis|Ola Energy|Energies|Kobil|KenolKobil|Astrol|Lake oil)"
-    shopping_keywords = r"(supermarket|quickmart|naivas|chandarana|kaluu foods|nguku wholesalers|Clean Shelf|Magunas|tuskys|carrefour)"
-    utility_keywords = r"(kplc|electric|prepaid|expressway|water)"
-    airtime_keywords = r"\bairtime\b|\bbundle\b"
-    betting_keywords = r"(betika|sportpesa|odibet|jackpot)"
-    paybill_keywords = r"(pay bill|paybill)"
-    buy_goods_keywords = r"(buy goods|merchant payment|till)"
-    agent_keywords = r"(withdraw|agent)"
-    salary_keywords = r"\bpayment from\b"#r"(salary payment|business payment|equity bulk|kopo kopo)"
-    loan_keywords = r"(mpesa overdraw|od loan repayment)"
-    watucredit_keywords = r"\bwatu credit\b"
-    platinumcredit_keywords = r"\bplatinum\b"
-    mogocredit_keywords = r"\bmogo\b"
-    momentumcredit_keywords = r"\bmomentum\b"
-
-    # Match categories by priority
-    if re.search(fuel_keywords, text):
-        return "Fuel"
-    if re.search(shopping_keywords, text):
-        return "Shopping"
-    if re.search(utility_keywords, text):
-        return "Utilities"
-    if re.search(airtime_keywords, text):
-        return "Airtime/Data"
-    if re.search(betting_keywords, text):
-        return "Betting"
-    if re.search(paybill_keywords, text):
-        return "Pay Bill"
-    if re.search(buy_goods_keywords, text):
-        return "Buy Goods"
-    if re.search(agent_keywords, text):
-        return "Agent Withdrawal"
-    if re.search(salary_keywords, text):
-        return "Income"
-    if re.search(loan_keywords, text):
-        return "Loan Repayment"
-    if re.search(watucredit_keywords, text):
-        return "WatuCredit"
-    if re.search(momentumcredit_keywords, text):
-        return "MomentumCredit"
-    if re.search(platinumcredit_keywords, text):
-        return "PlatinumCredit"
-    if re.search(mogocredit_keywords, text):
-        return "MogoCredit"
-    else:
-        return "Other"
-
+    return categorize("credit_analysis1", details)
 
+@timed()
 def process_mpesa(text):
-    lines = text.split('\n')
-    transactions = []
-
-    for i, line in enumerate(lines):
-        if "Completed" in line:
-            match = re.search(r'Completed[\s-]*(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))', line)
-            if not match and i + 1 < len(lines):
-                match = re.search(r'(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))', lines[i + 1])
-
-            if match:
-                amount_str = match.group(1).replace(",", "")
-                try:
-                    amount = float(amount_str)
-                    Details = (line + " " + lines[i + 1]) if i + 1 < len(lines) else line
-                    base_category = categorize_mpesa(Details)
-
-                    #details_lines = [line]
-                    #for j in range(1, 20):  # You can increase the range if needed
-                    #    if i + j < len(lines):
-                    #       details_lines.append(lines[i + j])
-                    #Details = " ".join(details_lines)
-
-                    details_lines = [line]
-                    for j in range(1, len(lines) - i):
-                        if "Completed" in lines[i + j]:  # Stop if next transaction starts
-                            break
-                        details_lines.append(lines[i + j])
-                    Details = " ".join(details_lines)
-
-                    base_category = categorize_mpesa(Details)
-
-                    # Determine inflow/outflow
-                    direction = "Inflow" if amount > 0 else "Outflow"
-
-                    category = base_category
-
-                    if category == "Other":
-                        category = f"Other ({direction})"
-                    # Specific overrides for loan disbursement vs repayment
-                    #if base_category == "Loan":
-                    #    category = "Loan Repayment" if amount > 0 else "Loan Disbursement"
-                    #elif base_category == "Other":
-                    #    category = "Other (Inflow)" if amount > 0 else "Other (Outflow)"
-                    #else:
-                    #    category = base_category
-
-                    transactions.append({
-                        "Details": Details.strip(),
-                        "Amount": abs(amount),
-                        "Inflow/Outflow": direction,
-                        "Category": category
-                    })
-                except ValueError:
-                    continue
-
-    if not transactions:
+    df = mpesa_from_text(text, "credit_analysis1")
+    if df is None:
         return None, None
-
-    df = pd.DataFrame(transactions)
-
-    # Group and summarize properly
-    summary = df.groupby("Category")["Amount"].sum().reset_index()
-    #summary = df.groupby("Category")["Amount"].sum(), count=("Amount", "count").reset_index()
-    #summary = df.groupby("Category").size().reset_index(name="Count")
-    #total_count = summary["count"].sum()
-    total = df["Amount"].sum()
-    #summary["Percentage"] = (summary["Amount"] / total * 100).round(2)
-    summary["Count"] = df.groupby("Category")["Amount"].count().values
-
-    return df, summary
+    return df, summarize(df)
+
+# Who the money comes from and goes to: concentrated inflows and money sent out that comes back
+@timed()
+def analyse_counterparties(text):
+    ledger = mpesa_ledger(text)
+    graph = CounterpartyGraph.from_ledgers({"applicant": ledger})
+    if not len(graph):
+        return None
+    return {"concentration": graph.inflow_concentration().iloc[0].to_dict(),
+            "round_trips": graph.round_trips(window_days=30),
+            "counterparties": graph.counterparties_of("applicant")}
 
 #Bank Statements
 def extract_bank(text):
-    # Remove multiple blank lines to ensure consistency
-    text = re.sub(r'\n\s*\n+', '\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)  # Replace tabs/multiple spaces with a single space
-    text = text.strip()  # Remove leading/trailing whitespace
+    # Blank lines removed, tabs/multiple spaces as a single space (shared with the other parsers)
+    text = as_document(text).normalized
 
     # Extract account holder name
     name_match = re.search(r'Account Holder Name:\s*(.*)', text)
@@ -180,23 +93,6 @@ def extract_bank(text):
     bank_name_match = re.search(r'Bank Name:\s*(.*)', text)
     bank_name = bank_name_match.group(1).strip() if bank_name_match else "N/A"
     # Extract bank branch branch_name_match = re.search(r'Branch Name:\s*(.*)', text)
-    if bank_file:
-        bank_text = extract_text(bank_file, password=pdf_password)
-    
-    with st.expander("View Extracted Bank Text"):
-        st.write(bank_text)
-
-    bank_summary_info = extract_bank(bank_text)
-    st.subheader("Bank Summary Info")
-    st.json(bank_summary_info)
-
-    bank_df, bank_summary = process_bank(bank_text)
-    if bank_summary is not None:
-        st.subheader("Bank Transaction Analysis")
-        st.dataframe(bank_summary)
-        st.bar_chart(bank_summary.set_index("Category")["Count"])
-    else:
-        st.warning("No valid bank transactions found.")
 
     return {
         "Account Holder Name": account_holder_name,
@@ -204,149 +100,18 @@ def extract_bank(text):
         "Bank Name": bank_name
     }
 
+@timed()
 def process_bank(text):
-    lines = text.split('\n')
-    transactions = []
-    
-    for line in lines:
-        line = line.strip()
-        # Example pattern: "12/07/2025 POS Naivas -2,500.00"
-        match = re.search(r'(\d{1,2}/\d{1,2}/\d{2,4})\s+(.+?)\s+(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))', line)
-        if match:
-            date_str, details, amount_str = match.groups()
-            try:
-                amount = float(amount_str.replace(",", ""))
-                direction = "Inflow" if amount > 0 else "Outflow"
-                category = categorize_mpesa(details)  # Reusing M-PESA logic
-
-                if category == "Other":
-                    category = f"Other ({direction})"
-
-                transactions.append({
-                    "Date": date_str,
-                    "Details": details.strip(),
-                    "Amount": abs(amount),
-                    "Inflow/Outflow": direction,
-                    "Category": category
-                })
-            except:
-                continue
-
-    if not transactions:
+    # Reuses the M-PESA categories
+    df = bank_from_text(text, "credit_analysis1")
+    if df is None:
         return None, None
-
-    df = pd.DataFrame(transactions)
-    summary = df.groupby("Category")["Amount"].sum().reset_index()
-    summary["Count"] = df.groupby("Category")["Amount"].count().values
-
-    return df, summary
+    return df, summarize(df)
 
 # CRB SECTION 
+@timed()
 def extract_crb_data(text):
-    # Remove multiple blank lines to ensure consistency
-    text = re.sub(r'\n\s*\n+', '\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)  # Replace tabs/multiple spaces with a single space
-    text = text.strip()  # Remove leading/trailing whitespace
-
-
-    name_match = re.search(r'REPORTED NAMES:\s+(.*)', text)
-    id_match = re.search(r'NATIONAL ID\s+:\s+(\d+)', text)
-    #phone_match = re.search(r'Phone Number\(s\)[^\n]*\n\s*([\d, ]+)', text)
-    #email_match = re.search(r'Email Address[^\n]*\n\s*([^\s]+@[^\s]+)', text)
-
-    bio_data = {
-        "Name": name_match.group(1).strip() if name_match else None,
-        "National ID": id_match.group(1).strip() if id_match else "N/A",
-        #"Phone Number(s)": phone_match.group(1).strip() if phone_match else "N/A",
-        #"Email": email_match.group(1).strip() if email_match else "N/A",
-    }
-    pattern = r"\n\s*(\d+)\s*\n\s*(M\d)\s*\n\s*(\d+\s?%)"
-    #pattern = r"Metro-Score©\s*(\d+)\s+PPI©\s*(M\d)\s+Probability Of Default©\s*(\d+\s?%)"
-    #matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-
-    #pattern = r"Metro-Score©[\s\S]*?(\d+)[\s\S]*?PPI©[\s\S]*?(M\d)[\s\S]*?Probability Of Default©[\s\S]*?(\d+\s?%)"
-    matches = re.findall(pattern, text, re.IGNORECASE| re.DOTALL)
-
-    #for match in matches:
-    #    print("Found block:", match)
-    #breakpoint()
-
-    if matches:
-        metro, ppi, pd = matches[0]
-    else:
-        #metro = re.search(r'Metro-Score©\s+(\d+)', text)
-        #ppi = re.search(r'PPI©\s+(M\d)', text)
-        #pd = re.search(r'Probability Of Default©\s+(\d+\s?%)', text)
-
-        #metro = int(metro.group(1)) if metro else None
-        #ppi = ppi.group(1) if ppi else None
-        #pd = pd.group(1).strip() if pd else None
-        metro = re.search(r'Metro-Score©\s*\n*\s*(\d+)', text)
-        ppi = re.search(r'PPI©\s*\n*\s*(M\d)', text)
-        pd = re.search(r'Probability Of Default©\s*\n*\s*(\d+\s?%)', text)
-
-        metro = metro.group(1) if metro else None
-        ppi = ppi.group(1) if ppi else None
-        pd = pd.group(1).strip() if pd else None
-
-    credit_scores = {
-        "Metro-Score": int(metro) if isinstance(metro, str) and metro.isdigit() else metro,
-        "PPI": ppi,
-        "Probability of Default": pd,
-        "Interpretation": ""
-    }
-    #credit_scores = {
-     #   "Metro-Score": int(metro.group(1)) if metro else "N/A",
-      #  "PPI": ppi.group(1) if ppi else "N/A",
-       # "Probability of Default": pd.group(1).strip() if pd else "N/A",
-        #"Interpretation": ""
-    #}
-
-    metro_val = int(metro) if metro else None
-    #ppi_val = ppi.group(1) if ppi else None
-    ppi_val = ppi
-    if metro_val:
-        if metro_val < 400:
-            credit_scores["Interpretation"] += "High Risk: Credit score indicates possible defaults.\n"
-        elif metro_val < 600:
-            credit_scores["Interpretation"] += "Medium Risk: Caution advised.\n"
-        else:
-            credit_scores["Interpretation"] += "Low Risk: Good credit standing.\n"
-    if ppi_val:
-        if ppi_val in ["M1", "M2"]:
-            credit_scores["Interpretation"] += "Probable positive repayment behavior."
-        elif ppi_val in ["M3", "M4", "M5"]:
-            credit_scores["Interpretation"] += "Watch for occasional delays."
-        else:
-            credit_scores["Interpretation"] += "Probable Poor repayment trend."
-
-    emp_match = re.search(r'Employer\s*:\s*(.*)', text, re.IGNORECASE)
-    salary_match = re.search(r'Salary\s*:\s*K?([\d,]+)', text, re.IGNORECASE)
-    dept_match = re.search(r'Department\s*:\s*(.*)', text, re.IGNORECASE)
-
-    employment = {
-        "Employer": emp_match.group(1).strip() if emp_match else "N/A",
-        "Salary": salary_match.group(1).replace(",", "") if salary_match else "N/A",
-        "Department": dept_match.group(1).strip() if dept_match else "N/A"
-    }
-
-    account_match = re.search(r'Total\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)', text)
-    balance_match = re.search(r'Total Outstanding Balance\s*\n\s*Total Accounts\s*\n\s*([\d,]+\.\d+)', text)
-    balance_val = balance_match.group(1) if balance_match else "0.00"
-    account_summary = {
-        "Total Accounts": int(account_match.group(1)) if account_match else 0,
-        "Non-Performing Accounts": int(account_match.group(2)) if account_match else 0,
-        "Performing Accounts With Default History": int(account_match.group(3)) if account_match else 0,
-        "Performing Accounts Without Default History": int(account_match.group(4)) if account_match else 0,
-        "Total Outstanding Balance": float(balance_val.replace(",", "")) if balance_val else 0.0
-    }
-
-    return {
-        "Bio Data": bio_data,
-        "Employment": employment,
-        "Credit Scores": credit_scores,
-        "Account Summary": account_summary
-    }
+    return parse_crb(text, style="credit_analysis")
 
 #def extract_crb_scores(text):
 #    metro = re.search(r'Metro-Score©\s+(\d+)', text, re.IGNORECASE)
@@ -372,37 +137,167 @@ bank_file = st.file_uploader("Upload Bank Statement", type=["txt", "pdf", "docx"
 
 st.info("If your file is encrypted, enter the password below.")
 pdf_password = st.text_input("Enter PDF Password (optional):", type="password")
-
-
-# Process M-PESA
-if mpesa_file:
-    mpesa_text = extract_text(mpesa_file, password=pdf_password)
-    st.expander("View Extracted M-PESA Text").write(mpesa_text)  # Optional debug
-    mpesa_df, mpesa_summary = process_mpesa(mpesa_text)
-
-    if mpesa_summary is not None:
-        st.subheader("M-PESA Expense Analysis")
-        st.dataframe(mpesa_summary)
-        st.bar_chart(mpesa_summary.set_index("Category")["Count"])
-    else:
-        st.warning("No valid M-PESA transactions found.")
-
-# Process CRB
+password_hints = st.text_input("Applicant ID or phone number (tried as the PDF password, optional):")
+password_guesses = password_candidates(password_hints)
+
+
+# Reopening a reviewed application reuses the stored results instead of parsing again
+with stage("assessment_lookup"):
+    assessment_id = assessment_key(*(upload_fingerprint(f, password=pdf_password, candidates=password_guesses)
+                                     for f in (mpesa_file, crb_file, bank_file)))
+    assessment = load_assessment(assessment_id)
+    record(hits=int(assessment is not None))
+reviewed = assessment is not None
+if reviewed:
+    st.caption("Loaded the saved assessment for these documents.")
+else:
+    assessment = {}
+# Which uploads produced text; saved assessments keep what was derived from them, not the text
+extracted = {}
+
+# Process CRB first: its score block can settle the application before the statements are parsed
 if crb_file:
-    crb_text = extract_text(crb_file, password=pdf_password)
-    crb_summary = extract_crb_data(crb_text)
+    if reviewed:
+        crb_summary, crb_identity = assessment["crb_summary"], assessment["crb_identity"]
+    else:
+        crb_text = extract_text(crb_file, password=pdf_password, candidates=password_guesses, sections=CRB_ANCHORS)
+        crb_summary = extract_crb_data(crb_text)
+        crb_identity = crb_identifiers("CRB Report", crb_summary, crb_text)
+        extracted["crb"] = bool(crb_text)
+        assessment.update(crb_summary=crb_summary, crb_identity=crb_identity)
     #crb_scores = extract_crb_scores(crb_text)
     #crb_scores = crb_summary["Credit Scores"]
 
     st.subheader("CRB Summary")
     st.json(crb_summary)
 
+    # Account history is only read when asked for; the summary above needs just the first pages
+    if st.checkbox("Show CRB account history", key="crb_accounts"):
+        with stage("crb_accounts"):
+            crb_accounts = run_job(parse_accounts, extract_text(crb_file, password=pdf_password, candidates=password_guesses))
+            loans = LoanIntervals(crb_accounts)
+        if len(loans):
+            today = pd.Timestamp.today().to_datetime64().astype("datetime64[D]")
+            st.write(f"**Open Loans Today:** {int(loans.open_at(today))}")
+            st.write(f"**Open Exposure (Principal):** KSh {float(loans.exposure_at(today)):,.2f}")
+            st.write(f"**Loans Opened in the Last 90 Days:** {int(loans.opened_during(today - 90, today))}")
+        show_table(crb_accounts, key="crb_accounts_table")
+
     #st.text_area("CRB Report Text", crb_text, height=300)
     #st.subheader("Credit Risk Scores")
     #st.json(crb_scores)
 
-#if bank_file:
-    bank_text = extract_text(bank_file, password=pdf_password) 
-    bank_summary = extract_bank(bank_text)
+# Policy knock-outs on the CRB scores: a declined application's statements are only parsed on request
+scores = crb_summary["Credit Scores"] if crb_file else {}
+crb_inputs = {"metro_score": scores.get("Metro-Score"), "ppi": scores.get("PPI"),
+              "probability_of_default": scores.get("Probability of Default")}
+policy = evaluate_policy(current_rules().policy, crb_inputs).iloc[0]
+statements_deferred = False
+if policy["declined"]:
+    st.error("**Declined by Policy:** " + "; ".join(policy["reasons"]))
+    if not reviewed and (mpesa_file or bank_file):
+        statements_deferred = not st.checkbox("Analyse the statements anyway", key="analyse_declined")
+        record(statements_deferred=int(statements_deferred))
+
+# Process M-PESA
+if mpesa_file and not statements_deferred:
+    if reviewed:
+        mpesa_summary, mpesa_flows = assessment["mpesa_summary"], assessment.get("mpesa_flows")
+        mpesa_identity = assessment["mpesa_identity"]
+    else:
+        mpesa_text = extract_text(mpesa_file, password=pdf_password, candidates=password_guesses)
+        mpesa_df, mpesa_summary = process_mpesa(mpesa_text)
+        mpesa_flows = analyse_counterparties(mpesa_text)
+        mpesa_identity = mpesa_identifiers("M-PESA Statement", mpesa_text)
+        extracted["mpesa"] = bool(mpesa_text)
+        assessment.update(mpesa_summary=mpesa_summary, mpesa_flows=mpesa_flows, mpesa_identity=mpesa_identity)
+        show_text(mpesa_text, "View Extracted M-PESA Text")  # Optional debug
+
+    if mpesa_summary is not None:
+        with stage("render_mpesa"):
+            st.subheader("M-PESA Expense Analysis")
+            st.dataframe(mpesa_summary)
+            st.bar_chart(mpesa_summary.set_index("Category")["Count"])
+    else:
+        st.warning("No valid M-PESA transactions found.")
+
+    if mpesa_flows is not None:
+        st.subheader("Counterparties")
+        concentration, round_trips = mpesa_flows["concentration"], mpesa_flows["round_trips"]
+        st.write(f"**Inflow from the Top 3 Senders:** {concentration['top_share']:.0%} of "
+                 f"KSh {concentration['inflow']:,.2f} ({int(concentration['senders'])} senders)")
+        if len(round_trips):
+            st.warning(f"{len(round_trips)} payments came back from the same counterparty within 30 days "
+                       f"(KSh {round_trips['returned'].sum():,.2f}). Check for money sent out to inflate inflows.")
+            st.dataframe(round_trips.drop(columns="applicant"))
+        show_table(mpesa_flows["counterparties"], key="mpesa_counterparties")
+
+# Process Bank
+if bank_file and not statements_deferred:
+    if reviewed:
+        bank_summary_info = assessment["bank_summary_info"]
+        bank_summary, bank_features = assessment["bank_summary"], assessment["bank_features"]
+    else:
+        bank_text = extract_text(bank_file, password=pdf_password, candidates=password_guesses)
+        extracted["bank"] = bool(bank_text)
+        bank_summary_info = extract_bank(bank_text)
+        bank_df, bank_summary = process_bank(bank_text)
+        bank_features = None
+        if bank_summary is not None:
+            with stage("cashflow_features"):
+                bank_features = features_for_document(document_fingerprint(bank_text), bank_df)
+        assessment.update(bank_summary_info=bank_summary_info, bank_summary=bank_summary,
+                          bank_features=bank_features)
+        show_text(bank_text, "View Extracted Bank Text")
+
     st.subheader("Bank Statement Summary")
-    st.json(bank_summary)
+    st.json(bank_summary_info)
+
+    if bank_summary is not None:
+        with stage("render_bank"):
+            st.subheader("Bank Transaction Analysis")
+            st.dataframe(bank_summary)
+            st.bar_chart(bank_summary.set_index("Category")["Count"])
+
+        st.subheader("Cash-Flow Features")
+        st.dataframe(pd.Series(bank_features, name="Value"))
+    else:
+        st.warning("No valid bank transactions found.")
+
+# Risk grade from the CRB scores and the bank cash-flow features
+if crb_file or bank_file:
+    inputs = dict(crb_inputs)
+    if bank_file and not statements_deferred and bank_features:
+        inputs.update(bank_features)
+    with stage("scorecard"):
+        result = scorecard("application").score(inputs).iloc[0]
+    st.subheader("Risk Grade")
+    st.write(f"**{result['grade']}** (score {result['score']:.0f}, scorecard version {result['scorecard_version']})")
+    st.dataframe(result.filter(like="points_").rename(lambda c: c.removeprefix("points_")).rename("Points"))
+    if not policy["declined"] and pd.notna(policy["limit"]):
+        st.info(f"**Policy Cap:** KSh {policy['limit']:,.0f} ({'; '.join(policy['reasons'])})")
+
+# Applicant: do the uploaded documents belong to one person?
+documents = []
+if mpesa_file and not statements_deferred:
+    documents.append(mpesa_identity)
+if crb_file:
+    documents.append(crb_identity)
+if bank_file and not statements_deferred:
+    documents.append(bank_identifiers("Bank Statement", bank_summary_info))
+if len(documents) > 1:
+    with stage("match_applicants", documents=len(documents)):
+        applicants = consolidate(match_applicants(documents))
+    st.subheader("Applicant")
+    if len(applicants) == 1:
+        st.success(f"All documents belong to {applicants['name'].iloc[0] or 'the same applicant'}.")
+    else:
+        st.warning("The documents don't all match one applicant. Check that they belong to the same person.")
+    st.dataframe(applicants)
+
+# Only keep assessments where every uploaded document produced text
+if not reviewed and all(extracted.get(kind) for file, kind in ((mpesa_file, "mpesa"), (crb_file, "crb"),
+                                                               (bank_file, "bank")) if file):
+    save_assessment(assessment_id, assessment)
+
+render_debug_panel(finish_request())
@@ -1,163 +1,108 @@
 import streamlit as st
 import pandas as pd
 import re
-import fitz  # PyMuPDF
-import docx
+import io
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from risk_core.instrumentation import timed, stage, record, start_request, finish_request, render_debug_panel
+from risk_core.docx_stream import extract_docx_text
+from risk_core.pdf_cache import pdf_text, span_text, password_candidates
+from risk_core.uploads import upload_digest, upload_source, upload_text
+from risk_core.document import Document
+from risk_core.workers import run_job
+from risk_core.rules import categorize
+from risk_core.parsers import mpesa_from_text, bank_from_blocks, summarize
+from risk_core.reconcile import reconcile
 
 #st.set_page_config(page_title="Universal Statement Analyzer", layout="centered")
 #st.title("Universal M-PESA & Bank Statement Analyzer")
+start_request("statement_analyzer")
 
 #  TEXT EXTRACTOR 
-def extract_text(file, password=None):
+@timed()
+def extract_text(file, password=None, candidates=()):
+    record(bytes=file.size)
     try:
         if file.type == "application/pdf":
-            file_bytes = file.read()
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            if doc.needs_pass and (not password or not doc.authenticate(password)):
-                raise ValueError("PDF is encrypted and password is missing or incorrect.")
-            return "\n".join(page.get_text() for page in doc)
+            with upload_source(file) as source:
+                text, pages = run_job(pdf_text, source, password, tuple(candidates), digest=upload_digest(file))
+            record(pages=pages)
+            return Document(text)
 
         elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            docx_file = docx.Document(file)
-            return "\n".join(p.text for p in docx_file.paragraphs)
+            with upload_source(file) as source:
+                return Document(run_job(extract_docx_text, source))
 
         else:
-            return file.read().decode("utf-8")
+            return Document(upload_text(file))
 
     except Exception as e:
         st.error(f"Error extracting text from {file.name}: {e}")
-        return ""
+        return Document("")
 
 #  CATEGORIZATION LOGIC 
 def categorize_mpesa(details):
-    text = details.lower().strip()
-    patterns = {
-        "Fuel": r"\b(fuel|petroleum|gas|diesel|oil|petrol|rubis|shell|totalenergies)\b",
-        "Shopping": r"(supermarket|quickmart|naivas|chandarana|magunas|carrefour)",
-        "Utilities": r"(kplc|electric|prepaid|expressway|water)",
-        "Airtime/Data": r"\bairtime\b|\bbundle\b",
-        "Betting": r"(betika|sportpesa|odibet|jackpot)",
-        "Pay Bill": r"(pay bill|paybill)",
-        "Buy Goods": r"(buy goods|merchant payment|till)",
-        "Agent Withdrawal": r"(withdraw|agent)",
-        "Income": r"\bpayment from\b|salary|salarie|inward payment",
-        "Loan Repayment": r"(od loan repayment|overdraw)",
-        "Credit": r"(watu credit|kopo kopo|kcb m-pesa|momentum|lin cap|mogo)"
-    }
-
-    for category, pattern in patterns.items():
-        if re.search(pattern, text):
-            return category
-    return "Other"
+    return categorize("statement_analyzer", details)
 
 #  M-PESA PROCESSOR 
+@timed()
 def process_mpesa(text):
-    lines = text.split('\n')
-    transactions = []
-
-    for i, line in enumerate(lines):
-        if "Completed" in line:
-            match = re.search(r'Completed[\s-]*(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))', line)
-            if not match and i + 1 < len(lines):
-                match = re.search(r'(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))', lines[i + 1])
-
-            if match:
-                try:
-                    amount = float(match.group(1).replace(",", ""))
-                    details_lines = [line]
-                    for j in range(1, len(lines) - i):
-                        if "Completed" in lines[i + j]:
-                            break
-                        details_lines.append(lines[i + j])
-                    details = " ".join(details_lines).strip()
-                    direction = "Inflow" if amount > 0 else "Outflow"
-                    category = categorize_mpesa(details)
-                    if category == "Other":
-                        category = f"Other ({direction})"
-
-                    transactions.append({
-                        "Details": details,
-                        "Amount": abs(amount),
-                        "Inflow/Outflow": direction,
-                        "Category": category
-                    })
-                except:
-                    continue
-
-    if not transactions:
+    df = mpesa_from_text(text, "statement_analyzer")
+    if df is None:
         return None, None
-
-    df = pd.DataFrame(transactions)
-    summary = df.groupby("Category")["Amount"].sum().reset_index()
-    summary["Count"] = df.groupby("Category")["Amount"].count().values
-    return df, summary
+    return df, summarize(df)
 
 #  BANK PROCESSOR 
+@timed()
 def process_bank(text):
-    lines = text.splitlines()
-    transactions = []
-    i = 0
-
-    while i < len(lines) - 1:
-        line = lines[i].strip()
-        if re.match(r"\d{2}/\d{2}/\d{4}", line):
-            date = line
-            narration_lines = []
-            j = i + 1
-            while j < len(lines):
-                amt_line = lines[j].strip()
-                amt_match = re.match(r"\d{2}/\d{2}/\d{4}\s+(-?[\d,]+\.\d{2})\s+[\d,.]+[CD]R\s+[\d,.]+[CD]R", amt_line)
-                if amt_match:
-                    try:
-                        amount = float(amt_match.group(1).replace(",", ""))
-                        direction = "Inflow" if amount > 0 else "Outflow"
-                        narration = " ".join(narration_lines).strip()
-                        category = categorize_mpesa(narration)
-                        if category == "Other":
-                            category = f"Other ({direction})"
-                        transactions.append({
-                            "Date": date,
-                            "Details": narration,
-                            "Amount": abs(amount),
-                            "Inflow/Outflow": direction,
-                            "Category": category
-                        })
-                    except:
-                        pass
-                    i = j
-                    break
-                else:
-                    narration_lines.append(amt_line)
-                    j += 1
-        i += 1
-
-    if not transactions:
+    df = bank_from_blocks(text, "statement_analyzer")
+    if df is None:
         return None, None
-
-    df = pd.DataFrame(transactions)
-    summary = df.groupby("Category")["Amount"].sum().reset_index()
-    summary["Count"] = df.groupby("Category")["Amount"].count().values
-    return df, summary
+    return df, summarize(df)
+
+#  BALANCE CHECK 
+def span_reparser(file, parse, password=None, candidates=()):
+    """For a PDF, parse again just the pages between two printed balances."""
+    if file.type != "application/pdf":
+        return None
+
+    def reparse(anchors):
+        with upload_source(file) as source:
+            text, pages = run_job(span_text, source, anchors, password, tuple(candidates), digest=upload_digest(file))
+        record(reparsed_pages=len(pages))
+        return parse(text) if text else None
+    return reparse
+
+@timed()
+def check_balances(df, summary, reparse=None):
+    if df is None:
+        return df, summary, None
+    fixed, breaks = reconcile(df, reparse)
+    if fixed is not df:
+        summary = summarize(fixed)
+    return fixed, summary, breaks
 
 #  DOCUMENT CLASSIFIER 
-def extract_and_classify(file, password=None):
-    text = extract_text(file, password)
+def extract_and_classify(file, password=None, candidates=()):
+    text = extract_text(file, password, candidates)
     if "mpesa" in file.name.lower():
         doc_type = "mpesa"
-    elif "statement" in text.lower() or "ledger balance" in text.lower():
+    elif "statement" in text.folded or "ledger balance" in text.folded:
         doc_type = "bank"
     else:
         doc_type = "unknown"
     return {"filename": file.name, "text": text, "type": doc_type}
 
-def process_document(doc):
+def process_document(doc, reparse=None):
     text = doc["text"]
     if doc["type"] == "mpesa":
-        df, summary = process_mpesa(text)
-        return {"type": "mpesa", "df": df, "summary": summary}
+        df, summary, breaks = check_balances(*process_mpesa(text), reparse)
+        return {"type": "mpesa", "df": df, "summary": summary, "breaks": breaks}
     elif doc["type"] == "bank":
-        df, summary = process_bank(text)
-        return {"type": "bank", "df": df, "summary": summary}
+        df, summary, breaks = check_balances(*process_bank(text), reparse)
+        return {"type": "bank", "df": df, "summary": summary, "breaks": breaks}
     else:
         return {"type": "unknown", "error": "Document type not recognized."}
 
@@ -166,20 +111,35 @@ st.header("Upload Your M-PESA and Bank Statements")
 uploaded_files = st.file_uploader("Choose files", type=["pdf", "txt", "docx"], accept_multiple_files=True)
 
 pdf_password = st.text_input("Enter PDF password (if any):", type="password")
+password_hints = st.text_input("Applicant ID or phone number (tried as the PDF password, optional):")
+password_guesses = password_candidates(password_hints)
 
 if uploaded_files:
     for file in uploaded_files:
-        doc = extract_and_classify(file, password=pdf_password)
-        result = process_document(doc)
+        doc = extract_and_classify(file, password=pdf_password, candidates=password_guesses)
+        parse = {"mpesa": lambda t: mpesa_from_text(t, "statement_analyzer"),
+                 "bank": lambda t: bank_from_blocks(t, "statement_analyzer")}.get(doc["type"])
+        reparse = span_reparser(file, parse, pdf_password, password_guesses) if parse else None
+        result = process_document(doc, reparse)
 
         st.markdown(f"---\n### 📄 File: `{doc['filename']}`")
 
         if result["type"] in ["mpesa", "bank"]:
             st.write(f"**Detected Type**: {result['type'].upper()}")
             if result["summary"] is not None:
-                st.dataframe(result["summary"])
-                st.bar_chart(result["summary"].set_index("Category")["Count"])
+                with stage("render_summary"):
+                    st.dataframe(result["summary"])
+                    st.bar_chart(result["summary"].set_index("Category")["Count"])
+                breaks = result["breaks"]
+                if breaks.empty:
+                    st.caption("Running balances reconcile.")
+                else:
+                    st.warning(f"{len(breaks)} balance(s) don't follow from the previous balance and amount: "
+                               "transactions may be missing or misread.")
+                    st.dataframe(breaks)
             else:
                 st.warning("No transactions found.")
         else:
             st.warning(result.get("error", "Unable to process this file."))
+
+render_debug_panel(finish_request())
@@ -3,116 +3,87 @@ import pdfplumber
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
+import hashlib
 from io import StringIO
 from typing import Optional
-
-# ------------------------------
-# 1️⃣ FSV MATRIX
-# ------------------------------
-FSV_MATRIX = {
-    "POOL A": [
-        {"models": ["toyota"], "year_ranges": [(2004, 2007, 0.45), (2008, 2011, 0.50), (2012, 9999, 0.55)]},
-        {"models": ["mark x", "majesta", "crown"], "year_ranges": [(2007, 9999, 0.40)]},
-        {"models": ["suv"], "year_ranges": [(2012, 9999, 0.50)]},
-        {"models": ["lexus"], "year_ranges": [(2008, 9999, 0.50)]},
-        {"models": ["probox"], "year_ranges": [(2005, 2009, 0.40), (2010, 2013, 0.50), (2014, 9999, 0.55)]},
-        {"models": ["estima"], "year_ranges": [(2008, 9999, 0.40)]},
-        {"models": ["townace"], "year_ranges": [(2010, 9999, 0.50)]},
-        {"models": ["isis"], "year_ranges": [(2010, 9999, 0.50)]},
-        {"models": ["fielder", "premio", "allion", "harrier"], "year_ranges": [(2014, 9999, 0.70)]},
-        {"models": ["toyota other"], "year_ranges": [(2014, 9999, 0.60)]},
-        {"models": ["hilux", "landcruiser"], "year_ranges": [(2005, 2008, 0.40), (2009, 2012, 0.55), (2013, 9999, 0.55)]}
-    ],
-    "POOL B": [
-        {"models": ["nissan", "mazda", "subaru", "honda", "mitsubishi", "ford", "suzuki"], "year_ranges": [(2005, 2009, 0.40), (2010, 2013, 0.50), (2014, 9999, 0.55)]},
-        {"models": ["xtrail", "dualis","tiida", "march", "juke","murano","note","bluebird","serena","sylphy"], "year_ranges": [(2005, 2009, 0.40), (2010, 2013, 0.50), (2014, 9999, 0.55)]},
-        {"models": ["mazda cx5 diesel"], "year_ranges": [(2007, 2008, 0.35), (2009, 2011, 0.45), (2012, 9999, 0.50)]},
-        {"models": ["mazda premacy"], "year_ranges": [(2007, 9999, 0.40)]},
-        {"models": ["pathfinder", "civic", "colt", "mirage", "lancer", "navara", "teana", "patrol", "wingroad", "advan"], "year_ranges": [(2007, 9999, 0.40)]},
-        {"models": ["dmax isuzu"], "year_ranges": [(2006, 2009, 0.40), (2010, 2012, 0.50), (2013, 9999, 0.55)]},
-        {"models": ["ford ranger"], "year_ranges": [(2008, 2011, 0.40), (2012, 9999, 0.45)]}
-    ],
-    "POOL C": [
-        {"models": ["volkswagen"], "year_ranges": [(2009, 9999, 0.40)]},
-        {"models": ["audi", "bmw", "range rover", "land rover"], "year_ranges": [(2010, 9999, 0.40)]}
-    ],
-    "POOL D": [
-        {"models": ["canters mitsubishi", "canters isuzu", "canters tata", "canters dyna"], "year_ranges": [(2010, 9999, 0.40)]},
-        {"models": ["john deere", "masssey ferguson", "new holland"], "year_ranges": [(2010, 9999, 0.40)]}
-    ]
-}
-
+from risk_core.instrumentation import timed, stage, record, start_request, finish_request, render_debug_panel
+from risk_core.windows import InflowIndex, find_date, statement_period
+from risk_core.rules import categorize, current_rules, scorecard
+from risk_core.policy import evaluate as evaluate_policy
+from risk_core.parsers import mpesa_rows
+from risk_core.collateral import BOOK_COLUMNS, STRESS_PATHS, stress_test
+from risk_core.amortization import installment, max_affordable, schedule
 
 # ------------------------------
 # UTILITY FUNCTIONS
 # ------------------------------
 def categorize_mpesa(description):
-    description_lower = description.lower()
-    if "airtime" in description_lower:
-        return "Airtime"
-    if "bet" in description_lower or "game" in description_lower or "betika" in description_lower or "sportpesa" in description_lower:
-        return "Betting"
-    if "petroleum" in description_lower or "fuel" in description_lower or "gas" in description_lower or "diesel" in description_lower or "oil" in description_lower:
-        return "Petroleum"
-    if "loan" in description_lower or "overdraft" in description_lower or "fuliza" in description_lower:
-        return "Loans"
-    else:
-        return "Other"
+    return categorize("creditrisk", description)
 
+@timed()
 def parse_mpesa_statement(text):
-    lines = text.splitlines()
-    inflows = 0
+    record(bytes=len(text))
     categories = {}
-    for line in lines:
-        match = re.search(r"(Completed).*?([-]?[\d,]+\.\d{2})", line)
-        if match:
-            amount = float(match.group(2).replace(",", "").replace("-", ""))
-            description = line
-            category = categorize_mpesa(description)
-            categories[category] = categories.get(category, 0) + amount
-            inflows += amount if "received" in description.lower() or "promotion payment" in description.lower() else 0
-    return categories, inflows
+    inflow_dates, inflow_amounts = [], []
+    inflows = 0.0
+    undated = 0
+    for details, amount, category in mpesa_rows(text, "creditrisk"):
+        categories[category] = categories.get(category, 0) + amount
+        lowered = details.lower()
+        if "received" in lowered or "promotion payment" in lowered:
+            inflows += amount
+            date = find_date(details)
+            if date is not None:
+                inflow_dates.append(date)
+                inflow_amounts.append(amount)
+            else:
+                undated += 1
+    # Windows run over the statement's period: the dates of every row, not only the inflows
+    start, end = statement_period(text)
+    return categories, inflows, InflowIndex(inflow_dates, inflow_amounts, start, end, undated)
 
 def get_fsv(model: str, year: int) -> Optional[float]:
-    model = model.lower()
-    for pool in FSV_MATRIX.values():
-        for entry in pool:
-            if any(m in model for m in entry['models']):
-                for start, end, percent in entry['year_ranges']:
-                    if start <= year <= end:
-                        return percent
-    return None
+    return current_rules().fsv(model, year)
 
 def get_interest_rate(period_in_months: int) -> float:
-    if period_in_months == 1:
-        return 8.0
-    elif 0 <= period_in_months <= 3:
-        return 6.0
-    elif 0 <= period_in_months <= 6:
-        return 5.0
-    elif 7 <= period_in_months <= 12:
-        return 4.0
-    elif 13 <= period_in_months <= 36:
-        return 3.5
-    else:
-        return 3.5
+    return current_rules().interest_rate(period_in_months)
 
 # ------------------------------
 # STREAMLIT APP
 # ------------------------------
 st.title("M-PESA & CRB Risk Assessment Tool")
+start_request("creditrisk")
 
 mpesa_text = st.text_area("Paste M-PESA Statement Text")
+analyse_mpesa = st.cache_data(max_entries=32, show_spinner=False)(parse_mpesa_statement)
 
 if mpesa_text:
     st.subheader("M-PESA Summary")
-    categories, total_inflows = parse_mpesa_statement(mpesa_text)
+    categories, total_inflows, inflow_index = analyse_mpesa(mpesa_text)
     total = sum(categories.values())
-    for k, v in categories.items():
-        pct = (v / total) * 100 if total else 0
-        st.write(f"**{k}**: KSh {v:,.2f} ({pct:.2f}%)")
+    with stage("render_mpesa"):
+        for k, v in categories.items():
+            pct = (v / total) * 100 if total else 0
+            st.write(f"**{k}**: KSh {v:,.2f} ({pct:.2f}%)")
     st.success(f"Total Inflows: KSh {total_inflows:,.2f}")
-    inflow_eligibility = total_inflows / 3
+    if len(inflow_index):
+        window_months = st.slider("Eligibility Window (Months):", 1, 12, value=3)
+        inflow_eligibility = inflow_index.average_monthly(window_months)
+        undated_note = (f" {inflow_index.undated:,} inflow(s) without a readable date "
+                        f"(KSh {total_inflows - inflow_index.total():,.2f}) are left out."
+                        if inflow_index.undated else "")
+        st.caption(f"Average monthly inflow after {inflow_index.window_start(window_months)} "
+                   f"up to {inflow_index.last} ({inflow_index.months_covered(window_months)} month(s) covered)."
+                   + undated_note)
+        with st.expander("Compare Eligibility Windows"):
+            windows = [1, 3, 6, 9, 12]
+            st.dataframe(pd.DataFrame({
+                "Window (Months)": windows,
+                "Average Monthly Inflow": [inflow_index.average_monthly(m) for m in windows],
+            }))
+    else:
+        # No dates in the pasted text: fall back to the whole-statement average
+        inflow_eligibility = total_inflows / 3
     st.info(f"Loan Eligibility Based on M-PESA: KSh {inflow_eligibility:,.2f}")
 
     st.subheader("Vehicle & Risk Inputs")
@@ -125,13 +96,21 @@ if mpesa_text:
     period_in_months = st.slider("Loan Period (Months):", 1, 36, value=12)
 
     if st.button("Assess Full Eligibility"):
-        fsv_percentage = get_fsv(model_name, year)
-        if fsv_percentage is None:
+        # Policy knock-outs first: a declined application needs no FSV lookup or pricing
+        policy = evaluate_policy(current_rules().policy, {"metro_score": crb_score, "ppi": ppi_score,
+                                                          "probability_of_default": prob_of_default}).iloc[0]
+        fsv_percentage = None if policy["declined"] else get_fsv(model_name, year)
+        if policy["declined"]:
+            st.error("**Declined by Policy:** " + "; ".join(policy["reasons"]))
+        elif fsv_percentage is None:
             st.error("Vehicle model/year not in FSV matrix. Check spelling or year.")
         else:
             fsv_based_eligibility = fsv_value * fsv_percentage
             interest_rate = get_interest_rate(period_in_months)
             min_eligible = min(inflow_eligibility, fsv_based_eligibility)
+            if pd.notna(policy["limit"]) and policy["limit"] < min_eligible:
+                min_eligible = policy["limit"]
+                st.info(f"**Policy Cap:** KSh {policy['limit']:,.0f} ({'; '.join(policy['reasons'])})")
 
             st.subheader("Final Assessment")
             st.write(f"**Vehicle Eligibility:** KSh {fsv_based_eligibility:,.2f} ({fsv_percentage*100:.0f}% of KSh {fsv_value:,.0f})")
@@ -139,11 +118,56 @@ if mpesa_text:
             st.success(f"**Approved Amount:** KSh {min_eligible:,.2f}")
             st.info(f"**Interest Rate:** {interest_rate:.2f}%")
 
-            if crb_score < 500:
-                st.warning("Poor CRB Score")
-            if ppi_score > 5:
-                st.warning("High PPI: Risky Payment Behavior")
-            if prob_of_default > 20:
-                st.warning("High Probability of Default")
+            rules = current_rules()
+            method = rules.affordability.get("method", "flat")
+            monthly_installment = float(installment(min_eligible, interest_rate, period_in_months, method))
+            affordable = max_affordable(inflow_eligibility, periods=period_in_months, rules=rules).iloc[0]
+            st.write(f"**Monthly Installment:** KSh {monthly_installment:,.2f} over {period_in_months} month(s)")
+            if monthly_installment > affordable["installment"]:
+                st.warning(f"Installment exceeds {rules.affordability.get('max_debt_service_ratio', 0.4):.0%} of "
+                           f"monthly inflow (KSh {affordable['installment']:,.2f}). Affordable amount over "
+                           f"{period_in_months} month(s): KSh {affordable['amount']:,.2f}")
+            with st.expander("Repayment Schedule"):
+                st.dataframe(schedule(min_eligible, interest_rate, period_in_months, method).drop(columns="loan"))
+
+            result = scorecard("application").score({
+                "metro_score": crb_score,
+                "ppi": ppi_score,
+                "probability_of_default": prob_of_default,
+                "fsv_coverage": fsv_value / min_eligible if min_eligible else None,
+            }).iloc[0]
+            message = f"**Risk Grade:** {result['grade']} (score {result['score']:.0f})"
+            if result["grade"] == "LOW RISK":
+                st.success(message)
             else:
-                st.success("Good credit profile")
+                st.warning(message)
+            st.dataframe(result.filter(like="points_").rename(lambda c: c.removeprefix("points_")).rename("Points"))
+
+# The simulation is keyed on the book's digest, the path count and the rules version, not the book itself
+@st.cache_data(max_entries=8, show_spinner="Simulating collateral losses...")
+def stress_report(book_digest, paths, rules_version, _book):
+    return stress_test(_book, paths=paths)
+
+with st.expander("Loan Book Collateral Stress Test"):
+    st.caption(f"CSV with columns {', '.join(BOOK_COLUMNS)} (exposure is optional; "
+               "the FSV advance is used when it is missing).")
+    book_file = st.file_uploader("Loan Book (CSV):", type=["csv"], key="loan_book")
+    stress_paths = st.number_input("Simulated Paths:", 1000, 10_000_000, value=STRESS_PATHS, step=10000)
+    if book_file and st.button("Run Stress Test"):
+        book = pd.read_csv(book_file)
+        missing = [c for c in BOOK_COLUMNS[:3] if c not in book.columns]
+        if missing:
+            st.error(f"Loan book is missing column(s): {', '.join(missing)}")
+        else:
+            undated = int(pd.to_numeric(book["year"], errors="coerce").isna().sum())
+            if undated:
+                st.warning(f"{undated:,} loan(s) without a readable year are left out of the stress test.")
+            book_digest = hashlib.sha256(book_file.getvalue()).hexdigest()
+            report = stress_report(book_digest, int(stress_paths), current_rules().version, book)
+            if report.empty:
+                st.warning("No loan in the book matches the FSV matrix.")
+            else:
+                st.dataframe(report)
+                st.caption(f"Loss and coverage at forced sale over {int(stress_paths):,} simulated paths.")
+
+render_debug_panel(finish_request())
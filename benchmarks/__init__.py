@@ -0,0 +1 @@
+"""Reproducible benchmarks for the parsing and scoring code."""
@@ -0,0 +1,287 @@
+"""Consistency checks of risk_core against slow, obviously-correct versions.
+
+    PYTHONPATH=. python -m benchmarks.checks [--only crb] [--sizes 50 500] [--seeds 3]
+
+Where ``benchmarks.differential`` compares the apps with the code they
+replaced, these compare the fast paths with a brute-force restatement of what
+they compute, or one document printed in several layouts with itself. Each
+check is registered with ``@check("name")`` and returns a list of the
+mismatches it found for one (size, seed). The exit status is 1 when any check
+finds one.
+"""
+import argparse
+import sys
+
+import pandas as pd
+
+from benchmarks import generators as gen
+
+CHECKS = {}
+
+
+def check(name):
+    def register(fn):
+        CHECKS[name] = fn
+        return fn
+    return register
+
+
+@check("crb/account_layouts")
+def _(size, seed):
+    """Every CRB account layout parses to the same accounts."""
+    from risk_core.crb_accounts import parse_accounts
+    expected = parse_accounts(gen.crb_text(size, seed))
+    found = [] if len(expected) == size else [f"stacked: {len(expected)} of {size} accounts"]
+    for layout in ("labelled", "inline"):
+        accounts = parse_accounts(gen.crb_text(size, seed, layout=layout))
+        if not accounts.equals(expected):
+            found.append(f"{layout}: {len(accounts)} accounts differ from the stacked layout's")
+    return found
+
+
+@check("extract/docx_wrapped_cells")
+def _(size, seed):
+    """A table whose cells wrap over two paragraphs reads the same as one whose cells don't."""
+    from risk_core.docx_stream import extract_docx_text
+    text = gen.bank_text(size, seed)
+    expected = extract_docx_text(gen.text_to_docx(text, table_from=6))
+    wrapped = extract_docx_text(gen.text_to_docx(text, table_from=6, wrap=True))
+    if wrapped == expected:
+        return []
+    differ = sum(a != b for a, b in zip(wrapped.splitlines(), expected.splitlines()))
+    return [f"{differ} of {len(expected.splitlines())} lines differ"]
+
+
+def _echoed_ledgers(size, seed):
+    """Transactions where some payments come back once, twice or not at all, close to or off the amount."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    senders = [f"Funds received from 07{p + 10}***{p + 100} {gen.NAMES[p % len(gen.NAMES)]}" for p in range(8)]
+    rows = []
+    for i in range(size):
+        applicant, details = int(rng.integers(0, 3)), senders[int(rng.integers(0, len(senders)))]
+        day = int(rng.integers(0, 365))
+        sent = float(rng.integers(5, 50) * 100)
+        rows.append((applicant, details, day, -sent))
+        for _ in range(int(rng.integers(0, 3))):
+            day += int(rng.integers(0, 45))
+            rows.append((applicant, details, day, sent * float(rng.choice([1.0, 1.1, 1.5]))))
+    frame = pd.DataFrame(rows, columns=["applicant", "Details", "day", "Amount"])
+    # Distinct times, so "earlier" never ties
+    frame["Date"] = pd.Timestamp(gen.STATEMENT_END) + pd.to_timedelta(frame["day"] * 86400 + frame.index, unit="s")
+    return frame
+
+
+def _round_trips_by_hand(frame, window_days=30, tolerance=0.2):
+    found = set()
+    for (applicant, details), edges in frame.sort_values("Date").groupby(["applicant", "Details"]):
+        last_out, used = None, set()
+        for date, amount in zip(edges["Date"], edges["Amount"]):
+            if amount < 0:
+                last_out = (date, -amount)
+            elif last_out is not None and last_out[0] not in used:
+                sent_at, sent = last_out
+                if date - sent_at <= pd.Timedelta(days=window_days) and abs(amount - sent) <= tolerance * sent:
+                    used.add(sent_at)
+                    found.add((applicant, sent_at, date, amount))
+    return found
+
+
+@check("score/round_trips")
+def _(size, seed):
+    """CounterpartyGraph.round_trips against a per-transaction walk, with payments returned more than once."""
+    from risk_core.counterparties import CounterpartyGraph
+    frame = _echoed_ledgers(size, seed)
+    trips = CounterpartyGraph.from_frame(frame).round_trips()
+    found = {(a, pd.Timestamp(s), pd.Timestamp(r), v)
+             for a, s, r, v in zip(trips["applicant"], trips["sent_at"], trips["returned_at"], trips["returned"])}
+    expected = _round_trips_by_hand(frame)
+    if found == expected:
+        return []
+    return [f"{len(found - expected)} reported that shouldn't be, {len(expected - found)} missed"]
+
+
+def _crb_grade_by_chain(ppi, principals):
+    """The if-chain ``assess_risk`` used before the "crb" scorecard."""
+    if ppi == "M1" and all(p < 1000 for p in principals):
+        return "LOW RISK"
+    return "MODERATE RISK" if ppi in ("M2", "M3") else "HIGH RISK"
+
+
+@check("score/crb_card")
+def _(size, seed):
+    """The "crb" scorecard, with the policy's grade overrides, grades like the old if-chain."""
+    import numpy as np
+    from risk_core.policy import evaluate
+    from risk_core.rules import current_rules, scorecard
+    rng = np.random.default_rng(seed)
+    ppis = rng.choice(["M1", "M2", "M3", "M4", "M5", "M6", "M7", "", None], size).tolist()
+    loans = [sorted(rng.choice([0, 500, 999, 1000, 9999, 10000, 20000, 49999, 50000, 10 ** 6],
+                               int(rng.integers(0, 4))).tolist()) for _ in range(size)]
+    inputs = pd.DataFrame({"ppi": ppis, "max_principal": [max(p) if p else None for p in loans]})
+    overrides = evaluate(current_rules().policy, inputs)["grade"]
+    grades = overrides.fillna(scorecard("crb").score(inputs)["grade"])
+    found = []
+    for ppi, principals, grade in zip(ppis, loans, grades):
+        expected = _crb_grade_by_chain(ppi, principals)
+        if grade.strip() != expected:
+            found.append(f"{ppi} {principals}: {grade.strip()}, the chain says {expected}")
+    return found[:5]
+
+
+def _loan_book(size, seed):
+    """Loans across the FSV pools and outside them, some without a year or with half a one, some with exposures."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    years = rng.integers(2003, 2024, size).astype(float)
+    years[rng.random(size) < 0.1] = np.nan
+    years[rng.random(size) < 0.05] += 0.5
+    values = rng.integers(300_000, 3_000_000, size).astype(float)
+    exposures = np.where(rng.random(size) < 0.5, np.nan, values * rng.uniform(0.3, 1.2, size))
+    return pd.DataFrame({
+        "model": rng.choice(["Toyota Fielder", "Probox", "Nissan Note", "Volkswagen Polo", "Canters Isuzu",
+                             "BMW X3"], size),
+        "year": years, "fsv_value": values, "exposure": exposures,
+    })
+
+
+def _stress_by_hand(book, paths, seed, chunk, rules):
+    """Each loan's shortfall on each path, from the same draws as ``stress_test``: (losses per pool per path,
+    loans per pool)."""
+    import numpy as np
+    settings = rules.collateral_stress
+    loans = []
+    for model, year, value, exposure in book[["model", "year", "fsv_value", "exposure"]].itertuples(index=False):
+        match = rules.fsv_pool(model, int(year)) if year == year and year == int(year) else None
+        if match:
+            loans.append((match[0], value * match[1] if exposure != exposure else exposure, value))
+    pools = sorted({pool for pool, _, _ in loans})
+    correlation = settings["market_correlation"]
+    years = settings["horizon_months"] / 12
+    sizes = [min(chunk, paths - start) for start in range(0, paths, chunk)]
+    losses = []
+    for size, s in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        rng = np.random.default_rng(s)
+        market = rng.standard_normal((size, 1))
+        own = rng.standard_normal((size, len(pools)))
+        cuts = rng.standard_normal((size, len(pools)))
+        for path in range(size):
+            row = []
+            for j, pool in enumerate(pools):
+                a = settings["pools"][pool]
+                shock = correlation * market[path, 0] + (1 - correlation ** 2) ** 0.5 * own[path, j]
+                value = np.exp(-(a["depreciation"] + a["volatility"] ** 2 / 2) * years
+                               + a["volatility"] * years ** 0.5 * shock)
+                cut = min(max(a["haircut"] + a["haircut_volatility"] * cuts[path, j], 0.0), 0.95)
+                row.append(sum(max(e - c * value * (1 - cut), 0.0) for p, e, c in loans if p == pool))
+            losses.append(row)
+    counts = pd.Series([pool for pool, _, _ in loans]).value_counts()
+    return pd.DataFrame(losses, columns=pools), {**counts.to_dict(), "Book": len(loans)}
+
+
+@check("score/collateral_stress")
+def _(size, seed):
+    """stress_test against a loan-by-loan shortfall per path, on one worker and on two."""
+    import numpy as np
+    from risk_core.collateral import stress_test
+    from risk_core.rules import current_rules
+    book, paths = _loan_book(size, seed), 400
+    chunk = paths // 2 + 1
+    losses, counts = _stress_by_hand(book, paths, seed, chunk, current_rules())
+    losses["Book"] = losses.sum(axis=1)
+    found = []
+    for workers in (1, 2):
+        report = stress_test(book, paths=paths, seed=seed, workers=workers, chunk=chunk)
+        if list(report.index) != list(losses.columns):
+            found.append(f"workers={workers}: pools {list(report.index)}, by hand {list(losses.columns)}")
+            continue
+        for pool, loss in losses.items():
+            expected = {"loans": counts[pool], "expected_loss": loss.mean(), "loss_p99": np.quantile(loss, 0.99),
+                        "shortfall_probability": (loss > 1e-9).mean()}
+            for column, value in expected.items():
+                if not np.isclose(report.loc[pool, column], value, rtol=1e-9, atol=1e-6):
+                    found.append(f"workers={workers} {pool} {column}: {report.loc[pool, column]}, by hand {value}")
+    return found
+
+
+def _gappy_ledgers(size, seed):
+    """Transactions for a few applicants, each in only some months of their statement period."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    rows = []
+    for applicant in range(4):
+        start = int(rng.integers(0, 12))
+        active = [m for m in range(start, start + int(rng.integers(1, 13))) if rng.random() < 0.6] or [start]
+        for _ in range(max(size // 4, 1)):
+            month = int(rng.choice(active))
+            day = pd.Timestamp("2024-01-01") + pd.DateOffset(months=month) + pd.Timedelta(days=int(rng.integers(0, 28)))
+            category = str(rng.choice(["Income", "Betting", "Other (Inflow)", "Other (Outflow)"]))
+            side = "Inflow" if category in ("Income", "Other (Inflow)") else "Outflow"
+            rows.append((applicant, day, category, float(rng.integers(1, 500) * 100), side))
+    return pd.DataFrame(rows, columns=["applicant", "Date", "Category", "Amount", "Inflow/Outflow"])
+
+
+def _monthly_by_hand(frame):
+    """Per applicant: months from the first to the last, and each month's inflow, outflow and salary."""
+    found = {}
+    for applicant, rows in frame.groupby("applicant"):
+        first, last = rows["Date"].min().to_period("M"), rows["Date"].max().to_period("M")
+        months = pd.period_range(first, last, freq="M")
+        totals = {m: [0.0, 0.0, 0.0] for m in months}
+        for date, category, amount, side in zip(rows["Date"], rows["Category"], rows["Amount"], rows["Inflow/Outflow"]):
+            month = totals[date.to_period("M")]
+            month[0 if side == "Inflow" else 1] += amount
+            month[2] += amount if category == "Income" else 0.0
+        found[applicant] = list(totals.values())
+    return found
+
+
+@check("features/month_gaps")
+def _(size, seed):
+    """cashflow_features counts the months a statement has no transactions in as months of nothing."""
+    import numpy as np
+    from risk_core.features import cashflow_features
+    frame = _gappy_ledgers(size, seed)
+    features = cashflow_features(frame, applicant_col="applicant")
+    found = []
+    for applicant, months in _monthly_by_hand(frame).items():
+        inflow = np.array([m[0] for m in months])
+        expected = {"months": len(months), "avg_monthly_inflow": inflow.mean(),
+                    "avg_monthly_outflow": np.mean([m[1] for m in months]),
+                    "inflow_volatility": inflow.std() / inflow.mean() if inflow.mean() else np.nan,
+                    "salary_regularity": np.mean([m[2] > 0 for m in months])}
+        for column, value in expected.items():
+            got = features.loc[applicant, column]
+            if not (np.isclose(got, value) or (np.isnan(got) and np.isnan(value))):
+                found.append(f"applicant {applicant} {column}: {got}, by hand {value}")
+    return found
+
+
+def run(sizes, seeds, only=None):
+    failures = []
+    for name, fn in CHECKS.items():
+        if only and not name.startswith(only):
+            continue
+        for size in sizes:
+            for seed in range(seeds):
+                for found in fn(size, seed):
+                    failures.append(f"{name} size={size} seed={seed}: {found}")
+        print(f"{name:<40} {'ok' if not any(f.startswith(name + ' ') for f in failures) else 'FAILED'}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--only", help="run checks whose name starts with this prefix")
+    args = parser.parse_args(argv)
+    failures = run(args.sizes, args.seeds, args.only)
+    for failure in failures:
+        print(f"MISMATCH {failure}")
+    print(f"{len(failures)} mismatch(es)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Differential check of the shared parser core against the parsers it replaced.
+
+    PYTHONPATH=. python -m benchmarks.differential [--ref REF] [--sizes 200 5000] [--seeds 3]
+
+Every app parser now calls ``risk_core.parsers``. Each case below runs an app
+function as it is in the working tree and as it was at ``REF`` (by default
+the commit before ``risk_core/parsers.py`` was added), on generated
+documents and on hand-written edge cases, checks that the outputs are the
+same and times both. Both versions categorise through the same
+``risk_core.rules``, so the timings compare parsing alone.
+
+Known, intended differences are listed with their case:
+
+* ``risk.process_mpesa`` on a Safaricom export: the old version counted a
+  negative "Withdrawn" (the Safaricom convention) as money in and kept rows
+  with unreadable amounts as NaN. The check feeds it positive withdrawals
+  and readable amounts, where both agree; the new frame also has an
+  ``Inflow/Outflow`` column.
+* ``risk.process_mpesa`` on text has no old counterpart (it raised).
+* ``Date`` columns are ``datetime64`` (``risk_core.dates``) where the old
+  parsers kept the matched strings; the strings are read with pandas'
+  own day-first parser and compared with those.
+
+The exit status is 1 when any output differs.
+"""
+import argparse
+import io
+import math
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks import generators as gen
+from benchmarks.legacy import ROOT, load_app
+
+EDGE_MPESA = [
+    "",
+    "no transactions here\n",
+    "Completed",
+    "RB1 2025-01-02 Funds received from 0712***345 JOHN\nCompleted\n1,500.00\n10,000.00",
+    "Completed - 2,000.00\nPay Bill to 888880 - KPLC PREPAID\nCompleted\nnot an amount\nCompleted -350.00",
+    "Customer Withdrawal At Agent Till 12345\r\nCompleted -700.00\r\n\r\nCompleted 0.00\n",
+]
+EDGE_ROWS = [
+    "",
+    "RB1 2025-01-02 10:00:00 Funds received from JOHN Completed 1,500.00 9,000.00\n"
+    "RB2 05/02/2025 Promotion Payment Completed -20.00\nRB3 Airtime Completed nothing",
+    "Completed 1,2,3.45\rRB4 2025-03-01 Funds Received Completed 100.00\x0cCompleted -5.00",
+]
+EDGE_BANK_INLINE = [
+    "",
+    "12/07/2025 POS Naivas -2,500.00\n  3/4/25   SALARY  ACME   95,000.00  extra\n1/1/2025 -5.00",
+    "date 12/07/2025 x 1.00 12/08/2025 y 2.00\n12/07/2025\tTAB\t-3.50\r\n",
+]
+EDGE_BANK_BLOCKS = [
+    "",
+    "01/02/2025\nPOS NAIVAS\n01/02/2025 -2,500.00 1,000.00CR 3,500.00CR\n",
+    "01/02/2025\nfirst\n02/02/2025\nsecond\n02/02/2025 100.00 1.00CR 2.00DR\n03/02/2025\nno amount line",
+    "01/02/2025\n01/02/2025 1,,0.00 1.00CR 2.00CR\n01/02/2025",
+]
+EDGE_BANK_HEADER = [
+    "",
+    "\n\n  Account Holder Name:\t MARY  WANJIKU \r\n\n \nAccount Number: 0101\t\nBank Name:\n\nEquity",
+    " \t\nBank Name:  \x0c KCB  \n\n\nAccount Holder Name:" + " " * 40 + "\u00a0X\n",
+]
+EDGE_KSH = [
+    "",
+    "Paid Ksh 1,000\nKsh\n12/1/2025 Fee Ksh-50.00\nx Ksh nan\nAmount (Ksh)\n 3/3/25 Rent Ksh 1e3",
+]
+EDGE_CRB = [
+    "",
+    "REPORTED NAMES: JOHN KAMAU\nNATIONAL ID : 12345678\nMetro-Score© 350\nPPI© M7\n"
+    "Probability Of Default© 40 %\nTotal 3 1 1 1\nTotal Outstanding Balance 12,345.67\n",
+    "Metro-Score©\n\n 720\nPPI©\nM2\nProbability Of Default©\n 3%\nEmployer : ACME\tLTD\n"
+    "Salary : K120,000\nTotal Outstanding Balance\nTotal Accounts\n1,000.50",
+]
+
+
+def _mpesa_frame(size, seed):
+    frame = pd.read_csv(io.StringIO(gen.mpesa_csv(size, seed)))
+    frame["Withdrawn"] = frame["Withdrawn"].str.lstrip("-")
+    return frame
+
+
+CASES = [
+    # (name, app, function, generated input, edge inputs)
+    ("mpesa/credit_analysis", "credit_analysis", "process_mpesa", gen.mpesa_text, EDGE_MPESA),
+    ("mpesa/credit_analysis1", "credit_analysis1", "process_mpesa", gen.mpesa_text, EDGE_MPESA),
+    ("mpesa/statement_analyzer", "statement_analyzer", "process_mpesa", gen.mpesa_text, EDGE_MPESA),
+    ("mpesa_frame/risk", "risk", "process_mpesa", _mpesa_frame, []),
+    ("mpesa_rows/creditrisk", "creditrisk", "parse_mpesa_statement",
+     lambda size, seed: gen.mpesa_text(size, seed, layout="rows"), EDGE_ROWS),
+    ("bank_inline/credit_analysis1", "credit_analysis1", "process_bank",
+     lambda size, seed: gen.bank_text(size, seed, layout="inline"), EDGE_BANK_INLINE),
+    ("bank_blocks/statement_analyzer", "statement_analyzer", "process_bank",
+     lambda size, seed: gen.bank_text(size, seed, layout="multiline"), EDGE_BANK_BLOCKS),
+    ("bank_header/credit_analysis1", "credit_analysis1", "extract_bank",
+     lambda size, seed: gen.bank_text(size, seed, layout="inline"), EDGE_BANK_HEADER),
+    ("ksh/scoring_mpesa", "scoring", "parse_mpesa_from_text", gen.ksh_text, EDGE_KSH),
+    ("ksh/scoring_bank", "scoring", "parse_bank_from_text", gen.ksh_text, EDGE_KSH),
+    ("crb/risk", "risk", "extract_crb_data", lambda size, seed: gen.crb_text(max(size // 10, 1), seed), EDGE_CRB),
+    ("crb/credit_analysis", "credit_analysis", "extract_crb_data",
+     lambda size, seed: gen.crb_text(max(size // 10, 1), seed), EDGE_CRB),
+    ("crb/credit_analysis1", "credit_analysis1", "extract_crb_data",
+     lambda size, seed: gen.crb_text(max(size // 10, 1), seed), EDGE_CRB),
+]
+
+
+def default_ref():
+    """The commit before risk_core/parsers.py was added, or HEAD while it is uncommitted."""
+    added = subprocess.run(["git", "log", "--diff-filter=A", "--format=%H", "--", "risk_core/parsers.py"],
+                           cwd=ROOT, capture_output=True, text=True).stdout.split()
+    return f"{added[-1]}~1" if added else "HEAD"
+
+
+def difference(new, old, path="result"):
+    """None when ``new`` matches ``old``, else a description of the first difference."""
+    if isinstance(old, pd.DataFrame):
+        if not isinstance(new, pd.DataFrame):
+            return f"{path}: {type(new).__name__} instead of a DataFrame"
+        # The core may add columns (risk's frame gains Inflow/Outflow); the old ones must match
+        missing = [c for c in old.columns if c not in new.columns]
+        if missing:
+            return f"{path}: missing columns {missing}"
+        old = old.copy()
+        for c in old.columns:
+            if old[c].dtype == object and pd.api.types.is_datetime64_any_dtype(new[c]):
+                old[c] = pd.to_datetime(old[c], format="mixed", dayfirst=True, errors="coerce").astype(new[c].dtype)
+        try:
+            pd.testing.assert_frame_equal(new[list(old.columns)], old, check_exact=False, rtol=1e-9)
+        except AssertionError as e:
+            return f"{path}: {e}"
+        return None
+    if isinstance(old, (tuple, list)):
+        if not isinstance(new, (tuple, list)) or len(new) != len(old):
+            return f"{path}: {new!r} != {old!r}"
+        for i, (a, b) in enumerate(zip(new, old)):
+            found = difference(a, b, f"{path}[{i}]")
+            if found:
+                return found
+        return None
+    if isinstance(old, dict):
+        if not isinstance(new, dict) or list(new) != list(old):
+            return f"{path}: keys {list(new) if isinstance(new, dict) else new!r} != {list(old)}"
+        for key in old:
+            found = difference(new[key], old[key], f"{path}[{key!r}]")
+            if found:
+                return found
+        return None
+    if isinstance(old, float) or isinstance(new, float):
+        if isinstance(new, (int, float)) and isinstance(old, (int, float)) and math.isclose(new, old, rel_tol=1e-9):
+            return None
+        return f"{path}: {new!r} != {old!r}"
+    if hasattr(old, "prefix") and hasattr(old, "dates"):  # InflowIndex
+        if list(new.dates) != list(old.dates) or not all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+                                                         for a, b in zip(new.prefix, old.prefix)):
+            return f"{path}: inflow index differs"
+        return None
+    return None if new == old and type(new) is type(old) else f"{path}: {new!r} != {old!r}"
+
+
+def best_time(fn, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(ref, sizes, seeds, repeat, only=None):
+    failures, rows = [], []
+    apps = {}
+    for name, app, function, generate, edges in CASES:
+        if only and not name.startswith(only):
+            continue
+        if app not in apps:
+            apps[app] = (load_app(app), load_app(app, ref))
+        new, old = (getattr(module, function) for module in apps[app])
+        inputs = [("edge", e) for e in edges]
+        inputs += [(f"size={size} seed={seed}", generate(size, seed)) for size in sizes for seed in range(seeds)]
+        for label, document in inputs:
+            found = difference(new(document), old(document))
+            if found:
+                failures.append((name, label, found))
+        for size in sizes:
+            document = generate(size, 0)
+            old_time, new_time = best_time(old, document, repeat), best_time(new, document, repeat)
+            rows.append((name, size, old_time, new_time))
+            print(f"{name:34s} size={size:<7d} legacy={old_time * 1e3:9.2f} ms  core={new_time * 1e3:9.2f} ms  "
+                  f"x{old_time / new_time:5.2f}{'  SLOWER' if new_time > old_time else ''}")
+    return failures, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ref", default=None, help="git revision of the legacy parsers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 5000])
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run cases whose name starts with this prefix")
+    args = parser.parse_args(argv)
+    ref = args.ref or default_ref()
+    print(f"Comparing the working tree with {ref}")
+    failures, rows = run(ref, args.sizes, args.seeds, args.repeat, args.only)
+    slower = [(name, size) for name, size, old_time, new_time in rows if new_time > old_time]
+    if slower:
+        print("Slower than the legacy parser:", ", ".join(f"{name} at {size}" for name, size in slower))
+
+    for name, label, found in failures:
+        print(f"DIFFERENT {name} ({label}): {found}")
+    print(f"{len(failures)} difference(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""Synthetic M-PESA, bank and Metropol CRB documents for benchmarks.
+
+Every generator takes a size and a seed so the same call always produces the
+same document. The layouts follow what the app parsers expect:
+
+* M-PESA "cells": one PDF cell per line, the way PyMuPDF extracts statements
+  (``process_mpesa`` in the apps).
+* M-PESA "rows": one transaction per line, the way officers paste statements
+  into ``Creditrisk.py``.
+* Bank "inline": ``12/07/2025 POS Naivas -2,500.00`` rows (``Credit_Analysis1.py``).
+* Bank "multiline": date line, narration lines, then a value-date line with
+  amount and ``CR``/``DR`` balances (``Credit_analysis_deploy/test.py``).
+* "Ksh" lines: ``12/07/2025 POS Naivas Ksh -2,500.00`` (``scoring.py``).
+* CRB account blocks "stacked" (status alone on its line), "labelled"
+  ("Account Status: ...") or "inline" (lender on the status line, values
+  under their labels); ``benchmarks.checks`` parses all three.
+"""
+import io
+import random
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from xml.sax.saxutils import escape
+
+import fitz
+
+MPESA_NARRATIONS = [
+    # (narration template, direction)
+    ("Funds received from 07{phone} {name}", 1),
+    ("Business Payment from 303030 - WATU CREDIT via API", 1),
+    ("Salary Payment from 555100 - ACME LIMITED", 1),
+    ("Promotion Payment from 200200 - SAFARICOM", 1),
+    ("Customer Transfer to 07{phone} {name}", -1),
+    ("Pay Bill to 888880 - KPLC PREPAID Acc. {account}", -1),
+    ("Pay Bill Online to 290290 - BETIKA LIMITED Acc. 07{phone}", -1),
+    ("Pay Bill to 955100 - SPORTPESA Acc. {account}", -1),
+    ("Merchant Payment to {till} - NAIVAS SUPERMARKET", -1),
+    ("Merchant Payment Online to {till} - SHELL VIVO ENERGY", -1),
+    ("Merchant Payment to {till} - QUICKMART LTD", -1),
+    ("Customer Withdrawal At Agent Till {till} - {name} AGENCIES", -1),
+    ("Airtime Purchase", -1),
+    ("Customer Bundle Purchase", -1),
+    ("OD Loan Repayment to 232323 - M-PESA Overdraw", -1),
+    ("Pay Bill to 4099999 - MOGO KENYA Acc. {account}", -1),
+    ("Pay Bill to 525252 - MOMENTUM CREDIT Acc. {account}", -1),
+]
+
+NAMES = ["JOHN KAMAU", "MARY WANJIKU", "PETER OTIENO", "GRACE ACHIENG", "JAMES MWANGI",
+         "FAITH CHEBET", "DAVID KIPROP", "ANN NJERI", "BRIAN OMONDI", "LUCY MUTHONI"]
+
+BANK_NARRATIONS = [
+    ("SALARY ACME LIMITED", 1),
+    ("MPESA C2B TRANSFER FROM {name}", 1),
+    ("RTGS INWARD PAYMENT {name}", 1),
+    ("POS NAIVAS SUPERMARKET WESTLANDS", -1),
+    ("POS SHELL SERVICE STATION", -1),
+    ("ATM WITHDRAWAL KENYATTA AVE", -1),
+    ("KPLC PREPAID TOKEN {account}", -1),
+    ("MPESA PAYBILL 290290 BETIKA", -1),
+    ("LOAN REPAYMENT WATU CREDIT", -1),
+    ("STANDING ORDER MOMENTUM CREDIT", -1),
+    ("BANK CHARGES", -1),
+]
+
+LENDERS = ["TALA KENYA", "BRANCH MICROFINANCE", "KCB M-PESA", "M-SHWARI", "WATU CREDIT",
+           "PLATINUM CREDIT", "MOGO KENYA", "EQUITY BANK", "ZENKA FINANCE", "OKASH"]
+ACCOUNT_STATUSES = ["Performing Account Without Default History",
+                    "Performing Account With Default History",
+                    "Non-Performing Account"]
+
+VEHICLES = ["Toyota Fielder", "Toyota Probox", "Toyota Mark X", "Nissan Note", "Mazda Demio",
+            "Subaru Forester", "Honda Fit", "Volkswagen Golf", "BMW 320i", "Isuzu Canters",
+            "Lexus RX", "Toyota Hilux", "Ford Ranger", "Mitsubishi Outlander", "Tesla Model 3"]
+
+STATEMENT_END = date(2025, 6, 30)
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _fill(template, rng):
+    return template.format(
+        phone=f"{rng.randint(10, 99)}***{rng.randint(100, 999)}",
+        name=rng.choice(NAMES),
+        account=rng.randint(10000, 99999),
+        till=rng.randint(100000, 999999),
+    )
+
+
+def mpesa_transactions(n, seed=0, months=12):
+    """Return (receipt, timestamp, details, signed amount, balance) tuples sorted by time."""
+    rng = random.Random(seed)
+    start = datetime.combine(STATEMENT_END - timedelta(days=30 * months), datetime.min.time())
+    span = int(timedelta(days=30 * months).total_seconds())
+    stamps = sorted(start + timedelta(seconds=rng.randrange(span)) for _ in range(n))
+    balance = 5000.0
+    rows = []
+    for i, stamp in enumerate(stamps):
+        template, direction = rng.choice(MPESA_NARRATIONS)
+        amount = round(rng.uniform(50, 25000 if direction > 0 else 6000), 2) * direction
+        balance += amount
+        rows.append((f"RK{seed % 100:02d}{i:08d}", stamp, _fill(template, rng), amount, balance))
+    return rows
+
+
+def _mpesa_header(seed):
+    name = NAMES[seed % len(NAMES)]
+    return [
+        "M-PESA STATEMENT",
+        f"Customer Name: {name}",
+        f"Mobile Number: 07{seed % 100:02d}123456",
+        f"Statement Period: {(STATEMENT_END - timedelta(days=360)):%d %b %Y} - {STATEMENT_END:%d %b %Y}",
+        "Receipt No. Completion Time Details Transaction Status Paid In Withdrawn Balance",
+    ]
+
+
+def mpesa_text(n, seed=0, layout="cells"):
+    lines = _mpesa_header(seed)
+    for receipt, stamp, details, amount, balance in mpesa_transactions(n, seed):
+        if layout == "rows":
+            lines.append(f"{receipt} {stamp:%Y-%m-%d %H:%M:%S} {details} Completed {_money(amount)} {_money(balance)}")
+        else:
+            lines.extend([receipt, f"{stamp:%Y-%m-%d %H:%M:%S}", details, "Completed",
+                          _money(amount), _money(balance)])
+    return "\n".join(lines) + "\n"
+
+
+def mpesa_csv(n, seed=0):
+    """Safaricom CSV export with separate Paid In / Withdrawn columns."""
+    out = io.StringIO()
+    out.write("Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance\n")
+    for receipt, stamp, details, amount, balance in mpesa_transactions(n, seed):
+        paid_in = f'"{_money(amount)}"' if amount > 0 else ""
+        withdrawn = f'"{_money(amount)}"' if amount < 0 else ""
+        out.write(f'{receipt},{stamp:%Y-%m-%d %H:%M:%S},"{details}",Completed,{paid_in},{withdrawn},"{_money(balance)}"\n')
+    return out.getvalue()
+
+
+def bank_transactions(n, seed=0, months=12):
+    rng = random.Random(seed + 1)
+    start = STATEMENT_END - timedelta(days=30 * months)
+    days = sorted(start + timedelta(days=rng.randrange(30 * months)) for _ in range(n))
+    balance = 20000.0
+    rows = []
+    for day in days:
+        template, direction = rng.choice(BANK_NARRATIONS)
+        amount = round(rng.uniform(100, 90000 if direction > 0 else 15000), 2) * direction
+        balance += amount
+        rows.append((day, _fill(template, rng), amount, balance))
+    return rows
+
+
+def bank_text(n, seed=0, layout="inline"):
+    name = NAMES[seed % len(NAMES)]
+    lines = [
+        "BANK STATEMENT",
+        f"Account Holder Name: {name}",
+        f"Account Number: 01{seed % 100:02d}2345678900",
+        "Bank Name: Equity Bank Kenya",
+        "Branch Name: Westlands",
+        "Tran Date Narration Value Date Amount Ledger Balance Available Balance",
+    ]
+    for i, (day, details, amount, balance) in enumerate(bank_transactions(n, seed)):
+        if layout == "multiline":
+            suffix = "CR" if balance >= 0 else "DR"
+            lines.extend([
+                f"{day:%d/%m/%Y}",
+                details,
+                f"REF {seed % 100:02d}{i:08d}",
+                f"{day:%d/%m/%Y} {_money(amount)} {_money(abs(balance))}{suffix} {_money(abs(balance))}{suffix}",
+            ])
+        else:
+            lines.append(f"{day:%d/%m/%Y} {details} {_money(amount)} {_money(balance)}")
+    return "\n".join(lines) + "\n"
+
+
+def ksh_text(n, seed=0):
+    lines = [f"STATEMENT FOR {NAMES[seed % len(NAMES)]}", "Date Description Amount (Ksh)"]
+    for day, details, amount, _ in bank_transactions(n, seed):
+        lines.append(f"{day:%d/%m/%Y} {details} Ksh {_money(amount)}")
+    return "\n".join(lines) + "\n"
+
+
+def bank_csv(n, seed=0):
+    """Bank CSV export in the same column layout as the PDF statements."""
+    out = io.StringIO()
+    out.write("Tran Date,Narration,Value Date,Amount,Ledger Balance,Available Balance\n")
+    for day, details, amount, balance in bank_transactions(n, seed):
+        out.write(f'{day:%d/%m/%Y},"{details}",{day:%d/%m/%Y},"{_money(amount)}","{_money(balance)}",'
+                  f'"{_money(balance)}"\n')
+    return out.getvalue()
+
+
+def crb_accounts(n, seed=0):
+    rng = random.Random(seed + 2)
+    accounts = []
+    for _ in range(n):
+        opened = STATEMENT_END - timedelta(days=rng.randrange(30, 1800))
+        principal = round(rng.choice([rng.uniform(500, 5000), rng.uniform(5000, 500000)]), 2)
+        status = rng.choices(ACCOUNT_STATUSES, weights=[8, 2, 1])[0]
+        closed = opened + timedelta(days=rng.randrange(7, 400))
+        if closed > STATEMENT_END or status == "Non-Performing Account":
+            closed = None
+        balance = 0.0 if closed else round(principal * rng.uniform(0.1, 1.1), 2)
+        arrears = rng.randrange(0, 180) if status != ACCOUNT_STATUSES[0] else 0
+        accounts.append({"status": status, "lender": rng.choice(LENDERS), "principal": principal,
+                         "balance": balance, "opened": opened, "closed": closed, "arrears": arrears})
+    return accounts
+
+
+def _account_block(i, acc, layout):
+    fields = [
+        ("Lender", acc["lender"]),
+        ("Account Number", f"XXXX{i:06d}"),
+        ("Principal Amount", f"{acc['principal']:.2f}"),
+        ("Current Balance", f"{acc['balance']:.2f}"),
+        ("Days in Arrears", f"{acc['arrears']}"),
+        ("Account Opened", f"{acc['opened']:%Y-%m-%d}"),
+        ("Account Closed", f"{acc['closed']:%Y-%m-%d}" if acc["closed"] else "N/A"),
+    ]
+    if layout == "labelled":
+        # "Account Status: ..." and "Label: value"
+        return [f"Account Status: {acc['status']}"] + [f"{label}: {value}" for label, value in fields]
+    if layout == "inline":
+        # The lender follows the status on its line; values on the line after their label
+        return [f"{acc['status']} {acc['lender']}"] + [line for label, value in fields[1:] for line in (label, value)]
+    lines = [acc["status"], f"Lender: {acc['lender']}", f"Account Number: XXXX{i:06d}"]
+    return lines + [f"{label} {value}" for label, value in fields[2:]]
+
+
+def crb_text(n_accounts, seed=0, layout="stacked"):
+    """Metropol-style report with the score block, bio data, summary and n account blocks.
+
+    ``layout`` is how the account blocks are printed: ``stacked`` (status alone
+    on its line), ``labelled`` ("Account Status: ...", "Label: value") or
+    ``inline`` (lender on the status line, values under their labels).
+    """
+    rng = random.Random(seed + 3)
+    accounts = crb_accounts(n_accounts, seed)
+    performing = sum(a["status"] == ACCOUNT_STATUSES[0] for a in accounts)
+    with_default = sum(a["status"] == ACCOUNT_STATUSES[1] for a in accounts)
+    non_performing = len(accounts) - performing - with_default
+    outstanding = sum(a["balance"] for a in accounts)
+    ppi = f"M{rng.randint(1, 9)}"
+    lines = [
+        "METROPOL CREDIT REFERENCE BUREAU",
+        "CREDIT REPORT",
+        f"REPORTED NAMES: {NAMES[seed % len(NAMES)]} DOE",
+        f"NATIONAL ID : {20000000 + seed}",
+        "Phone Number(s)",
+        f"07{seed % 100:02d}123456, 0722000111",
+        "Email Address",
+        f"applicant{seed}@example.com",
+        "Metro-Score©",
+        "PPI©",
+        "Probability Of Default©",
+        f"{rng.randint(250, 800)}",
+        ppi,
+        f"{rng.randint(1, 40)} %",
+        f"The metropol PPI of this report indicates an average late payment of 0 to 10 days, graded {ppi}",
+        "EMPLOYMENT INFORMATION",
+        "Employer: ACME LIMITED",
+        f"Salary: {rng.randint(20, 300) * 1000:,}",
+        "Department: FINANCE",
+        "ACCOUNT SUMMARY",
+        "Total Accounts Non-Performing Performing With Default History Performing Without Default History",
+        f"Total {len(accounts)} {non_performing} {with_default} {performing}",
+        "Total Outstanding Balance",
+        "Total Accounts",
+        _money(outstanding),
+        "ACCOUNT DETAILS",
+    ]
+    for i, acc in enumerate(accounts):
+        lines.extend(_account_block(i, acc, layout))
+    return "\n".join(lines) + "\n"
+
+
+def vehicles(n, seed=0):
+    rng = random.Random(seed + 4)
+    return [(rng.choice(VEHICLES), rng.randint(2003, 2024)) for _ in range(n)]
+
+
+def text_to_pdf(text, lines_per_page=70, password=None):
+    """Lay text out one line per row, like the statements PyMuPDF reads back."""
+    lines = text.splitlines()
+    doc = fitz.open()
+    for start in range(0, max(len(lines), 1), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((36, 36), "\n".join(lines[start:start + lines_per_page]), fontsize=8)
+    options = {}
+    if password:
+        options = {"encryption": fitz.PDF_ENCRYPT_AES_256, "user_pw": password, "owner_pw": password + "-owner"}
+    data = doc.tobytes(garbage=3, deflate=True, **options)
+    doc.close()
+    return data
+
+
+def pad_pdf(data, size, seed=0):
+    """The PDF grown to about ``size`` bytes with an incompressible attachment, like a scanned statement."""
+    doc = fitz.open(stream=data, filetype="pdf")
+    padding = max(size - len(data), 0)
+    if padding:
+        doc.embfile_add("scan.bin", random.Random(seed).randbytes(padding))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _docx_cell(cell, wrap):
+    paragraphs = cell.split(" ", 1) if wrap else [cell]
+    return "<w:tc>" + "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(p)}</w:t></w:r></w:p>'
+                              for p in paragraphs) + "</w:tc>"
+
+
+def text_to_docx(text, table_from=None, wrap=False):
+    """Minimal .docx: lines before ``table_from`` as paragraphs, the rest as one table.
+
+    Table rows are split into cells on runs of two spaces or more; single-spaced
+    lines become one-cell rows. ``wrap`` puts each cell's first word in a
+    paragraph of its own, as a narration wrapped in its cell is.
+    """
+    lines = text.splitlines()
+    split = len(lines) if table_from is None else table_from
+    body = [f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in lines[:split]]
+    if split < len(lines):
+        body.append("<w:tbl>")
+        for line in lines[split:]:
+            cells = "".join(_docx_cell(cell, wrap) for cell in re.split(r" {2,}", line))
+            body.append(f"<w:tr>{cells}</w:tr>")
+        body.append("</w:tbl>")
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{"".join(body)}<w:sectPr/></w:body></w:document>')
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/word/document.xml" ContentType="application/'
+                         'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        archive.writestr("_rels/.rels",
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                         'relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        archive.writestr("word/document.xml", document)
+    return buf.getvalue()
+
+
+class SyntheticUpload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile (name, type, size plus the BytesIO API)."""
+
+    def __init__(self, data, name, mime):
+        super().__init__(data)
+        self.name = name
+        self.type = mime
+        self.size = len(data)
+
+
+def upload(data, name):
+    mime = {
+        "pdf": "application/pdf",
+        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "csv": "text/csv",
+    }.get(name.rsplit(".", 1)[-1], "text/plain")
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return SyntheticUpload(data, name, mime)
@@ -0,0 +1,51 @@
+"""Load the parser functions defined inside the Streamlit app scripts.
+
+The apps run their UI at import time, so they cannot simply be imported.
+``load_app`` keeps only the imports, upper-case constants and function
+definitions of a script and executes those, which gives a module-like object
+with e.g. ``process_mpesa`` and ``extract_crb_data`` as the app defines them.
+Pass ``ref`` to load the script as it was at another git commit.
+"""
+import ast
+import os
+import subprocess
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = {
+    "risk": "risk.py",
+    "scoring": "scoring.py",
+    "creditrisk": "Creditrisk.py",
+    "credit_analysis": "Credit_Analysis.py",
+    "credit_analysis1": "Credit_analysis_deploy/Credit_Analysis1.py",
+    "statement_analyzer": "Credit_analysis_deploy/test.py",
+}
+
+
+def _source(path, ref=None):
+    if ref is None:
+        with open(os.path.join(ROOT, path), encoding="utf-8") as fh:
+            return fh.read()
+    return subprocess.run(["git", "show", f"{ref}:{path}"], cwd=ROOT, check=True,
+                          capture_output=True, text=True).stdout
+
+
+def _keep(node):
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+        return True
+    if isinstance(node, (ast.Assign, ast.AnnAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return all(isinstance(t, ast.Name) and t.id.isupper() for t in targets)
+    return False
+
+
+def load_app(name, ref=None):
+    path = APPS[name]
+    tree = ast.parse(_source(path, ref), filename=path)
+    tree.body = [node for node in tree.body if _keep(node)]
+    module = types.ModuleType(f"legacy_{name}")
+    module.__file__ = os.path.join(ROOT, path)
+    exec(compile(tree, path, "exec"), module.__dict__)
+    return module
+
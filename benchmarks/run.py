@@ -0,0 +1,677 @@
+"""Time extraction, parsing, categorization and scoring on synthetic documents.
+
+Run from the repository root:
+
+    python -m benchmarks.run --sizes 1000 10000
+    python -m benchmarks.run --only parse/ --compare benchmarks/results/<older commit>.json
+
+Results are written as JSON (one file per commit by default) so two runs can
+be compared; ``--compare`` exits with status 1 when a workload got slower than
+the tolerance allows.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks import generators as gen
+from benchmarks.legacy import APPS, ROOT, load_app
+
+WORKLOADS = {}
+_apps = {}
+
+
+def app(name):
+    if name not in _apps:
+        _apps[name] = load_app(name)
+    return _apps[name]
+
+
+def workload(name):
+    """Register ``build(size, seed) -> (callable, items)``; only the callable is timed."""
+    def register(build):
+        WORKLOADS[name] = build
+        return build
+    return register
+
+
+# EXTRACTION
+@workload("extract/mpesa_pdf_fitz")
+def _(size, seed):
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed))
+    return (lambda: app("credit_analysis1").extract_text(gen.upload(pdf, "statement.pdf"))), size
+
+
+@workload("extract/mpesa_pdf_pdfplumber")
+def _(size, seed):
+    import pdfplumber
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed))
+
+    def extract():
+        # what scoring.py used to do on every rerun
+        with pdfplumber.open(gen.upload(pdf, "statement.pdf")) as doc:
+            return "\n".join(page.extract_text() for page in doc.pages if page.extract_text())
+    return extract, size
+
+
+@workload("extract/encrypted_pdf_reopen")
+def _(size, seed):
+    import fitz
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed), password="0712345678")
+
+    def extract():
+        # what extract_text used to do on every rerun: open, decrypt, read every page
+        doc = fitz.open(stream=pdf, filetype="pdf")
+        doc.authenticate("0712345678")
+        return "\n".join(page.get_text() for page in doc)
+    return extract, size
+
+
+@workload("extract/encrypted_pdf_cached")
+def _(size, seed):
+    from risk_core.pdf_cache import open_pdf
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed), password="0712345678")
+
+    def extract():
+        with open_pdf(pdf, password="0712345678") as handle:
+            return handle.text()
+    return extract, size
+
+
+@workload("extract/encrypted_pdf_guess")
+def _(size, seed):
+    from risk_core import pdf_cache
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed), password="254712345678")
+    guesses = pdf_cache.password_candidates("12345678 0712345678 0722000111 31234567")
+
+    def guess():
+        pdf_cache._cache.clear()
+        with pdf_cache.open_pdf(pdf, candidates=guesses) as handle:
+            return handle.page_count
+    return guess, len(guesses)
+
+
+@workload("extract/docx_python_docx_paragraphs")
+def _(size, seed):
+    import docx
+    data = gen.text_to_docx(gen.bank_text(size, seed), table_from=6)
+    # what the apps used to do: body paragraphs only, table rows are lost
+    return (lambda: "\n".join(p.text for p in docx.Document(gen.upload(data, "statement.docx")).paragraphs)), size
+
+
+@workload("extract/docx_python_docx_tables")
+def _(size, seed):
+    import docx
+    data = gen.text_to_docx(gen.bank_text(size, seed), table_from=6)
+
+    def extract():
+        document = docx.Document(gen.upload(data, "statement.docx"))
+        return "\n".join([p.text for p in document.paragraphs] +
+                         [" ".join(c.text for c in row.cells) for t in document.tables for row in t.rows])
+    return extract, size
+
+
+@workload("extract/docx_stream")
+def _(size, seed):
+    from risk_core.docx_stream import extract_docx_text
+    data = gen.text_to_docx(gen.bank_text(size, seed), table_from=6)
+    return (lambda: extract_docx_text(gen.upload(data, "statement.docx"))), size
+
+
+@workload("extract/mpesa_csv_pandas")
+def _(size, seed):
+    import pandas as pd
+    data = gen.mpesa_csv(size, seed)
+
+    def read():
+        # default read_csv, then the per-row Paid In / Withdrawn cleaning risk.py does
+        df = pd.read_csv(gen.upload(data, "statement.csv"))
+        df = df[df["Transaction Status"].str.lower() == "completed"]
+        paid_in = pd.to_numeric(df["Paid In"].fillna("0").astype(str).str.replace(",", ""), errors="coerce")
+        withdrawn = pd.to_numeric(df["Withdrawn"].fillna("0").astype(str).str.replace(",", ""), errors="coerce")
+        return pd.to_datetime(df["Completion Time"]), paid_in.fillna(0) - withdrawn.fillna(0).abs()
+    return read, size
+
+
+@workload("extract/mpesa_csv_arrow")
+def _(size, seed):
+    from risk_core.csv_ingest import read_statement_csv
+    data = gen.mpesa_csv(size, seed)
+    return (lambda: read_statement_csv(gen.upload(data, "statement.csv"))), size
+
+
+@workload("extract/crb_pdf_all_pages")
+def _(size, seed):
+    from risk_core import pdf_cache
+    pdf = gen.text_to_pdf(gen.crb_text(max(size // 10, 1), seed))
+
+    def extract():
+        pdf_cache._cache.clear()
+        with pdf_cache.open_pdf(pdf) as handle:
+            return handle.text()
+    return extract, max(size // 10, 1)
+
+
+@workload("extract/crb_pdf_sections")
+def _(size, seed):
+    from risk_core import pdf_cache
+    from risk_core.crb_pages import section_text
+    pdf = gen.text_to_pdf(gen.crb_text(max(size // 10, 1), seed))
+
+    def extract():
+        pdf_cache._cache.clear()
+        with pdf_cache.open_pdf(pdf) as handle:
+            return section_text(handle)
+    return extract, max(size // 10, 1)
+
+
+# PARSING
+for _name in ("credit_analysis", "credit_analysis1", "statement_analyzer"):
+    @workload(f"parse/mpesa_{_name}")
+    def _(size, seed, _name=_name):
+        text = gen.mpesa_text(size, seed)
+        return (lambda: app(_name).process_mpesa(text)), size
+
+
+@workload("parse/mpesa_rows_creditrisk")
+def _(size, seed):
+    text = gen.mpesa_text(size, seed, layout="rows")
+    return (lambda: app("creditrisk").parse_mpesa_statement(text)), size
+
+
+@workload("parse/bank_inline_credit_analysis1")
+def _(size, seed):
+    text = gen.bank_text(size, seed, layout="inline")
+    return (lambda: app("credit_analysis1").process_bank(text)), size
+
+
+@workload("parse/bank_multiline_statement_analyzer")
+def _(size, seed):
+    text = gen.bank_text(size, seed, layout="multiline")
+    return (lambda: app("statement_analyzer").process_bank(text)), size
+
+
+for _name in ("risk", "credit_analysis", "credit_analysis1"):
+    @workload(f"parse/crb_{_name}")
+    def _(size, seed, _name=_name):
+        text = gen.crb_text(max(size // 10, 1), seed)
+        return (lambda: app(_name).extract_crb_data(text)), max(size // 10, 1)
+
+
+@workload("parse/crb_accounts_scoring")
+def _(size, seed):
+    text = gen.crb_text(max(size // 10, 1), seed)
+    return (lambda: app("scoring").extract_accounts(text)), max(size // 10, 1)
+
+
+# PER DOCUMENT: everything an app runs on one extracted (text) upload
+@workload("document/mpesa_credit_analysis1")
+def _(size, seed):
+    data = gen.mpesa_text(size, seed).encode("utf-8")
+    ca1 = app("credit_analysis1")
+    return (lambda: ca1.process_mpesa(ca1.extract_text(gen.upload(data, "statement.txt")))), size
+
+
+@workload("document/bank_credit_analysis1")
+def _(size, seed):
+    data = gen.bank_text(size, seed, layout="inline").encode("utf-8")
+    ca1 = app("credit_analysis1")
+
+    def run():
+        text = ca1.extract_text(gen.upload(data, "statement.txt"))
+        return ca1.extract_bank(text), ca1.process_bank(text)
+    return run, size
+
+
+@workload("document/crb_credit_analysis1")
+def _(size, seed):
+    data = gen.crb_text(max(size // 10, 1), seed).encode("utf-8")
+    ca1 = app("credit_analysis1")
+    return (lambda: ca1.extract_crb_data(ca1.extract_text(gen.upload(data, "crb.txt")))), max(size // 10, 1)
+
+
+@workload("document/bank_statement_analyzer")
+def _(size, seed):
+    data = gen.bank_text(size, seed, layout="multiline").encode("utf-8")
+    analyzer = app("statement_analyzer")
+    return (lambda: analyzer.process_document(analyzer.extract_and_classify(gen.upload(data, "statement.txt")))), size
+
+
+# CATEGORIZATION
+for _name in APPS:
+    @workload(f"categorize/{_name}")
+    def _(size, seed, _name=_name):
+        narrations = [row[2] for row in gen.mpesa_transactions(size, seed)]
+        return (lambda: [app(_name).categorize_mpesa(d) for d in narrations]), size
+
+
+@workload("categorize/merchant_index_uncached")
+def _(size, seed):
+    from risk_core.rules import load_rules
+    narrations = [row[2] for row in gen.mpesa_transactions(size, seed)]
+    categorize = load_rules().matchers["scoring"].__wrapped__
+    return (lambda: [categorize(d) for d in narrations]), size
+
+
+# SCORING
+@workload("score/assess_risk_scoring")
+def _(size, seed):
+    text = gen.crb_text(max(size // 10, 1), seed)
+    scoring = app("scoring")
+    return (lambda: scoring.assess_risk(scoring.extract_ppi(text), scoring.extract_accounts(text))), max(size // 10, 1)
+
+
+@workload("score/scorecard_batch")
+def _(size, seed):
+    import numpy as np
+    import pandas as pd
+    from risk_core.rules import load_rules
+    rng = np.random.default_rng(seed)
+    applicants = pd.DataFrame({
+        "metro_score": rng.integers(200, 850, size),
+        "ppi": rng.choice(["M1", "M2", "M4", "M7", None], size),
+        "probability_of_default": rng.choice(["2 %", "8 %", "15 %", "35 %"], size),
+        "salary_regularity": rng.random(size),
+        "inflow_volatility": rng.random(size) * 2,
+        "betting_share": rng.random(size) * 0.3,
+        "fsv_coverage": rng.random(size) * 3,
+    })
+    card = load_rules().scorecards["application"]
+    return (lambda: card.score(applicants)), size
+
+
+@workload("score/collateral_stress")
+def _(size, seed):
+    import numpy as np
+    import pandas as pd
+    from risk_core.collateral import stress_test
+    rng = np.random.default_rng(seed)
+    loans = 10000
+    book = pd.DataFrame({
+        "model": rng.choice(["Toyota Fielder", "Probox", "Nissan Note", "Subaru Forester", "BMW X3", "Canters Isuzu"],
+                            loans),
+        "year": rng.integers(2008, 2024, loans),
+        "fsv_value": rng.integers(300_000, 3_000_000, loans).astype(float),
+    })
+    return (lambda: stress_test(book, paths=size, seed=seed)), size
+
+
+@workload("score/reprice_book")
+def _(size, seed):
+    import numpy as np
+    from risk_core.amortization import interest_rates, max_affordable, price_book
+    rng = np.random.default_rng(seed)
+    amount = rng.integers(50_000, 2_000_000, size)
+    periods = rng.integers(1, 37, size)
+    inflow = rng.random(size) * 200_000
+
+    def reprice():
+        price_book(amount, interest_rates(periods), periods)
+        max_affordable(inflow)
+    return reprice, size
+
+
+@workload("score/crb_exposure_queries")
+def _(size, seed):
+    import numpy as np
+    from risk_core.crb_accounts import LoanIntervals, parse_accounts
+    accounts = parse_accounts(gen.crb_text(max(size // 10, 1), seed))
+    dates = np.datetime64(gen.STATEMENT_END) - (np.arange(size) % 1800).astype("timedelta64[D]")
+
+    def query():
+        loans = LoanIntervals(accounts)
+        return loans.exposure_at(dates), loans.open_during(dates - 90, dates)
+    return query, size
+
+
+@workload("score/assessment_cache_hit")
+def _(size, seed):
+    import tempfile
+    from risk_core.assessment_cache import AssessmentCache
+    ca1 = app("credit_analysis1")
+    crb = ca1.extract_crb_data(gen.crb_text(max(size // 10, 1), seed))
+    mpesa_text = gen.mpesa_text(size, seed)
+    store = AssessmentCache(path=os.path.join(tempfile.mkdtemp(), "assessments.sqlite3"))
+    store.put("key", "bench", {"crb_summary": crb, "mpesa_summary": ca1.process_mpesa(mpesa_text)[1],
+                               "mpesa_flows": ca1.analyse_counterparties(mpesa_text)})
+    return (lambda: store.get("key")), size
+
+
+@workload("score/match_applicants")
+def _(size, seed):
+    from risk_core.applicants import consolidate, match_applicants
+    people = max(size // 3, 1)
+    documents = []
+    for i in range(size):
+        person = (i * 7919 + seed) % people
+        kind = ("crb", "bank", "mpesa")[i % 3]
+        documents.append({"document": i, "kind": kind, "name": gen.NAMES[person % len(gen.NAMES)],
+                          "national_id": str(20000000 + person) if kind == "crb" else None,
+                          "phone": f"07{person:08d}" if kind != "bank" else None,
+                          "account_number": f"01{person:011d}" if kind == "bank" else None})
+    return (lambda: consolidate(match_applicants(documents))), size
+
+
+def _counterparty_batch(size, seed):
+    """``size`` transactions of ~500 per applicant, with people and businesses shared between applicants."""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    people = [f"Funds received from 07{p % 90 + 10}***{p % 900 + 100} {gen.NAMES[p % len(gen.NAMES)]}"
+              for p in range(max(size // 5, 10))]
+    businesses = [f"Pay Bill to {b} - BUSINESS {b} Acc. 1" for b in range(100000, 100000 + max(size // 500, 10))]
+    narrations = np.array(people + businesses + ["Airtime Purchase"], dtype=object)
+    return pd.DataFrame({
+        "applicant": rng.integers(0, max(size // 500, 1), size),
+        "Date": pd.Timestamp(gen.STATEMENT_END) - pd.to_timedelta(rng.integers(0, 365 * 86400, size), unit="s"),
+        "Details": narrations[rng.integers(0, len(narrations), size)],
+        "Amount": np.round(rng.uniform(-6000, 25000, size), 2),
+    })
+
+
+@workload("score/counterparty_graph_build")
+def _(size, seed):
+    from risk_core.counterparties import CounterpartyGraph
+    batch = _counterparty_batch(size, seed)
+    return (lambda: CounterpartyGraph.from_frame(batch)), size
+
+
+@workload("score/counterparty_graph_queries")
+def _(size, seed):
+    from risk_core.counterparties import CounterpartyGraph
+    graph = CounterpartyGraph.from_frame(_counterparty_batch(size, seed))
+
+    def query():
+        graph.round_trips()
+        graph.inflow_concentration()
+        graph.shared_counterparties()
+    return query, size
+
+
+def _applications(size, seed):
+    """``size`` applications (CRB report, M-PESA and bank statements) and the stages Credit_Analysis1 runs."""
+    credit_analysis1 = app("credit_analysis1")
+    documents = [(gen.crb_text(20, seed + i), gen.mpesa_text(2000, seed + i), gen.bank_text(1000, seed + i))
+                 for i in range(size)]
+
+    def crb(document):
+        scores = credit_analysis1.extract_crb_data(document[0])["Credit Scores"]
+        return {"metro_score": scores.get("Metro-Score"), "ppi": scores.get("PPI"),
+                "probability_of_default": scores.get("Probability of Default")}
+
+    def statements(document):
+        credit_analysis1.process_mpesa(document[1])
+        credit_analysis1.analyse_counterparties(document[1])
+        credit_analysis1.process_bank(document[2])
+        return {}
+    return documents, crb, statements
+
+
+@workload("pipeline/applications_full")
+def _(size, seed):
+    documents, crb, statements = _applications(size, seed)
+    return (lambda: [(crb(d), statements(d)) for d in documents]), size
+
+
+@workload("pipeline/applications_staged")
+def _(size, seed):
+    from risk_core.policy import evaluate
+    from risk_core.rules import current_rules
+    documents, crb, statements = _applications(size, seed)
+
+    def decide(document):
+        # As Credit_Analysis1 does: the statements are parsed only when the CRB scores don't decline
+        inputs = crb(document)
+        if not evaluate(current_rules().policy, inputs).iloc[0]["declined"]:
+            statements(document)
+        return inputs
+    return (lambda: [decide(d) for d in documents]), size
+
+
+@workload("score/fsv_creditrisk")
+def _(size, seed):
+    cars = gen.vehicles(size, seed)
+    creditrisk = app("creditrisk")
+    return (lambda: [creditrisk.get_fsv(model, year) for model, year in cars]), size
+
+
+@workload("score/interest_rate_creditrisk")
+def _(size, seed):
+    periods = [1 + i % 36 for i in range(size)]
+    creditrisk = app("creditrisk")
+    return (lambda: [creditrisk.get_interest_rate(p) for p in periods]), size
+
+
+# FEATURES
+@workload("features/statement_dates")
+def _(size, seed):
+    import numpy as np
+    import pandas as pd
+    from risk_core.dates import parse_dates
+    rng = np.random.default_rng(seed)
+    # Two-digit years: the old fixed %d/%m/%Y read none, so every row went through format="mixed"
+    dates = pd.Timestamp(gen.STATEMENT_END) - pd.to_timedelta(rng.integers(0, 365, size), unit="D")
+    column = pd.Series(dates.strftime("%d/%m/%y"))
+    return (lambda: parse_dates(column)), size
+
+
+@workload("features/cashflow_batch")
+def _(size, seed):
+    import numpy as np
+    import pandas as pd
+    from risk_core.features import cashflow_features
+    rng = np.random.default_rng(seed)
+    categories = np.array(["Income", "Betting", "WatuCredit", "MogoCredit", "Shopping",
+                           "Other (Outflow)", "Other (Inflow)"])
+    category = rng.choice(categories, size)
+    dates = pd.Timestamp(gen.STATEMENT_END) - pd.to_timedelta(rng.integers(0, 365, size), unit="D")
+    frame = pd.DataFrame({
+        "applicant": rng.integers(0, max(size // 600, 1), size),  # ~50 transactions a month each
+        "Date": dates.strftime("%d/%m/%Y"),
+        "Amount": rng.uniform(100, 20000, size).round(2),
+        "Inflow/Outflow": np.where(np.isin(category, ["Income", "Other (Inflow)"]), "Inflow", "Outflow"),
+        "Category": category,
+    })
+    return (lambda: cashflow_features(frame, applicant_col="applicant")), size
+
+
+# RECONCILIATION: a PDF statement parse that lost rows, put right
+def _damaged_statement(size, seed):
+    from risk_core import pdf_cache
+    from risk_core.parsers import mpesa_from_text
+    pdf = gen.text_to_pdf(gen.mpesa_text(size, seed, layout="rows"))
+    parse = lambda text: mpesa_from_text(text, "statement_analyzer")  # noqa: E731
+    full = parse(pdf_cache.pdf_text(pdf)[0])
+    # One row lost in every thousand
+    damaged = full.drop(index=range(size // 2, size, 1000)).reset_index(drop=True)
+    return pdf, parse, damaged
+
+
+@workload("reconcile/balance_check")
+def _(size, seed):
+    from risk_core.reconcile import reconcile
+    _, _, damaged = _damaged_statement(size, seed)
+    return (lambda: reconcile(damaged)), size
+
+
+@workload("reconcile/reparse_all_pages")
+def _(size, seed):
+    from risk_core import pdf_cache
+    pdf, parse, _ = _damaged_statement(size, seed)
+
+    def reextract():
+        pdf_cache._cache.clear()
+        with pdf_cache.open_pdf(pdf) as handle:
+            return parse(handle.text(sort=True))
+    return reextract, size
+
+
+@workload("reconcile/reparse_spans")
+def _(size, seed):
+    from risk_core import pdf_cache
+    from risk_core.reconcile import reconcile
+    pdf, parse, damaged = _damaged_statement(size, seed)
+
+    def reparse(anchors):
+        return parse(pdf_cache.span_text(pdf, anchors)[0])
+
+    def repair():
+        pdf_cache._cache.clear()
+        return reconcile(damaged, reparse)
+    return repair, size
+
+
+# RENDERING
+def _trend(size, seed):
+    import pandas as pd
+    return pd.Series([row[3] for row in gen.mpesa_transactions(size, seed)]).cumsum()
+
+
+@workload("render/trend_chart_pyplot")
+def _(size, seed):
+    import io
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    trend = _trend(size, seed)
+
+    def draw():
+        # what scoring.py used to do: a new pyplot figure per rerun, never closed
+        fig, ax = plt.subplots()
+        trend.plot(ax=ax, color="green")
+        fig.savefig(io.BytesIO(), format="png")
+    return draw, size
+
+
+@workload("render/trend_chart_downsampled")
+def _(size, seed):
+    from risk_core import rendering
+    trend = _trend(size, seed)
+    return (lambda: rendering._draw("line", trend, {"color": "green"})), size
+
+
+@workload("render/trend_chart_cached")
+def _(size, seed):
+    from risk_core import rendering
+    trend = _trend(size, seed)
+    return (lambda: rendering.chart_png("line", trend, color="green")), size
+
+
+# RUNNER
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def peak_memory(fn):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(sizes, repeat, seed, only=None, memory=False):
+    results = []
+    for name, build in WORKLOADS.items():
+        if only and not any(part in name for part in only):
+            continue
+        for size in sizes:
+            fn, items = build(size, seed)
+            times = measure(fn, repeat)
+            best = min(times)
+            results.append({
+                "workload": name,
+                "size": size,
+                "items": items,
+                "min_s": best,
+                "median_s": statistics.median(times),
+                "items_per_s": items / best if best else None,
+            })
+            line = f"{name:45s} size={size:<8d} min={best * 1000:10.2f} ms  median={results[-1]['median_s'] * 1000:10.2f} ms"
+            if memory:
+                results[-1]["peak_bytes"] = peak_memory(fn)
+                line += f"  peak={results[-1]['peak_bytes'] / 2**20:8.1f} MiB"
+            print(line)
+    return results
+
+
+def compare(results, previous, tolerance):
+    old = {(r["workload"], r["size"]): r for r in previous["results"]}
+    regressions = []
+    for r in results:
+        before = old.get((r["workload"], r["size"]))
+        if not before or not before["min_s"]:
+            continue
+        ratio = r["min_s"] / before["min_s"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append((r["workload"], r["size"], ratio))
+            flag = "  <-- REGRESSION"
+        print(f"{r['workload']:45s} size={r['size']:<8d} {ratio:6.2f}x vs {previous.get('commit', '?')}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="transactions per statement (CRB reports get size/10 accounts)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run workloads whose name contains any of these")
+    parser.add_argument("--memory", action="store_true", help="also record peak Python memory (tracemalloc)")
+    parser.add_argument("--out", help="JSON output path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a workload counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = run(args.sizes, args.repeat, args.seed, args.only, args.memory)
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} workload(s) regressed beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
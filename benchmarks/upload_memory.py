@@ -0,0 +1,168 @@
+"""Resident memory per session while several sessions upload large PDFs at once.
+
+    PYTHONPATH=. python -m benchmarks.upload_memory [--sessions 4] [--mb 50] [--reruns 3] [--deploy inline pool]
+
+Each run is a fresh process: ``--sessions`` threads each hold a different
+``--mb`` MB statement and, ``--reruns`` times, do what Credit_Analysis1 does
+with it on every rerun (fingerprint it for the assessment cache, then extract
+its text through ``run_job``), with ``RISK_DEPLOY_MODE`` set to each
+``--deploy`` mode. Memory is the RSS of the process and its pool workers.
+Reported per session:
+
+* ``peak``: the most above the baseline (uploads already in memory, pool
+  workers started) while the sessions run;
+* ``retained``: what is still held once the sessions finish and the uploads
+  are released, as Streamlit does when a session ends (PDF cache handles).
+
+Two ways of handing the upload over:
+
+* ``copy``: the calls as the apps made them before ``risk_core.uploads``,
+  passing ``getvalue()`` to the fingerprint and to ``pdf_text``;
+* ``spill``: ``upload_fingerprint`` and ``pdf_text`` on the ``upload_source(...)`` of a ``with`` block.
+
+Linux only (RSS is read from /proc).
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import generators as gen
+
+PAGE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _children(pid):
+    found = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except FileNotFoundError:
+        return found
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                found.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            pass
+    return found
+
+
+def tree_rss(pid=None):
+    """RSS in bytes of ``pid`` (this process by default) and all its descendants."""
+    pending, total = [pid or os.getpid()], 0
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE
+        except FileNotFoundError:
+            continue
+        pending.extend(_children(current))
+    return total
+
+
+def _copy_session(file):
+    from risk_core.pdf_cache import open_pdf, pdf_text
+    from risk_core.workers import run_job
+    data = file.getvalue()
+    open_pdf(data).release()
+    hashlib.sha256(data).hexdigest()
+    return run_job(pdf_text, file.getvalue(), None, (), None)[0]
+
+
+def _spill_session(file):
+    from risk_core.assessment_cache import upload_fingerprint
+    from risk_core.pdf_cache import pdf_text
+    from risk_core.uploads import upload_digest, upload_source
+    from risk_core.workers import run_job
+    upload_fingerprint(file)
+    with upload_source(file) as source:
+        return run_job(pdf_text, source, None, (), None, digest=upload_digest(file))[0]
+
+
+SESSIONS = {"copy": _copy_session, "spill": _spill_session}
+
+
+def _concurrently(fn, items):
+    start = threading.Barrier(len(items))
+
+    def run(item):
+        start.wait()
+        fn(item)
+    threads = [threading.Thread(target=run, args=(item,)) for item in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def child(mode, sessions, mb, reruns):
+    # Imported up front (both modes) so the baseline includes them
+    import risk_core.assessment_cache
+    from risk_core.pdf_cache import pdf_text
+    from risk_core.workers import run_job
+    session = SESSIONS[mode]
+    statement = gen.text_to_pdf(gen.mpesa_text(2000, 0))
+    # Start the pool workers (if any) before the baseline, on a small document
+    _concurrently(lambda _: run_job(pdf_text, statement), range(sessions))
+    gc.collect()
+    before_uploads = tree_rss()
+    uploads = [gen.upload(gen.pad_pdf(statement, mb << 20, seed), "statement.pdf") for seed in range(sessions)]
+    baseline = peak = tree_rss()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, tree_rss())
+            time.sleep(0.002)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    began = time.perf_counter()
+    _concurrently(lambda file: [session(file) for _ in range(reruns)], uploads)
+    seconds = time.perf_counter() - began
+    done.set()
+    sampler.join()
+    del uploads
+    gc.collect()
+    print(json.dumps({"peak_mb": (peak - baseline) / sessions / 2 ** 20,
+                      "retained_mb": (tree_rss() - before_uploads) / sessions / 2 ** 20, "seconds": seconds}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--mb", type=int, default=50)
+    parser.add_argument("--reruns", type=int, default=3)
+    parser.add_argument("--deploy", nargs="+", default=["inline", "pool"], choices=["inline", "pool"])
+    parser.add_argument("--child", choices=list(SESSIONS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child, args.sessions, args.mb, args.reruns)
+        return 0
+
+    print(f"{args.sessions} concurrent sessions, {args.mb} MB PDF each, {args.reruns} reruns")
+    for deploy in args.deploy:
+        for mode in SESSIONS:
+            with tempfile.TemporaryDirectory() as spill_dir:
+                env = dict(os.environ, RISK_UPLOAD_SPILL_DIR=spill_dir, RISK_DEPLOY_MODE=deploy,
+                           RISK_POOL_WORKERS=str(args.sessions), RISK_POOL_PER_USER=str(args.sessions))
+                out = subprocess.run([sys.executable, "-m", "benchmarks.upload_memory", "--child", mode,
+                                      "--sessions", str(args.sessions), "--mb", str(args.mb),
+                                      "--reruns", str(args.reruns)],
+                                     env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{deploy:6s} {mode:6s} peak={result['peak_mb']:8.1f} MB/session  "
+                  f"retained={result['retained_mb']:8.1f} MB/session  time={result['seconds']:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
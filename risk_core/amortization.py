@@ -0,0 +1,121 @@
+"""Repayment schedules, book pricing and affordability, over arrays of loans.
+
+Rates are the monthly percentages of the ``rate_tiers`` in ``rules.json``
+(4.0 means 4% a month). Two methods:
+
+* ``flat``: interest is charged on the original amount every month, so the
+  installment is ``amount * (1 / n + r)``; this is how the tiers are quoted;
+* ``reducing``: interest on the outstanding balance, the usual annuity
+  ``amount * r / (1 - (1 + r) ** -n)``.
+
+Everything broadcasts: ``amount``, ``rate`` and ``periods`` can be scalars or
+arrays of the same shape, so ``price_book`` re-prices a whole book with a few
+array operations and ``schedule`` builds one row per month per loan from the
+closed-form balance.
+
+Affordability caps the installment at ``max_debt_service_ratio`` of the
+average monthly inflow (``affordability`` in ``rules.json``). An installment
+is linear in the amount, so the affordable amount for a term is the capped
+installment divided by the installment per shilling; ``max_affordable``
+evaluates every term from 1 to ``max_periods`` with its tier rate at once and
+picks the largest amount.
+"""
+import numpy as np
+import pandas as pd
+
+from risk_core.rules import current_rules
+
+METHODS = ("flat", "reducing")
+
+
+def interest_rates(periods, rules=None):
+    """Vectorised ``Rules.interest_rate``: the first tier containing each period wins."""
+    rules = rules or current_rules()
+    periods = np.asarray(periods)
+    rates = np.full(periods.shape, rules.default_rate, dtype=float)
+    for low, high, rate in reversed(rules.rate_tiers):
+        rates = np.where((periods >= low) & (periods <= high), rate, rates)
+    return rates
+
+
+def installment_factor(rate, periods, method="flat"):
+    """Monthly installment per shilling borrowed."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown amortization method {method!r}; expected one of {METHODS}")
+    r = np.asarray(rate, dtype=float) / 100
+    n = np.asarray(periods, dtype=float)
+    if method == "flat":
+        return 1 / n + r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = r / -np.expm1(-n * np.log1p(r))
+    return np.where(r == 0, 1 / n, annuity)
+
+
+def installment(amount, rate, periods, method="flat"):
+    return np.asarray(amount, dtype=float) * installment_factor(rate, periods, method)
+
+
+def price_book(amount, rate, periods, method="flat"):
+    """Installment, total interest and total repayable for every loan."""
+    amount, rate, periods = np.broadcast_arrays(np.atleast_1d(np.asarray(amount, dtype=float)), rate, periods)
+    monthly = installment(amount, rate, periods, method)
+    repayable = monthly * periods
+    return pd.DataFrame({"installment": monthly, "total_interest": repayable - amount,
+                         "total_repayable": repayable})
+
+
+def schedule(amount, rate, periods, method="flat"):
+    """Month-by-month schedule: one row per (loan, month) up to each loan's own term."""
+    amount, r, n = np.broadcast_arrays(np.atleast_1d(np.asarray(amount, dtype=float)),
+                                       np.atleast_1d(np.asarray(rate, dtype=float)) / 100,
+                                       np.atleast_1d(np.asarray(periods, dtype=int)))
+    months = np.arange(1, n.max() + 1)
+    a, rr, nn = amount[:, None], r[:, None], n[:, None]
+    monthly = installment(a, rr * 100, nn, method)
+    if method == "flat":
+        interest = np.broadcast_to(a * rr, (len(amount), len(months)))
+        balance = a * (1 - months / nn)
+    else:
+        growth = (1 + rr) ** months
+        with np.errstate(divide="ignore", invalid="ignore"):
+            balance = np.where(rr == 0, a * (1 - months / nn), a * ((1 + rr) ** nn - growth) / ((1 + rr) ** nn - 1))
+        opening = np.concatenate([a, balance[:, :-1]], axis=1)
+        interest = opening * rr
+    within = months <= nn
+    loan, month = np.nonzero(within)
+    payment = np.broadcast_to(monthly, within.shape)
+    return pd.DataFrame({
+        "loan": loan,
+        "month": months[month],
+        "installment": payment[within],
+        "interest": interest[within],
+        "principal": payment[within] - interest[within],
+        "balance": np.clip(balance[within], 0, None),
+    })
+
+
+def max_affordable(monthly_inflow, periods=None, max_periods=36, method=None, ratio=None, rules=None):
+    """Largest amount whose installment fits in ``ratio`` of the monthly inflow.
+
+    ``monthly_inflow`` may be an array (one applicant per entry). With
+    ``periods`` the term is fixed; otherwise every term up to ``max_periods``
+    is tried and the one allowing the largest amount is kept. Returns a frame
+    with ``amount``, ``periods``, ``rate`` and ``installment``.
+    """
+    rules = rules or current_rules()
+    method = method or rules.affordability.get("method", "flat")
+    ratio = rules.affordability.get("max_debt_service_ratio", 0.4) if ratio is None else ratio
+    inflow = np.atleast_1d(np.asarray(monthly_inflow, dtype=float))
+    budget = np.clip(inflow, 0, None) * ratio
+    if periods is not None:
+        terms = np.broadcast_to(np.asarray(periods, dtype=int), inflow.shape)
+        rates = interest_rates(terms, rules)
+        amounts = budget / installment_factor(rates, terms, method)
+        return pd.DataFrame({"amount": amounts, "periods": terms, "rate": rates, "installment": budget})
+    terms = np.arange(1, int(max_periods) + 1)
+    rates = interest_rates(terms, rules)
+    # applicants x terms
+    amounts = budget[:, None] / installment_factor(rates, terms, method)[None, :]
+    best = amounts.argmax(axis=1)
+    return pd.DataFrame({"amount": amounts[np.arange(len(inflow)), best], "periods": terms[best],
+                         "rate": rates[best], "installment": budget})
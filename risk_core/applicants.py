@@ -0,0 +1,193 @@
+"""Link CRB reports, bank statements and M-PESA statements to applicants.
+
+Each document is reduced to the identifiers it carries: the CRB Bio Data
+(name, National ID, phone numbers), the bank header (Account Holder Name, Account Number)
+and the M-PESA header (Customer Name, Mobile Number). Identifiers are
+normalised (digits only for IDs and account numbers, the last nine digits
+for Kenyan mobile numbers, upper-cased sorted name tokens for names; a CRB
+report can list several phone numbers) and
+``match_applicants`` joins documents through one hash table per identifier,
+merging the matches with a union-find, so a batch of n documents is matched
+in O(n) dictionary operations.
+
+IDs, phone numbers and account numbers are joined first. Names are joined
+last and only between applicants whose identifiers don't disagree: two
+"JOHN KAMAU" reports with different National IDs, or two statements with
+different phone numbers, stay two applicants.
+
+``consolidate`` then gives one row per applicant, and
+``applicant_transactions`` stacks that applicant's parsed statements with an
+``applicant`` column, ready for ``cashflow_features(df, applicant_col="applicant")``.
+"""
+import re
+from collections import Counter
+
+import pandas as pd
+
+DOCUMENT_COLUMNS = ["document", "kind", "name", "national_id", "phone", "account_number"]
+STRONG_KEYS = ("national_id", "phone", "account_number")
+MISSING = {"", "N/A", "NONE", "NAN"}
+
+_NON_WORD = re.compile(r"[^A-Z ]+")
+_NON_DIGIT = re.compile(r"\D+")
+_PHONE_SEPARATORS = re.compile(r"[,;/\n]+")
+
+
+# NORMALISATION
+def normalize_name(name):
+    if not isinstance(name, str) or name.strip().upper() in MISSING:
+        return None
+    tokens = _NON_WORD.sub(" ", name.upper()).split()
+    return " ".join(sorted(tokens)) or None
+
+
+def normalize_digits(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    digits = _NON_DIGIT.sub("", str(value))
+    return digits.lstrip("0") or None
+
+
+def normalize_phone(value):
+    digits = normalize_digits(value)
+    if digits is None:
+        return None
+    # 0712345678, 254712345678 and +254 712 345 678 are the same line
+    return digits[-9:] if len(digits) >= 9 and digits[-9] in "17" else digits
+
+
+def normalize_phones(value):
+    """A document can list several numbers ("0712345678, 0722000111")."""
+    if not isinstance(value, str):
+        value = None if value is None else str(value)
+    phones = (normalize_phone(part) for part in _PHONE_SEPARATORS.split(value or ""))
+    return tuple(dict.fromkeys(p for p in phones if p))
+
+
+# DOCUMENT IDENTIFIERS
+def crb_identifiers(document, crb_summary, text=""):
+    bio = crb_summary.get("Bio Data", {})
+    phones = re.search(r"Phone Number\(s\)[^\n]*\n\s*([\d, +]+)", text)
+    return {"document": document, "kind": "crb", "name": bio.get("Name"), "national_id": bio.get("National ID"),
+            "phone": phones.group(1) if phones else None}
+
+
+def bank_identifiers(document, bank_info):
+    return {"document": document, "kind": "bank", "name": bank_info.get("Account Holder Name"),
+            "account_number": bank_info.get("Account Number")}
+
+
+def mpesa_identifiers(document, text):
+    name = re.search(r"Customer Name:\s*(.*)", text)
+    phone = re.search(r"Mobile Number:\s*([+\d][\d ]*)", text)
+    return {"document": document, "kind": "mpesa", "name": name.group(1).strip() if name else None,
+            "phone": phone.group(1) if phone else None}
+
+
+# MATCHING
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+
+def _normalized(documents):
+    frame = pd.DataFrame(documents, columns=DOCUMENT_COLUMNS) if not isinstance(documents, pd.DataFrame) \
+        else documents.reindex(columns=DOCUMENT_COLUMNS)
+    return {
+        "name": [normalize_name(v) for v in frame["name"]],
+        "national_id": [normalize_digits(v) for v in frame["national_id"]],
+        "phone": [normalize_phones(v) for v in frame["phone"]],
+        "account_number": [normalize_digits(v) for v in frame["account_number"]],
+    }, frame
+
+
+def match_applicants(documents):
+    """Documents (records or a frame with DOCUMENT_COLUMNS) with an ``applicant`` number added."""
+    keys, frame = _normalized(documents)
+    n = len(frame)
+    sets = _UnionFind(n)
+
+    def values(column, i):
+        value = keys[column][i]
+        return value if isinstance(value, tuple) else () if value is None else (value,)
+
+    def joins(column):
+        first = {}
+        for i in range(n):
+            for value in values(column, i):
+                j = first.setdefault(value, i)
+                if j != i:
+                    yield j, i
+
+    for column in STRONG_KEYS:
+        for a, b in joins(column):
+            a, b = sets.find(a), sets.find(b)
+            if a != b:
+                sets.parent[b] = a
+
+    # Identifiers per applicant so far, to refuse name joins between different people
+    known = {}
+    for i in range(n):
+        root = sets.find(i)
+        if root not in known:
+            known[root] = {k: set() for k in STRONG_KEYS}
+        root = known[root]
+        for k in STRONG_KEYS:
+            root[k].update(values(k, i))
+    for a, b in joins("name"):
+        a, b = sets.find(a), sets.find(b)
+        if a == b or any(known[a][k] and known[b][k] and not known[a][k] & known[b][k] for k in STRONG_KEYS):
+            continue
+        sets.parent[b] = a
+        merged = known.pop(b)
+        for k in STRONG_KEYS:
+            known[a][k] |= merged[k]
+
+    roots = [sets.find(i) for i in range(n)]
+    result = frame.copy()
+    result["applicant"] = pd.factorize(pd.Series(roots))[0]
+    for column, values in keys.items():
+        result[f"{column}_key"] = values
+    return result
+
+
+def consolidate(matched):
+    """One row per applicant: most frequent name, identifiers and the documents that belong to them."""
+    rows = {}
+    columns = ("applicant", "document", "kind", "name", "name_key", "national_id_key", "phone_key",
+               "account_number_key")
+    for applicant, document, kind, name, name_key, national_id, phone, account in zip(*(matched[c] for c in columns)):
+        row = rows.get(applicant)
+        if row is None:
+            row = rows[applicant] = {"names": Counter(), "national_ids": set(), "phones": set(),
+                                     "account_numbers": set(), "documents": [], "kinds": set()}
+        if name_key is not None:
+            row["names"][name.strip()] += 1
+        row["phones"].update(phone)
+        for key, value in (("national_ids", national_id), ("account_numbers", account)):
+            if value is not None:
+                row[key].add(value)
+        row["documents"].append(document)
+        row["kinds"].add(kind)
+    return pd.DataFrame.from_records([
+        {"applicant": applicant,
+         "name": row["names"].most_common(1)[0][0] if row["names"] else None,
+         **{k: sorted(row[k]) for k in ("national_ids", "phones", "account_numbers", "kinds")},
+         "documents": row["documents"]}
+        for applicant, row in sorted(rows.items())
+    ]).set_index("applicant")
+
+
+def applicant_transactions(matched, frames):
+    """Stack parsed statements ({document: frame}) with the applicant each belongs to."""
+    applicant = dict(zip(matched["document"], matched["applicant"]))
+    stacked = [frame.assign(applicant=applicant[document], document=document)
+               for document, frame in frames.items() if frame is not None and document in applicant]
+    return pd.concat(stacked, ignore_index=True) if stacked else pd.DataFrame(columns=["applicant", "document"])
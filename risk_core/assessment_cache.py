@@ -0,0 +1,203 @@
+"""Persistent cache of finished assessments, keyed by the documents reviewed.
+
+Reopening an application (approver, auditor, or the officer after a reload)
+used to extract and parse every document again. ``assessment_key`` combines
+the SHA-256 of the M-PESA, CRB and bank uploads with the rules version into
+one key, and ``load_assessment`` / ``save_assessment`` keep what the app
+derived from them in a local SQLite file, so a reviewed application comes
+back in one indexed read.
+
+* Entries expire ``RISK_ASSESSMENT_TTL_SECONDS`` after they were written and
+  the least recently read are dropped beyond ``RISK_ASSESSMENT_CACHE_SIZE``.
+* The rules version is part of the key, and entries written under another
+  version are deleted on the next save, so publishing new rules invalidates
+  every cached result.
+* An encrypted PDF only gets a key once it has been unlocked with the
+  password (or candidates) the caller supplied, so the cache never shows a
+  locked document's results to someone who could not open it.
+
+Entries hold the summaries, features and identifiers the app derived, never
+the documents' text, stored as JSON (frames in pandas' ``table`` layout), so
+reading an entry can't run code. The file lives in a directory only its owner
+can enter (``RISK_ASSESSMENT_CACHE_DIR``, created 0700 like the upload spill
+directory, and refused if another user owns it or can read it) and is created
+0600; ``RISK_ASSESSMENT_CACHE`` overrides the file path.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from risk_core.pdf_cache import open_pdf
+from risk_core.rules import current_rules
+from risk_core.uploads import upload_digest, upload_source
+
+CACHE_DIR = os.environ.get("RISK_ASSESSMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "risk_assessments"))
+CACHE_FILE = os.environ.get("RISK_ASSESSMENT_CACHE", os.path.join(CACHE_DIR, "assessments.sqlite3"))
+TTL_SECONDS = float(os.environ.get("RISK_ASSESSMENT_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.environ.get("RISK_ASSESSMENT_CACHE_SIZE", "512"))
+
+logger = logging.getLogger("risk_core.assessment_cache")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    key TEXT PRIMARY KEY,
+    rules_version TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assessments_accessed ON assessments (accessed);
+CREATE INDEX IF NOT EXISTS assessments_version ON assessments (rules_version);
+"""
+
+
+# PAYLOAD
+def _encode(value):
+    if isinstance(value, pd.DataFrame):
+        return {"__frame__": value.to_json(orient="table", index=False, date_unit="s")}
+    if isinstance(value, pd.Series):
+        return {"__series__": value.to_dict()}
+    if isinstance(value, pd.Timestamp):
+        return {"__timestamp__": value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"can't store {type(value).__name__} in an assessment")
+
+
+def _decode(obj):
+    if "__frame__" in obj:
+        return pd.read_json(io.StringIO(obj["__frame__"]), orient="table")
+    if "__series__" in obj:
+        return pd.Series(obj["__series__"])
+    if "__timestamp__" in obj:
+        return pd.Timestamp(obj["__timestamp__"])
+    return obj
+
+
+def dumps(assessment):
+    return zlib.compress(json.dumps(assessment, default=_encode).encode("utf-8"))
+
+
+def loads(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"), object_hook=_decode)
+
+
+def _private_file(path):
+    """Create ``path``'s directory 0700 and the file 0600; refuse a directory another user owns or can read."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{directory} must be private to this user (mode 0700)")
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+
+
+class AssessmentCache:
+    def __init__(self, path=CACHE_FILE, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        _private_file(path)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between Streamlit's session threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT payload FROM assessments WHERE key = ? AND created > ?",
+                             (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE assessments SET accessed = ? WHERE key = ?", (now, key))
+        return loads(row[0])
+
+    def put(self, key, rules_version, assessment):
+        now = time.time()
+        payload = dumps(assessment)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO assessments VALUES (?, ?, ?, ?, ?)",
+                       (key, rules_version, now, now, payload))
+            db.execute("DELETE FROM assessments WHERE rules_version != ? OR created <= ?",
+                       (rules_version, now - self.ttl))
+            db.execute("DELETE FROM assessments WHERE key IN (SELECT key FROM assessments "
+                       "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM assessments")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _shared_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssessmentCache()
+        return _store
+
+
+# KEYS
+def upload_fingerprint(file, password=None, candidates=()):
+    """SHA-256 of an upload; None for a PDF the supplied passwords don't unlock."""
+    if file is None:
+        return ""
+    digest = upload_digest(file)
+    if file.type == "application/pdf":
+        try:
+            with upload_source(file) as source:
+                open_pdf(source, password=password, candidates=candidates, digest=digest).release()
+        except Exception:
+            return None
+    return digest
+
+
+def assessment_key(*fingerprints, rules_version=None):
+    """One key for the documents and rules version; None when any document couldn't be fingerprinted."""
+    if any(f is None for f in fingerprints) or not any(fingerprints):
+        return None
+    version = rules_version or current_rules().version
+    return hashlib.sha256("|".join([*fingerprints, version]).encode("utf-8")).hexdigest()
+
+
+# LOOKUPS
+def load_assessment(key):
+    if key is None:
+        return None
+    try:
+        return _shared_store().get(key)
+    except (sqlite3.Error, OSError, zlib.error, ValueError) as e:
+        logger.warning("Assessment cache read failed: %s", e)
+        return None
+
+
+def save_assessment(key, assessment, rules_version=None):
+    if key is None:
+        return
+    try:
+        _shared_store().put(key, rules_version or current_rules().version, assessment)
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        logger.warning("Assessment cache write failed: %s", e)
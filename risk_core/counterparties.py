@@ -0,0 +1,239 @@
+"""Who an applicant's money comes from and goes to, across statements and applicants.
+
+M-PESA narrations name the other side of each transaction: a phone number and
+a name ("Funds received from 0712***345 JOHN KAMAU") or a paybill, till or
+business number ("Pay Bill to 888880 - KPLC PREPAID Acc. 12345").
+``counterparty_keys`` reads it out of each distinct narration once. A masked
+phone number is shared by many people, so a person is keyed by number and
+name; a business by its number alone.
+
+``CounterpartyGraph`` keeps one edge per transaction: its signed amount and
+its time (int64 seconds), sorted by (applicant, counterparty, time), with
+applicants and counterparties replaced by integer ids. Offsets mark each
+(applicant, counterparty) pair's run of edges and each applicant's run of
+pairs; the pairs sorted by counterparty give the other direction. That is
+about 16 bytes per transaction plus 30 per pair, and each query is a few
+passes over the arrays:
+
+* ``round_trips``: money sent to a counterparty that came back from it, within
+  ``window_days`` and ``tolerance`` of the amount sent (each payment counted
+  in at most one round trip);
+* ``inflow_concentration``: each applicant's inflow, how many senders it came
+  from and the share of the ``top`` largest (inflows inflated by a few
+  friendly senders);
+* ``shared_counterparties``: pairs of applicants dealing with the same people
+  (counterparties of more than ``max_applicants`` applicants, such as
+  utilities and lenders, are left out);
+* ``counterparties_of`` / ``applicants_of``: one applicant's counterparties with
+  totals, and the applicants of one counterparty.
+
+Build it from Date / Details / Amount ledgers (``parsers.mpesa_ledger`` for
+PDF and text statements, ``csv_ingest.read_statement_csv`` for exports): all
+the statements of one applicant, or a batch keyed by applicant
+(``from_ledgers``). Transactions without a counterparty (airtime, fees) are
+left out, so shares are of the inflow with a known sender.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from risk_core.applicants import normalize_name
+
+# 0712***345, 2547******123, +254712345678; at least eight characters, so six-digit paybills don't match
+_PHONE_PARTY = re.compile(r"\b(?:from|to)\s+((?:\+?254|0)[17][\d*]{6,10})\s+(?:-\s*)?([A-Za-z][A-Za-z .'&-]*)",
+                          re.IGNORECASE)
+_BUSINESS_PARTY = re.compile(r"\b(?:from|to|till)\s+(\d{4,8})\b(?:\s*-\s*(.*?))?(?=\s+Acc\.|\s+via\b|$)",
+                             re.IGNORECASE)
+NO_COUNTERPARTY = (None, None)
+SECOND = np.timedelta64(1, "s")
+
+
+def _counterparty(narration):
+    if not isinstance(narration, str):
+        return NO_COUNTERPARTY
+    match = _PHONE_PARTY.search(narration)
+    if match:
+        name = " ".join(match.group(2).upper().split())
+        return f"{match.group(1)} {normalize_name(name) or ''}".strip(), name
+    match = _BUSINESS_PARTY.search(narration)
+    if match:
+        return match.group(1), " ".join((match.group(2) or "").upper().split()) or match.group(1)
+    return NO_COUNTERPARTY
+
+
+def counterparty_keys(details):
+    """(keys, names): the counterparty of each narration, None where it names none."""
+    codes, narrations = pd.factorize(pd.Series(details, dtype=object))
+    # One parse per distinct narration; the extra last entry is what code -1 (missing) picks up
+    parsed = [_counterparty(n) for n in narrations] + [NO_COUNTERPARTY]
+    keys = np.array([key for key, _ in parsed], dtype=object)
+    names = np.array([name for _, name in parsed], dtype=object)
+    return keys[codes], names[codes]
+
+
+class CounterpartyGraph:
+    def __init__(self, applicants, counterparties, amounts, times=None, names=None):
+        counterparties = np.asarray(counterparties, dtype=object)
+        applicant_ids, self.applicants = pd.factorize(pd.Series(np.asarray(applicants, dtype=object)))
+        counterparty_ids, self.counterparties = pd.factorize(pd.Series(counterparties))
+        edge_counterparty = counterparty_ids
+        amounts = np.asarray(amounts, dtype=float)
+        times = np.full(len(amounts), np.datetime64("NaT"), "datetime64[s]") if times is None else \
+            pd.to_datetime(pd.Series(times)).to_numpy().astype("datetime64[s]")
+        keep = np.flatnonzero((applicant_ids >= 0) & (counterparty_ids >= 0) & np.isfinite(amounts))
+        pair_codes = applicant_ids[keep].astype(np.int64) * max(len(self.counterparties), 1) + counterparty_ids[keep]
+        order = keep[np.lexsort((times[keep].view(np.int64), pair_codes))]
+
+        self.amount = amounts[order]
+        self.time = times[order]
+        applicant_ids = applicant_ids[order].astype(np.int32)
+        counterparty_ids = counterparty_ids[order].astype(np.int32)
+        first = np.flatnonzero(np.r_[True, (applicant_ids[1:] != applicant_ids[:-1]) |
+                                     (counterparty_ids[1:] != counterparty_ids[:-1])]) if len(order) else \
+            np.zeros(0, dtype=np.int64)
+        self.pair_start = np.r_[first, len(order)]
+        self.pair_applicant = applicant_ids[first]
+        self.pair_counterparty = counterparty_ids[first]
+        self.applicant_start = np.searchsorted(self.pair_applicant, np.arange(len(self.applicants) + 1))
+        self.by_counterparty = np.argsort(self.pair_counterparty, kind="stable").astype(np.int32)
+        self.counterparty_start = np.searchsorted(self.pair_counterparty[self.by_counterparty],
+                                                  np.arange(len(self.counterparties) + 1))
+        self.received = self._per_pair(np.where(self.amount > 0, self.amount, 0.0))
+        self.sent = -self._per_pair(np.where(self.amount < 0, self.amount, 0.0))
+
+        # The name each counterparty first appears with
+        self.names = np.asarray(self.counterparties, dtype=object)
+        if names is not None:
+            ids, at = np.unique(edge_counterparty, return_index=True)
+            valid = ids >= 0
+            self.names = self.names.copy()
+            self.names[ids[valid]] = np.asarray(names, dtype=object)[at[valid]]
+
+    @classmethod
+    def from_frame(cls, df, applicant_col="applicant"):
+        """Date / Details / Amount rows with an applicant column."""
+        keys, names = counterparty_keys(df["Details"])
+        return cls(df[applicant_col], keys, df["Amount"], df["Date"] if "Date" in df else None, names)
+
+    @classmethod
+    def from_ledgers(cls, ledgers):
+        """``{applicant: ledger or [ledgers]}``: each applicant's statements, any number of applicants."""
+        frames = [frame[["Date", "Details", "Amount"]].assign(applicant=applicant)
+                  for applicant, statements in ledgers.items()
+                  for frame in (statements if isinstance(statements, (list, tuple)) else [statements])
+                  if frame is not None and len(frame)]
+        stacked = pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame({"Date": pd.Series(dtype="datetime64[s]"), "Details": pd.Series(dtype=object),
+                          "Amount": pd.Series(dtype=float), "applicant": pd.Series(dtype=object)})
+        return cls.from_frame(stacked)
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.amount, self.time, self.pair_start, self.pair_applicant,
+                                      self.pair_counterparty, self.applicant_start, self.by_counterparty,
+                                      self.counterparty_start, self.received, self.sent))
+
+    def _per_pair(self, values):
+        if not len(values):
+            return np.zeros(len(self.pair_applicant))
+        return np.add.reduceat(values, self.pair_start[:-1])
+
+    def _pair_frame(self, pairs):
+        counterparty = self.pair_counterparty[pairs]
+        return pd.DataFrame({
+            "applicant": np.asarray(self.applicants)[self.pair_applicant[pairs]],
+            "counterparty": np.asarray(self.counterparties)[counterparty],
+            "name": self.names[counterparty],
+            "received": self.received[pairs],
+            "sent": self.sent[pairs],
+            "transactions": (self.pair_start[1:] - self.pair_start[:-1])[pairs],
+            "first": self.time[self.pair_start[:-1][pairs]],
+            "last": self.time[self.pair_start[1:][pairs] - 1],
+        })
+
+    def counterparties_of(self, applicant):
+        """One applicant's counterparties, largest flows first."""
+        i = self.applicants.get_loc(applicant)
+        frame = self._pair_frame(np.arange(self.applicant_start[i], self.applicant_start[i + 1]))
+        order = np.argsort(-(frame["received"] + frame["sent"]).to_numpy(), kind="stable")
+        return frame.iloc[order].drop(columns="applicant").reset_index(drop=True)
+
+    def applicants_of(self, counterparty):
+        j = self.counterparties.get_loc(counterparty)
+        pairs = self.by_counterparty[self.counterparty_start[j]:self.counterparty_start[j + 1]]
+        return list(np.asarray(self.applicants)[self.pair_applicant[pairs]])
+
+    def round_trips(self, window_days=30, tolerance=0.2):
+        """Money sent to a counterparty and received back from it.
+
+        Each inflow is matched with the latest earlier outflow to the same
+        counterparty; it is a round trip when it came within ``window_days``
+        and within ``tolerance`` (a fraction) of the amount sent. An outflow
+        counts once, with the first inflow that qualifies: sending 1,000 and
+        getting 1,000 back twice is one round trip.
+        """
+        index = np.arange(len(self))
+        last_out = np.maximum.accumulate(np.where(self.amount < 0, index, -1)) if len(self) else index
+        back = np.flatnonzero((self.amount > 0) & (last_out >= 0))
+        out = last_out[back]
+        edge_pair = np.repeat(np.arange(len(self.pair_applicant)), np.diff(self.pair_start))
+        same = edge_pair[out] == edge_pair[back]
+        back, out = back[same], out[same]
+        sent, returned = -self.amount[out], self.amount[back]
+        elapsed = self.time[back] - self.time[out]
+        keep = ~np.isnat(elapsed) & (elapsed <= window_days * 86400 * SECOND) & \
+            (np.abs(returned - sent) <= tolerance * sent)
+        # Inflows run in time order, so the first of each outflow's matches is its earliest
+        out, first = np.unique(out[keep], return_index=True)
+        back = back[keep][first]
+        pairs = edge_pair[back]
+        counterparty = self.pair_counterparty[pairs]
+        return pd.DataFrame({
+            "applicant": np.asarray(self.applicants)[self.pair_applicant[pairs]],
+            "counterparty": np.asarray(self.counterparties)[counterparty],
+            "name": self.names[counterparty],
+            "sent_at": self.time[out],
+            "sent": -self.amount[out],
+            "returned_at": self.time[back],
+            "returned": self.amount[back],
+        })
+
+    def inflow_concentration(self, top=3):
+        """Inflow per applicant, its number of senders, the share from the ``top`` largest and the HHI."""
+        n = len(self.applicants)
+        applicant = self.pair_applicant
+        total = np.bincount(applicant, self.received, minlength=n)
+        order = np.lexsort((-self.received, applicant))
+        rank = np.arange(len(order)) - self.applicant_start[applicant[order]]
+        largest = order[rank < top]
+        top_total = np.bincount(applicant[largest], self.received[largest], minlength=n)
+        share = np.divide(self.received, total[applicant], out=np.zeros(len(applicant)), where=total[applicant] > 0)
+        return pd.DataFrame({
+            "inflow": total,
+            "senders": np.bincount(applicant, self.received > 0, minlength=n).astype(int),
+            "top_share": np.divide(top_total, total, out=np.zeros(n), where=total > 0),
+            "hhi": np.bincount(applicant, share ** 2, minlength=n),
+        }, index=pd.Index(self.applicants, name="applicant"))
+
+    def shared_counterparties(self, max_applicants=20):
+        """Pairs of applicants and how many counterparties they share, most first."""
+        sizes = np.diff(self.counterparty_start)
+        eligible = np.repeat((sizes >= 2) & (sizes <= max_applicants), sizes)
+        position = np.flatnonzero(eligible)
+        # Every later position in the same counterparty's run is a partner
+        partners = np.repeat(self.counterparty_start[1:], sizes)[position] - position - 1
+        left = np.repeat(position, partners)
+        right = left + 1 + np.arange(len(left)) - np.repeat(np.cumsum(partners) - partners, partners)
+        applicant = self.pair_applicant[self.by_counterparty]
+        # Runs list applicants in id order, so left < right
+        key = applicant[left].astype(np.int64) * len(self.applicants) + applicant[right]
+        pairs, shared = np.unique(key, return_counts=True)
+        labels = np.asarray(self.applicants)
+        order = np.argsort(-shared, kind="stable")
+        return pd.DataFrame({"applicant_a": labels[pairs[order] // max(len(self.applicants), 1)],
+                             "applicant_b": labels[pairs[order] % max(len(self.applicants), 1)],
+                             "shared": shared[order]})
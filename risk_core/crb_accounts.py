@@ -0,0 +1,134 @@
+"""Account-level CRB parsing and date-interval queries over the accounts.
+
+``parse_accounts`` walks the report once, line by line: a line naming a status
+("Performing Account Without Default History", "Performing Account With
+Default History", "Non-Performing Account"), alone or labelled ("Account
+Status: ..."), opens an account block and the labelled lines after it fill its
+fields, whether the value follows the label on the same line or on the next
+one. Text after the status on its line is a field too, or the lender when it
+has no label. The result is one row per account:
+
+    status, lender, account_number, principal, balance, arrears, opened, closed
+
+``LoanIntervals`` sorts the opened and closed dates once and keeps prefix
+sums in each order, so "exposure at date X" and "loans open during a window"
+are a few binary searches however many loans the applicant has. An account
+counts as open from its opened date up to, but not including, its closed
+date; accounts without a closed date are still open.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from risk_core.dates import parse_dates
+
+ACCOUNT_STATUSES = ("Performing Account Without Default History", "Performing Account With Default History",
+                    "Non-Performing Account")
+ACCOUNT_COLUMNS = ["status", "lender", "account_number", "principal", "balance", "arrears", "opened", "closed"]
+
+_LABELS = {
+    "lender": "lender",
+    "account number": "account_number",
+    "principal amount": "principal",
+    "current balance": "balance",
+    "days in arrears": "arrears",
+    "account opened": "opened",
+    "account closed": "closed",
+}
+_STATUS = re.compile(r"\b(" + "|".join(re.escape(s) for s in ACCOUNT_STATUSES) + r")\b", re.IGNORECASE)
+_FIELD = re.compile(r"^\s*(" + "|".join(re.escape(k) for k in _LABELS) + r")\b\s*:?\s*(.*?)\s*$", re.IGNORECASE)
+_STATUS_NAMES = {s.lower(): s for s in ACCOUNT_STATUSES}
+_NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_NUMERIC = ("principal", "balance", "arrears")
+FAR_FUTURE = np.datetime64("9999-12-31", "D")
+
+
+def parse_accounts(text):
+    columns = {c: [] for c in ACCOUNT_COLUMNS}
+    current = None
+    pending = None
+
+    def flush():
+        if current is not None:
+            for c in ACCOUNT_COLUMNS:
+                columns[c].append(current.get(c))
+            for c in _NUMERIC:
+                number = _NUMBER.search(columns[c][-1] or "")
+                columns[c][-1] = float(number.group().replace(",", "")) if number else np.nan
+
+    def take(line, unlabelled=None):
+        """Fill a field from ``line``; returns the field still waiting for its value."""
+        field = _FIELD.match(line)
+        if field:
+            key = _LABELS[field.group(1).lower()]
+            if not field.group(2):
+                return key
+            current.setdefault(key, field.group(2))
+        elif unlabelled and line.strip():
+            current.setdefault(unlabelled, line.strip())
+        return None
+
+    for line in text.splitlines():
+        status = _STATUS.search(line)
+        if status:
+            flush()
+            current = {"status": _STATUS_NAMES[status.group(1).lower()]}
+            pending = take(line[status.end():].strip(" :-\t"), unlabelled="lender")
+            continue
+        if current is not None:
+            pending = take(line, unlabelled=pending)
+    flush()
+
+    frame = pd.DataFrame(columns, columns=ACCOUNT_COLUMNS)
+    frame["status"] = pd.Categorical(frame["status"], categories=ACCOUNT_STATUSES)
+    frame[list(_NUMERIC)] = frame[list(_NUMERIC)].astype(float)
+    for c in ("opened", "closed"):
+        frame[c] = parse_dates(frame[c])
+    return frame
+
+
+class LoanIntervals:
+    def __init__(self, accounts, amount="principal"):
+        opened = accounts["opened"].to_numpy(dtype="datetime64[D]")
+        keep = ~np.isnat(opened)
+        opened = opened[keep]
+        closed = accounts["closed"].to_numpy(dtype="datetime64[D]")[keep]
+        closed = np.where(np.isnat(closed), FAR_FUTURE, closed)
+        amounts = np.nan_to_num(accounts[amount].to_numpy(dtype=float)[keep])
+
+        start_order = np.argsort(opened, kind="stable")
+        end_order = np.argsort(closed, kind="stable")
+        self.starts = opened[start_order]
+        self.ends = closed[end_order]
+        self.start_prefix = np.concatenate(([0.0], np.cumsum(amounts[start_order])))
+        self.end_prefix = np.concatenate(([0.0], np.cumsum(amounts[end_order])))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _at(self, dates):
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        return (np.searchsorted(self.starts, dates, side="right"),
+                np.searchsorted(self.ends, dates, side="right"))
+
+    def open_at(self, dates):
+        started, ended = self._at(dates)
+        return started - ended
+
+    def exposure_at(self, dates):
+        """Total amount of the loans open on each date."""
+        started, ended = self._at(dates)
+        return self.start_prefix[started] - self.end_prefix[ended]
+
+    def open_during(self, start, end):
+        """Loans open at any point from ``start`` to ``end`` inclusive."""
+        started = np.searchsorted(self.starts, np.asarray(end, dtype="datetime64[D]"), side="right")
+        ended = np.searchsorted(self.ends, np.asarray(start, dtype="datetime64[D]"), side="right")
+        return started - ended
+
+    def opened_during(self, start, end):
+        """Loans opened from ``start`` to ``end`` inclusive."""
+        lo = np.searchsorted(self.starts, np.asarray(start, dtype="datetime64[D]"), side="left")
+        hi = np.searchsorted(self.starts, np.asarray(end, dtype="datetime64[D]"), side="right")
+        return hi - lo
@@ -0,0 +1,36 @@
+"""Read only the pages of a CRB report that the summary parsers look at.
+
+``extract_crb_data`` needs the bio data, the Metro-Score / PPI / probability
+of default block and the account summary, which sit on the first pages of a
+report; the account history after them can run to dozens of pages.
+``section_text`` reads pages in order until every anchor has been seen, then
+returns the text of the anchor pages plus the page after each (a section that
+starts at the bottom of a page ends on the next one). Reports missing an
+anchor fall back to the full text, exactly as before.
+"""
+from risk_core.instrumentation import record
+
+CRB_ANCHORS = ("REPORTED NAMES", "NATIONAL ID", "Metro-Score", "Probability Of Default", "Total Outstanding Balance")
+
+
+def anchor_pages(handle, anchors=CRB_ANCHORS):
+    """Map each anchor to the first page containing it, stopping once all are found."""
+    found = {}
+    for number in range(handle.page_count):
+        text = handle.page_text(number)
+        for anchor in anchors:
+            if anchor not in found and anchor in text:
+                found[anchor] = number
+        if len(found) == len(anchors):
+            break
+    return found
+
+
+def section_text(handle, anchors=CRB_ANCHORS, spill=1):
+    found = anchor_pages(handle, anchors)
+    if len(found) < len(anchors):
+        record(pages_read=handle.page_count)
+        return handle.text()
+    pages = sorted({min(page + offset, handle.page_count - 1) for page in found.values() for offset in range(spill + 1)})
+    record(pages_read=len(pages))
+    return handle.text(pages)
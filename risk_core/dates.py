@@ -0,0 +1,86 @@
+"""Statement dates parsed once per distinct value, in the statement's own format.
+
+The bank and "Ksh" parsers kept ``Date`` as the strings they matched, and
+every consumer parsed them again, row by row through ``format="mixed"`` when
+the fixed ``%d/%m/%Y`` didn't fit. A statement writes all its dates one way
+and repeats them heavily (a year of transactions falls on a few hundred days),
+so ``parse_dates``
+
+* factorizes the column and works on its distinct values only;
+* ``detect_format``: tries the formats statements use on a sample of those
+  values and keeps the one that reads the most (day-first wins ties, as on
+  Kenyan statements);
+* parses the distinct values with that explicit format (``%d/%m/%Y`` is
+  rewritten as ISO 8601 for numpy, several times faster than pandas'
+  strptime on the few hundred values of a statement), falls back to
+  ``format="mixed", dayfirst=True`` for the few it doesn't read, and maps the
+  results back to the rows.
+
+Parsers whose pattern fixes the layout pass it as ``date_format`` and skip
+detection. They return ``Date`` as ``datetime64``, NaT where a row had no
+readable date.
+"""
+import numpy as np
+import pandas as pd
+
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%d %H:%M", "%d-%m-%Y",
+                "%d.%m.%Y", "%d %b %Y", "%d-%b-%Y", "%d %B %Y", "%m/%d/%Y")
+SAMPLE_SIZE = 64
+
+
+def detect_format(values, formats=DATE_FORMATS, sample_size=SAMPLE_SIZE):
+    """The format reading the most of ``values`` (distinct date strings), or None when none reads any."""
+    sample = pd.Index(values[:sample_size], dtype=object)
+    best, best_count = None, 0
+    for date_format in formats:
+        count = int(pd.to_datetime(sample, format=date_format, errors="coerce").notna().sum())
+        if count > best_count:
+            best, best_count = date_format, count
+            if count == len(sample):
+                break
+    return best
+
+
+def _day_first_iso(text):
+    """``%d/%m/%Y`` values as datetime64 through numpy's ISO parser, NaT where a value has another shape;
+    None when numpy rejects one (31/02/2025, " 3/4/2025"), for pandas to read them all."""
+    iso = []
+    for value in text:
+        parts = value.split("/")
+        if len(parts) == 3 and len(parts[2]) == 4 and parts[2].isdigit():
+            iso.append(f"{parts[2]}-{parts[1]:0>2}-{parts[0]:0>2}")
+        else:
+            iso.append("NaT")
+    try:
+        return np.array(iso, dtype="datetime64[ns]")
+    except ValueError:
+        return None
+
+
+def parse_dates(values, date_format=None):
+    """``values`` as datetime64, a Series for a Series, else a DatetimeIndex.
+
+    ``date_format`` skips detection when the caller knows the format.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values if isinstance(values, pd.Series) else np.asarray(values, dtype=object))
+    text = [v if isinstance(v, str) else str(v) for v in uniques.tolist()]
+    date_format = date_format or detect_format(text)
+    # One slot per distinct value plus a NaT at the end, which code -1 (missing) picks up
+    parsed = np.full(len(text) + 1, np.datetime64("NaT"), "datetime64[ns]")
+    fast = _day_first_iso(text) if date_format == "%d/%m/%Y" else None
+    if fast is not None:
+        parsed[:-1] = fast
+    elif date_format:
+        parsed[:-1] = pd.to_datetime(pd.Index(text, dtype=object), format=date_format,
+                                     errors="coerce").to_numpy(dtype="datetime64[ns]")
+    unread = np.flatnonzero(np.isnat(parsed[:-1]))
+    if len(unread):
+        parsed[unread] = pd.to_datetime(pd.Index(text, dtype=object)[unread], format="mixed", dayfirst=True,
+                                        errors="coerce").to_numpy(dtype="datetime64[ns]")
+    dates = parsed[codes]
+    if isinstance(values, pd.Series):
+        return pd.Series(dates, index=values.index, name=values.name)
+    return pd.DatetimeIndex(dates)
+
@@ -0,0 +1,47 @@
+"""Extracted document text with the views the parsers share, each computed once.
+
+Every parser used to start from the raw string: the M-PESA, bank and "Ksh"
+parsers each split it into lines, ``extract_bank`` and the CRB parser each
+collapsed its whitespace with two regex passes over the whole document, and
+the statement analyzer lower-cased it twice to classify it. ``Document`` is a
+``str`` (so it goes anywhere the text went: regexes, widgets, the assessment
+cache) that also carries
+
+* ``lines``: the text split on "\\n";
+* ``normalized``: blank lines dropped, runs of spaces and tabs collapsed to
+  one space, ends stripped (what ``re.sub(r'\\n\\s*\\n+', '\\n', ...)`` then
+  ``re.sub(r'[ \\t]+', ' ', ...)`` then ``strip()`` produced), built from
+  ``lines`` with ``str.replace`` rather than a regex with a match at every
+  column gap;
+* ``folded``: the case-folded text, for keyword checks.
+
+Each view is computed the first time a parser asks for it and kept on the
+object. The apps wrap the text once per extraction; parsers accept a plain
+string too (``as_document``). Pickling keeps only the text.
+"""
+from functools import cached_property
+
+
+class Document(str):
+    @cached_property
+    def lines(self):
+        return self.split("\n")
+
+    @cached_property
+    def normalized(self):
+        text = "\n".join([line for line in self.lines if line and not line.isspace()]).replace("\t", " ")
+        # Each pass halves every run of spaces
+        while "  " in text:
+            text = text.replace("  ", " ")
+        return Document(text.strip())
+
+    @cached_property
+    def folded(self):
+        return self.casefold()
+
+    def __reduce__(self):
+        return Document, (str(self),)
+
+
+def as_document(text):
+    return text if isinstance(text, Document) else Document(text)
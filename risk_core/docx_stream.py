@@ -0,0 +1,77 @@
+"""Streaming text extraction for .docx uploads.
+
+python-docx builds the whole object model and its ``Document.paragraphs``
+skips tables, which is where statement rows usually live. ``iter_docx_blocks``
+reads ``word/document.xml`` straight out of the zip with
+``lxml.etree.iterparse`` and yields body paragraphs and table rows in
+document order, clearing each element once it has been read, so memory stays
+flat however long the document is. A row's cells, a cell's paragraphs and
+the rows of a table nested in a cell are joined by a space, so a narration
+wrapped over two paragraphs still reads as separate words. ``file`` is an
+upload, a path (a spilled upload) or the document's bytes.
+"""
+import io
+import zipfile
+
+from lxml import etree
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_TEXT_TAGS = (W + "t", W + "tab", W + "br", W + "cr")
+
+
+def _text(el):
+    parts = []
+    for node in el.iter(*_TEXT_TAGS):
+        if node.tag == W + "t":
+            parts.append(node.text or "")
+        elif node.tag == W + "tab":
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _cell_text(tc):
+    parts = []
+    for child in tc.iterchildren():
+        if child.tag == W + "tbl":
+            parts.extend(_row_text(tr) for tr in child.iterchildren(W + "tr"))
+        else:  # paragraphs, and content controls wrapping them
+            parts.extend(_text(para).strip() for para in child.iter(W + "p"))
+    return " ".join(part for part in parts if part)
+
+
+def _row_text(tr):
+    return " ".join(cell for cell in (_cell_text(tc) for tc in tr.iterchildren(W + "tc")) if cell)
+
+
+def _release(el):
+    el.clear()
+    parent = el.getparent()
+    if parent is not None:
+        while el.getprevious() is not None:
+            del parent[0]
+
+
+def iter_docx_blocks(file):
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        file = io.BytesIO(file)
+    with zipfile.ZipFile(file) as archive, archive.open("word/document.xml") as xml:
+        table_depth = 0
+        for event, el in etree.iterparse(xml, events=("start", "end"), tag=(W + "p", W + "tbl", W + "tr")):
+            if el.tag == W + "tbl":
+                table_depth += 1 if event == "start" else -1
+                if event == "end" and table_depth == 0:
+                    _release(el)
+            elif event != "end":
+                continue
+            elif el.tag == W + "p" and table_depth == 0:
+                yield _text(el)
+                _release(el)
+            elif el.tag == W + "tr" and table_depth == 1:
+                yield _row_text(el)
+                _release(el)
+
+
+def extract_docx_text(file):
+    return "\n".join(iter_docx_blocks(file))
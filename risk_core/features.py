@@ -0,0 +1,151 @@
+"""Cash-flow features for credit decisions, computed in one grouped pass.
+
+``cashflow_features`` takes a parsed transaction frame (the ``process_bank`` /
+``process_mpesa`` output or a CSV export) and returns one row per applicant:
+
+    months                   months covered by the statement
+    avg_monthly_inflow       mean of monthly inflows
+    avg_monthly_outflow      mean of monthly outflows
+    inflow_volatility        std / mean of monthly inflows (0 = perfectly steady)
+    salary_regularity        share of months with at least one income credit
+    betting_share            betting outflow / total outflow
+    loan_app_concentration   Herfindahl index of repayments across loan apps (1 = one lender)
+    loan_apps                number of distinct loan apps repaid
+    min_balance              lowest balance (running net flow when there is no Balance column)
+
+Dates are parsed once, rows are reduced by a single groupby over
+(applicant, month, category), and every feature is derived from that small
+aggregate. Months are counted from an applicant's first to last: a month
+without a transaction is a month of no inflow, not a month left out.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from risk_core.dates import parse_dates
+from risk_core.rules import current_rules
+
+INCOME_CATEGORIES = ("Income",)
+BETTING_CATEGORIES = ("Betting",)
+LOAN_CATEGORIES = ("Loan Repayment", "Loans", "Loan", "Credit", "WatuCredit", "MomentumCredit",
+                   "PlatinumCredit", "MogoCredit")
+CACHE_SIZE = 128
+
+FEATURE_COLUMNS = ["months", "avg_monthly_inflow", "avg_monthly_outflow", "inflow_volatility",
+                   "salary_regularity", "betting_share", "loan_app_concentration", "loan_apps",
+                   "min_balance"]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def signed_amounts(df):
+    amount = df["Amount"].to_numpy(dtype=float)
+    if "Inflow/Outflow" in df.columns:
+        return np.where(df["Inflow/Outflow"].to_numpy() == "Outflow", -np.abs(amount), np.abs(amount))
+    return amount
+
+
+def _every_month(monthly):
+    """``monthly`` with a row of no flows for each month between an applicant's first and last that had none."""
+    months = monthly.index.get_level_values("month")
+    numbers = months.to_numpy().astype("datetime64[M]").astype(np.int64)
+    span = pd.Series(numbers).groupby(monthly.index.get_level_values("applicant"), sort=False).agg(["min", "max"])
+    counts = (span["max"] - span["min"] + 1).to_numpy()
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    every = (np.repeat(span["min"].to_numpy(), counts) + offsets).astype("datetime64[M]")
+    index = pd.MultiIndex.from_arrays([np.repeat(span.index.to_numpy(), counts), every.astype(months.dtype)],
+                                      names=["applicant", "month"])
+    monthly = monthly.reindex(index)
+    flows = ["inflow", "outflow", "salary", "betting"]
+    monthly[flows] = monthly[flows].fillna(0.0)
+    return monthly
+
+
+def cashflow_features(df, applicant_col=None, date_col="Date", date_format=None):
+    if df is None or df.empty or date_col not in df.columns:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+
+    amount = signed_amounts(df)
+    dates = parse_dates(df[date_col], date_format).to_numpy()
+    valid = ~np.isnat(dates)
+    applicant = df[applicant_col].to_numpy() if applicant_col else np.zeros(len(df), dtype=np.int8)
+    category = df["Category"].to_numpy() if "Category" in df.columns else np.full(len(df), "Other", dtype=object)
+
+    rows = pd.DataFrame({
+        "applicant": applicant[valid],
+        "month": dates[valid].astype("datetime64[M]"),
+        "category": category[valid],
+        "inflow": np.clip(amount[valid], 0, None),
+        "outflow": np.clip(-amount[valid], 0, None),
+    })
+    if "Balance" in df.columns:
+        rows["balance"] = pd.to_numeric(df["Balance"], errors="coerce").to_numpy()[valid]
+    else:
+        # Without a balance column, track the running net flow in date order
+        order = np.argsort(dates[valid], kind="stable")
+        running = pd.Series(amount[valid][order]).groupby(applicant[valid][order]).cumsum().to_numpy()
+        balance = np.empty(len(order))
+        balance[order] = running
+        rows["balance"] = balance
+
+    grouped = rows.groupby(["applicant", "month", "category"], sort=False, observed=True).agg(
+        inflow=("inflow", "sum"), outflow=("outflow", "sum"), balance=("balance", "min"))
+    grouped = grouped.reset_index()
+
+    income = grouped["category"].isin(INCOME_CATEGORIES)
+    grouped["salary"] = np.where(income, grouped["inflow"], 0.0)
+    grouped["betting"] = np.where(grouped["category"].isin(BETTING_CATEGORIES), grouped["outflow"], 0.0)
+    loans = grouped["category"].isin(LOAN_CATEGORIES)
+
+    monthly = grouped.groupby(["applicant", "month"], sort=False).agg(
+        inflow=("inflow", "sum"), outflow=("outflow", "sum"), salary=("salary", "sum"),
+        betting=("betting", "sum"), balance=("balance", "min"))
+    monthly = _every_month(monthly)
+    by_applicant = monthly.groupby(level="applicant", sort=False)
+    features = pd.DataFrame({
+        "months": by_applicant.size(),
+        "avg_monthly_inflow": by_applicant["inflow"].mean(),
+        "avg_monthly_outflow": by_applicant["outflow"].mean(),
+        "inflow_volatility": by_applicant["inflow"].std(ddof=0) / by_applicant["inflow"].mean(),
+        "salary_regularity": (monthly["salary"] > 0).groupby(level="applicant", sort=False).mean(),
+        "betting_share": by_applicant["betting"].sum() / by_applicant["outflow"].sum(),
+        "min_balance": by_applicant["balance"].min(),
+    })
+
+    loan_totals = grouped[loans].groupby(["applicant", "category"], sort=False)["outflow"].sum()
+    loan_totals = loan_totals[loan_totals > 0]
+    shares = loan_totals / loan_totals.groupby(level="applicant").transform("sum")
+    features["loan_app_concentration"] = (shares ** 2).groupby(level="applicant").sum()
+    features["loan_apps"] = shares.groupby(level="applicant").size()
+    features[["loan_app_concentration", "loan_apps"]] = features[["loan_app_concentration", "loan_apps"]].fillna(0)
+    features = features.replace([np.inf, -np.inf], np.nan)
+    features.index.name = applicant_col or "applicant"
+    return features[FEATURE_COLUMNS]
+
+
+# PER-DOCUMENT CACHE
+def document_fingerprint(content):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def features_for_document(fingerprint, df, **kwargs):
+    """cashflow_features for a single statement, memoised on the document fingerprint and the rules version
+    (the rules categorise ``df``'s rows)."""
+    key = (fingerprint, current_rules().version, tuple(sorted(kwargs.items())))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    features = cashflow_features(df, **kwargs)
+    result = {k: float(v) for k, v in features.iloc[0].items()} if len(features) else {}
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
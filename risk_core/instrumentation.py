@@ -0,0 +1,237 @@
+"""Per-stage timing, document metrics and opt-in profiling for the apps.
+
+Each Streamlit rerun is treated as one request: call ``start_request`` at the
+top of the script and ``finish_request`` at the bottom. Stages are timed with
+``stage(...)`` blocks or the ``@timed(...)`` decorator, and ``record(...)``
+attaches sizes (bytes, pages, transactions) to the stage that is running.
+
+Settings (environment variables):
+    RISK_METRICS_FILE           Prometheus text file rewritten after every request
+    RISK_DEBUG_PANEL=1          always show the debug panel (or add ?debug=1 to the URL)
+    RISK_PROFILE                "cprofile" or "pyinstrument" to profile requests
+    RISK_PROFILE_SLOW_SECONDS   only keep a profile for requests slower than this
+    RISK_PROFILE_DIR            where the captured profile is written
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger("risk_core.metrics")
+
+METRICS_FILE = os.environ.get("RISK_METRICS_FILE")
+DEBUG_PANEL = os.environ.get("RISK_DEBUG_PANEL") == "1"
+PROFILE_MODE = os.environ.get("RISK_PROFILE", "").lower()
+PROFILE_SLOW_SECONDS = float(os.environ.get("RISK_PROFILE_SLOW_SECONDS", "5"))
+PROFILE_DIR = os.environ.get("RISK_PROFILE_DIR", "profiles")
+
+_local = threading.local()
+_lock = threading.Lock()
+# (app, stage) -> {"calls": n, "seconds": s, <numeric attr>: total}
+_totals = defaultdict(lambda: defaultdict(float))
+_gauges = {}
+_profile_captured = False
+
+
+class RequestTrace:
+    def __init__(self, app):
+        self.app = app
+        self.stages = []
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.profiler = None
+        self.profile_path = None
+
+
+def current_request():
+    return getattr(_local, "trace", None)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+# STAGES
+@contextlib.contextmanager
+def stage(name, **attrs):
+    rec = {"stage": name, **attrs}
+    stack = _stack()
+    rec["depth"] = len(stack)
+    stack.append(rec)
+    trace = current_request()
+    if trace:
+        trace.stages.append(rec)
+    start = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = time.perf_counter() - start
+        stack.pop()
+        _finish_stage(rec)
+
+
+def timed(name=None):
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**attrs):
+    """Attach document metrics (bytes=, pages=, transactions=...) to the running stage."""
+    stack = _stack()
+    if stack:
+        stack[-1].update(attrs)
+
+
+def gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def _finish_stage(rec):
+    trace = current_request()
+    app = trace.app if trace else "unknown"
+    with _lock:
+        totals = _totals[(app, rec["stage"])]
+        totals["calls"] += 1
+        for key, value in rec.items():
+            if key not in ("stage", "depth") and isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] += value
+    logger.info(json.dumps({"event": "stage", "app": app, **rec}, default=str))
+
+
+# REQUESTS
+def start_request(app):
+    trace = RequestTrace(app)
+    _local.trace = trace
+    _local.stack = []
+    if PROFILE_MODE and not _profile_captured:
+        trace.profiler = _start_profiler()
+    return trace
+
+
+def finish_request():
+    trace = current_request()
+    if trace is None:
+        return None
+    trace.seconds = time.perf_counter() - trace.started
+    if trace.profiler is not None:
+        _stop_profiler(trace)
+    logger.info(json.dumps({"event": "request", "app": trace.app, "seconds": trace.seconds,
+                            "stages": len(trace.stages)}))
+    with _lock:
+        totals = _totals[(trace.app, "request")]
+        totals["calls"] += 1
+        totals["seconds"] += trace.seconds
+    if METRICS_FILE:
+        write_prometheus(METRICS_FILE)
+    _local.trace = None
+    return trace
+
+
+# PROFILING
+def _start_profiler():
+    if PROFILE_MODE == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed, falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(trace):
+    global _profile_captured
+    profiler = trace.profiler
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+    if trace.seconds < PROFILE_SLOW_SECONDS:
+        return
+    with _lock:
+        if _profile_captured:
+            return
+        _profile_captured = True
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if isinstance(profiler, cProfile.Profile):
+        trace.profile_path = os.path.join(PROFILE_DIR, f"{trace.app}-{stamp}.prof")
+        pstats.Stats(profiler).dump_stats(trace.profile_path)
+    else:
+        trace.profile_path = os.path.join(PROFILE_DIR, f"{trace.app}-{stamp}.html")
+        with open(trace.profile_path, "w", encoding="utf-8") as fh:
+            fh.write(profiler.output_html())
+    logger.warning(json.dumps({"event": "profile", "app": trace.app, "seconds": trace.seconds,
+                               "path": trace.profile_path}))
+
+
+# EXPORT
+def _labels(pairs):
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+
+def prometheus_text():
+    with _lock:
+        totals = {key: dict(values) for key, values in _totals.items()}
+        gauges = dict(_gauges)
+
+    series = defaultdict(list)
+    for (app, stage_name), values in sorted(totals.items()):
+        labels = _labels([("app", app), ("stage", stage_name)])
+        for key, value in sorted(values.items()):
+            metric = "risk_stage_calls_total" if key == "calls" else f"risk_stage_{key}_total"
+            series[metric].append(f"{metric}{{{labels}}} {value:g}")
+    lines = []
+    for metric, samples in series.items():
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(samples)
+    last_name = None
+    for (name, labels), value in sorted(gauges.items()):
+        if name != last_name:
+            lines.append(f"# TYPE {name} gauge")
+            last_name = name
+        lines.append(f"{name}{{{_labels(labels)}}} {value:g}" if labels else f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+# DEBUG PANEL
+def render_debug_panel(trace):
+    import streamlit as st
+
+    if trace is None or not (DEBUG_PANEL or st.query_params.get("debug") == "1"):
+        return
+    with st.expander("Performance debug"):
+        st.write(f"Request took {trace.seconds:.3f}s across {len(trace.stages)} stages.")
+        rows = [{k: v for k, v in rec.items() if k != "depth"} | {"stage": "  " * rec["depth"] + rec["stage"]}
+                for rec in trace.stages]
+        if rows:
+            st.dataframe(rows)
+        if trace.profile_path:
+            st.info(f"Profile captured: {trace.profile_path}")
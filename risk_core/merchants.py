@@ -0,0 +1,133 @@
+"""Token index from narration words and paybill/till numbers to categories.
+
+The category rules used to be applied as substring tests or regex searches on
+every narration, so "oil" matched "toilet" and "bet" matched "alphabet".
+``MerchantIndex`` turns one profile's rules into a hash map from words to the
+rules that start with them; a narration is split into words and each word is
+looked up, so categorising is a handful of dictionary hits:
+
+* a keyword, or a literal alternative of a rule pattern ("kplc", "pay bill",
+  "watu credit"), matches whole words; its last word may be the start of a
+  longer word ("withdraw" in "withdrawal") unless the pattern ends it with
+  ``\\b``;
+* paybill and till numbers from the ``merchants`` table add that merchant's
+  name to the narration, so "PAYBILL 290290" is categorised as Betika even
+  when the name is cut off;
+* the first matching rule wins, in rule order, exactly as before.
+
+Pattern rules that aren't plain alternations of words keep their regex and are
+checked in order after the index lookup. Narrations repeat a lot in M-PESA
+statements, so ``Rules`` keeps an LRU cache per profile in front of the index.
+"""
+import re
+
+WORD = re.compile(r"[a-z0-9]+")
+# "(a|b)", "\b(a|b)\b", "\ba\b|\bb\b" and "a|b c" are all plain alternations of words
+_GROUP = re.compile(r"^(\\b)?\((.*)\)(\\b)?$")
+_LITERAL = re.compile(r"^(\\b)?([a-z0-9][a-z0-9 \-&']*?)(\\b)?$")
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def literal_alternatives(pattern):
+    """[(words, exact_end), ...] when the pattern is a plain alternation of words, else None."""
+    pattern = pattern.lower()
+    group = _GROUP.match(pattern)
+    outer_end = False
+    if group and "(" not in group.group(2):
+        outer_end = bool(group.group(3))
+        pattern = group.group(2)
+    alternatives = []
+    for part in pattern.split("|"):
+        literal = _LITERAL.match(part.strip())
+        if literal is None:
+            return None
+        phrase = words(literal.group(2))
+        if not phrase:
+            return None
+        alternatives.append((tuple(phrase), outer_end or bool(literal.group(3))))
+    return alternatives
+
+
+class MerchantIndex:
+    def __init__(self, rules, merchants=(), default="Other"):
+        """``rules``: ((category, keywords, pattern), ...) in priority order, as compiled by ``rules.py``."""
+        self.default = default
+        self.categories = tuple(category for category, _, _ in rules)
+        self._heads = {}         # first word -> ((rule, rest of the phrase, exact_end), ...)
+        self._starts = {}        # one-word keyword that may begin a longer word -> first rule
+        self._patterns = []      # (rule, compiled regex) for patterns the index can't express
+        self._numbers = {}       # paybill / till -> merchant name words
+
+        for rule, (category, keywords, pattern) in enumerate(rules):
+            phrases = [(tuple(words(k)), False) for k in keywords]
+            if pattern is not None:
+                alternatives = literal_alternatives(pattern.pattern)
+                if alternatives is None:
+                    self._patterns.append((rule, pattern))
+                    continue
+                phrases = alternatives
+            for phrase, exact_end in phrases:
+                if not phrase:
+                    continue
+                self._heads.setdefault(phrase[0], []).append((rule, phrase[1:], exact_end))
+                if len(phrase) == 1 and not exact_end:
+                    self._starts.setdefault(phrase[0], rule)
+        self._heads = {head: tuple(entries) for head, entries in self._heads.items()}
+        self._head_words = frozenset(self._heads)
+        # str.startswith(tuple) rejects most words in one C call before any slicing
+        self._start_words = tuple(self._starts)
+        self._start_lengths = tuple(sorted({len(word) for word in self._starts}))
+
+        for merchant in merchants:
+            name = tuple(words(merchant["name"]))
+            for number in (*merchant.get("paybills", ()), *merchant.get("tills", ())):
+                self._numbers[str(number)] = name
+
+    def _first_rule(self, tokens):
+        best = len(self.categories)
+        if not self._head_words.isdisjoint(tokens):
+            for i, token in enumerate(tokens):
+                for rule, rest, exact_end in self._heads.get(token, ()):
+                    if rule < best and (not rest or self._rest_matches(tokens, i + 1, rest, exact_end)):
+                        best = rule
+        if self._start_words:
+            for token in tokens:
+                if not token.startswith(self._start_words):
+                    continue
+                for n in self._start_lengths:
+                    if n >= len(token):
+                        break
+                    rule = self._starts.get(token[:n])
+                    if rule is not None and rule < best:
+                        best = rule
+        return best
+
+    @staticmethod
+    def _rest_matches(tokens, start, rest, exact_end):
+        end = start + len(rest)
+        if end > len(tokens):
+            return False
+        if tuple(tokens[start:end - 1]) != rest[:-1]:
+            return False
+        last = tokens[end - 1]
+        return last == rest[-1] or (not exact_end and last.startswith(rest[-1]))
+
+    def categorize(self, description):
+        text = description.lower()
+        tokens = WORD.findall(text)
+        if self._numbers and not self._numbers.keys().isdisjoint(tokens):
+            for token in tokens:
+                if token in self._numbers:
+                    # after a separator, so no phrase runs from the narration into the merchant name
+                    tokens = tokens + ["|"] + list(self._numbers[token])
+        best = self._first_rule(tokens)
+        for rule, pattern in self._patterns:
+            if rule >= best:
+                break
+            if pattern.search(text):
+                best = rule
+                break
+        return self.categories[best] if best < len(self.categories) else self.default
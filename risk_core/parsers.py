@@ -0,0 +1,405 @@
+"""Statement and CRB parsers shared by all the apps.
+
+Each app used to carry its own copy of ``process_mpesa``, ``process_bank`` and
+``extract_crb_data``. The copies read the same layouts and differed in a few
+choices, which are now parameters here:
+
+* ``mpesa_from_text``: PDF text where each transaction starts on a line with
+  "Completed" and the amount follows it (or is on the next line).
+  ``context_lines`` is how many following lines belong to the details
+  (``None``: up to the next transaction, as Credit_Analysis1 and the
+  statement analyzer read them; 6 for Credit_Analysis). ``splits`` turns a
+  category into separate inflow / outflow labels ("Other" into "Other
+  (Inflow)" / "Other (Outflow)", and for some apps "Loan" into disbursement
+  / repayment).
+* ``mpesa_ledger``: the same PDF text as one row per transaction with its
+  completion time, narration, signed amount and balance (for
+  ``risk_core.counterparties``).
+* ``mpesa_from_frame``: the Safaricom CSV layout ("Transaction Status",
+  "Paid In", "Withdrawn"); withdrawals count as money out whatever their sign.
+* ``mpesa_rows`` / ``mpesa_from_rows``: one transaction per line, as pasted
+  into Creditrisk, as an iterator or a frame.
+* ``bank_from_text`` (``12/07/2025 POS Naivas -2,500.00`` rows) and
+  ``bank_from_blocks`` (date line, narration lines, value-date line with the
+  amount and CR/DR balances).
+* ``ksh_transactions``: lines ending in a "Ksh" amount (scoring.py).
+* ``extract_crb_data``: the Metropol summary, in the ``credit_analysis``
+  shape (stacked score block, whitespace normalised) or the ``risk`` shape
+  (inline scores, contact details).
+
+Text parsers take a ``risk_core.document.Document`` (or a plain string) and
+use its shared ``lines`` / ``normalized`` views. They return ``Details`` /
+``Amount`` (absolute) / ``Inflow/Outflow`` / ``Category`` frames, or ``None``
+when nothing parses, with a ``datetime64`` ``Date`` (``risk_core.dates``) and
+the printed running ``Balance`` (NaN where a row has none, negative when
+overdrawn; checked by ``risk_core.reconcile``) where the layout has them; ``summarize`` builds the per-category table. Lines are
+filtered with a substring test before any regex runs, frames are built from
+columns, and each profile's categoriser is looked up once per document rather
+than once per transaction.
+"""
+import re
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from risk_core.dates import parse_dates
+from risk_core.document import as_document
+from risk_core.instrumentation import record
+from risk_core.rules import current_rules
+
+OTHER_SPLIT = {"Other": ("Other (Inflow)", "Other (Outflow)")}
+
+_MPESA_AMOUNT = re.compile(r'Completed[\s-]*(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))')
+_AMOUNT = re.compile(r'(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))')
+_MPESA_ROW = re.compile(r"(Completed).*?([-]?[\d,]+\.\d{2})")
+_BANK_ROW = re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})\s+(.+?)\s+(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))'
+                       # The next amount on the line, if any, is the balance
+                       r'(?:.*?(-?\d{1,3}(?:,\d{3})*(?:\.\d{2})))?')
+_BANK_DATE_LINE = re.compile(r"\d{2}/\d{2}/\d{4}")
+# Amount, then the ledger and available balances; the ledger balance is the running one
+_BANK_AMOUNT_LINE = re.compile(r"\d{2}/\d{2}/\d{4}\s+(-?[\d,]+\.\d{2})\s+([\d,.]+)([CD])R\s+[\d,.]+[CD]R")
+_KSH_DATE = re.compile(r"\s*(\d{1,2}/\d{1,2}/\d{2,4})")
+# Unlike _MPESA_AMOUNT, keeps the sign of a withdrawal
+_SIGNED_AMOUNT = re.compile(r'Completed\s*(-?\d{1,3}(?:,\d{3})*(?:\.\d{2}))')
+_COMPLETION_TIME = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}(?::\d{2})?)")
+# The layout each date pattern above fixes, so parse_dates needn't detect it; a 2-digit
+# year ("05/03/24") misses "%d/%m/%Y" and is read by its day-first fallback
+ROW_DATE_FORMAT = "%d/%m/%Y"
+COMPLETION_TIME_FORMAT = "ISO8601"  # with or without seconds
+# Receipt, time and narration cells above "Completed"; a narration wraps over a few lines at most
+LEDGER_LOOKBACK = 8
+
+
+def _categorizer(profile):
+    return current_rules().matchers[profile]
+
+
+def _frame(columns, amounts, categories, splits):
+    """Add Amount / Inflow/Outflow / Category columns from signed amounts and base categories."""
+    signed = np.array(amounts, dtype=float)
+    inflow = signed > 0
+    category = [splits[c][0 if i else 1] if c in splits else c for c, i in zip(categories, inflow.tolist())] \
+        if splits else categories
+    columns.update({"Amount": np.abs(signed), "Inflow/Outflow": np.where(inflow, "Inflow", "Outflow").astype(object),
+                    "Category": category})
+    return pd.DataFrame(columns)
+
+
+def _balance(lines, at, match):
+    """The Balance cell after the amount ``match`` on line ``at``: later on that line, or alone on the next."""
+    found = _AMOUNT.search(lines[at], match.end())
+    if not found and at + 1 < len(lines):
+        found = _AMOUNT.fullmatch(lines[at + 1].strip())
+    return float(found.group(1).replace(",", "")) if found else np.nan
+
+
+def summarize(df, count=True, percentage=False):
+    """Amount per category, with the number of transactions and/or each category's share."""
+    grouped = df.groupby("Category")["Amount"]
+    summary = grouped.sum().reset_index()
+    if count:
+        summary["Count"] = grouped.count().values
+    if percentage:
+        summary["Percentage"] = (summary["Amount"] / df["Amount"].sum() * 100).round(2)
+    return summary
+
+
+# M-PESA
+def mpesa_from_text(text, profile, context_lines=None, splits=OTHER_SPLIT):
+    lines = as_document(text).lines
+    n = len(lines)
+    starts = [i for i, line in enumerate(lines) if "Completed" in line]
+    ends = starts[1:] + [n]
+    details, amounts, balances = [], [], []
+    for i, end in zip(starts, ends):
+        at = i
+        match = _MPESA_AMOUNT.search(lines[i])
+        if not match and i + 1 < n:
+            at = i + 1
+            match = _AMOUNT.search(lines[at])
+        if match:
+            amounts.append(float(match.group(1).replace(",", "")))
+            balances.append(_balance(lines, at, match))
+            stop = end if context_lines is None else min(i + 1 + context_lines, n)
+            details.append(" ".join(lines[i:stop]).strip())
+    record(transactions=len(details))
+    if not details:
+        return None
+    categorize = _categorizer(profile)
+    return _frame({"Details": details, "Balance": np.array(balances, dtype=float)}, amounts,
+                  [categorize(d) for d in details], splits)
+
+
+def mpesa_ledger(text):
+    """Date / Details / Amount (signed) / Balance per transaction, or None.
+
+    Works on both layouts: cells (time, narration lines, then "Completed" and
+    the amount on their own lines) and rows (everything on the "Completed" line).
+    """
+    lines = as_document(text).lines
+    n = len(lines)
+    times, details, amounts, balances = [], [], [], []
+    previous = -1
+    for i, line in enumerate(lines):
+        if "Completed" not in line:
+            continue
+        at = i
+        match = _SIGNED_AMOUNT.search(line)
+        if not match and i + 1 < n:
+            at = i + 1
+            match = _AMOUNT.search(lines[at])
+        head, _, _ = line.partition("Completed")
+        stamp = _COMPLETION_TIME.search(head)
+        if stamp:
+            narration = head[stamp.end():]
+        else:
+            narration = None
+            for j in range(i - 1, max(previous, i - LEDGER_LOOKBACK - 1), -1):
+                stamp = _COMPLETION_TIME.search(lines[j])
+                if stamp:
+                    narration = " ".join(lines[j + 1:i] + [lines[j][stamp.end():], head])
+                    break
+        previous = i
+        if match and stamp:
+            times.append(stamp.group(1))
+            details.append(" ".join(narration.split()))
+            amounts.append(float(match.group(1).replace(",", "")))
+            balances.append(_balance(lines, at, match))
+    record(transactions=len(details))
+    if not details:
+        return None
+    return pd.DataFrame({"Date": parse_dates(times, COMPLETION_TIME_FORMAT), "Details": details,
+                         "Amount": np.array(amounts, dtype=float), "Balance": np.array(balances, dtype=float)})
+
+
+def _money(values):
+    cleaned = values.astype(str).str.replace(",", "", regex=False)
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0).to_numpy()
+
+
+def mpesa_from_frame(df, profile, splits=OTHER_SPLIT):
+    """Completed rows of a Safaricom export; Amount is Paid In, else Withdrawn as money out."""
+    completed = df[df["Transaction Status"].astype(str).str.lower() == "completed"]
+    zeros = pd.Series(0.0, index=completed.index)
+    paid_in = _money(completed.get("Paid In", zeros))
+    withdrawn = np.abs(_money(completed.get("Withdrawn", zeros)))
+    amount = np.where(paid_in > 0, paid_in, -withdrawn)
+    keep = amount != 0
+    details = completed["Details"].astype(str).to_numpy()[keep]
+    record(transactions=int(keep.sum()))
+    if not keep.any():
+        return None
+    categorize = _categorizer(profile)
+    details = [d.strip() for d in details]
+    return _frame({"Details": details}, amount[keep], [categorize(d) for d in details], splits)
+
+
+def mpesa_rows(text, profile):
+    """One transaction per line: (line, absolute amount, category) for each line with an amount."""
+    categorize = _categorizer(profile)
+    count = 0
+    for line in text.splitlines():
+        if "Completed" in line:
+            match = _MPESA_ROW.search(line)
+            if match:
+                count += 1
+                yield line, float(match.group(2).replace(",", "").replace("-", "")), categorize(line)
+    record(transactions=count)
+
+
+def mpesa_from_rows(text, profile):
+    """``mpesa_rows`` as a frame: Details, Amount and Category."""
+    rows = list(mpesa_rows(text, profile))
+    return pd.DataFrame(rows or None, columns=["Details", "Amount", "Category"]).astype({"Amount": float})
+
+
+# BANK
+def bank_from_text(text, profile, splits=OTHER_SPLIT):
+    dates, details, amounts, balances = [], [], [], []
+    for line in as_document(text).lines:
+        if "/" in line:
+            line = line.strip()
+            match = _BANK_ROW.search(line)
+            if match:
+                date_str, narration, amount_str, balance = match.groups()
+                dates.append(date_str)
+                details.append(narration.strip())
+                amounts.append(float(amount_str.replace(",", "")))
+                balances.append(float(balance.replace(",", "")) if balance else np.nan)
+    record(transactions=len(details))
+    if not details:
+        return None
+    categorize = _categorizer(profile)
+    return _frame({"Date": parse_dates(dates, ROW_DATE_FORMAT), "Details": details,
+                   "Balance": np.array(balances, dtype=float)},
+                  amounts, [categorize(d) for d in details], splits)
+
+
+def _bank_balance(match):
+    try:
+        balance = float(match.group(2).replace(",", ""))
+    except ValueError:
+        return np.nan
+    return -balance if match.group(3) == "D" else balance
+
+
+def bank_from_blocks(text, profile, splits=OTHER_SPLIT):
+    lines = [line.strip() for line in text.splitlines()]
+    amount_lines, amount_matches = [], []
+    for j, line in enumerate(lines):
+        match = _BANK_AMOUNT_LINE.match(line)
+        if match:
+            amount_lines.append(j)
+            amount_matches.append(match)
+    dates, details, amounts, balances = [], [], [], []
+    i, last = 0, len(lines) - 1
+    while i < last:
+        if _BANK_DATE_LINE.match(lines[i]):
+            k = bisect_right(amount_lines, i)
+            if k == len(amount_lines):
+                break
+            j = amount_lines[k]
+            try:
+                amount = float(amount_matches[k].group(1).replace(",", ""))
+            except ValueError:
+                pass
+            else:
+                dates.append(lines[i])
+                details.append(" ".join(lines[i + 1:j]).strip())
+                amounts.append(amount)
+                balances.append(_bank_balance(amount_matches[k]))
+            i = j
+        i += 1
+    record(transactions=len(details))
+    if not details:
+        return None
+    categorize = _categorizer(profile)
+    return _frame({"Date": parse_dates(dates, ROW_DATE_FORMAT), "Details": details,
+                   "Balance": np.array(balances, dtype=float)},
+                  amounts, [categorize(d) for d in details], splits)
+
+
+def ksh_transactions(text, dates=False):
+    """Lines containing "Ksh" whose last word is the amount: [Date,] Description, Amount."""
+    found_dates, descriptions, amounts = [], [], []
+    for line in as_document(text).lines:
+        if "Ksh" in line:
+            parts = line.split()
+            try:
+                amount = float(parts[-1].replace(",", "").replace("Ksh", ""))
+            except ValueError:
+                continue
+            if dates:
+                date_match = _KSH_DATE.match(line)
+                found_dates.append(date_match.group(1) if date_match else None)
+            descriptions.append(" ".join(parts[:-1]))
+            amounts.append(amount)
+    record(transactions=len(amounts))
+    if not amounts:
+        return pd.DataFrame()
+    columns = {"Date": parse_dates(found_dates, ROW_DATE_FORMAT)} if dates else {}
+    columns.update({"Description": descriptions, "Amount": amounts})
+    return pd.DataFrame(columns)
+
+
+# CRB
+CRB_STYLES = {
+    # Credit_Analysis / Credit_Analysis1: scores stacked under their labels
+    "credit_analysis": {
+        "normalize": True, "contacts": False, "missing_name": None, "missing_score": None,
+        "metro_key": "Metro-Score", "stacked_scores": True,
+        "ppi_notes": ("Probable positive repayment behavior.", "Watch for occasional delays.",
+                      "Probable Poor repayment trend."),
+        "balance": re.compile(r'Total Outstanding Balance\s*\n\s*Total Accounts\s*\n\s*([\d,]+\.\d+)'),
+    },
+    # risk.py: scores on the same line as their labels, plus phone and email
+    "risk": {
+        "normalize": False, "contacts": True, "missing_name": "N/A", "missing_score": "N/A",
+        "metro_key": "Metro Score", "stacked_scores": False,
+        "ppi_notes": ("Positive repayment behavior.", "Watch for occasional delays.", "Poor repayment trend."),
+        "balance": re.compile(r'Total Outstanding Balance\s+([\d,]+\.\d+)'),
+    },
+}
+_SCORE_BLOCK = re.compile(r"\n\s*(\d+)\s*\n\s*(M\d)\s*\n\s*(\d+\s?%)", re.IGNORECASE | re.DOTALL)
+
+
+def _group(match, default, convert=str.strip):
+    return convert(match.group(1)) if match else default
+
+
+def _crb_scores(text, style):
+    missing = style["missing_score"]
+    if style["stacked_scores"]:
+        block = _SCORE_BLOCK.search(text)
+        if block:
+            metro, ppi, pd_ = block.groups()
+        else:
+            metro = _group(re.search(r'Metro-Score©\s*\n*\s*(\d+)', text), None, str)
+            ppi = _group(re.search(r'PPI©\s*\n*\s*(M\d)', text), None, str)
+            pd_ = _group(re.search(r'Probability Of Default©\s*\n*\s*(\d+\s?%)', text), None)
+        metro_value = int(metro) if isinstance(metro, str) and metro.isdigit() else metro
+    else:
+        metro = _group(re.search(r'Metro-Score©\s+(\d+)', text), None, str)
+        ppi = _group(re.search(r'PPI©\s+(M\d)', text), missing, str)
+        pd_ = _group(re.search(r'Probability Of Default©\s+(\d+\s?%)', text), missing)
+        metro_value = int(metro) if metro else missing
+
+    interpretation = ""
+    metro_val = int(metro) if metro else None
+    if metro_val:
+        if metro_val < 400:
+            interpretation += "High Risk: Credit score indicates possible defaults.\n"
+        elif metro_val < 600:
+            interpretation += "Medium Risk: Caution advised.\n"
+        else:
+            interpretation += "Low Risk: Good credit standing.\n"
+    if ppi and ppi != missing:
+        good, watch, poor = style["ppi_notes"]
+        interpretation += good if ppi in ("M1", "M2") else watch if ppi in ("M3", "M4", "M5") else poor
+    return {style["metro_key"]: metro_value, "PPI": ppi, "Probability of Default": pd_,
+            "Interpretation": interpretation}
+
+
+def extract_crb_data(text, style="credit_analysis"):
+    """Bio Data, Employment, Credit Scores and Account Summary from a Metropol report."""
+    style = CRB_STYLES[style]
+    if style["normalize"]:
+        text = as_document(text).normalized
+
+    name_match = re.search(r'REPORTED NAMES:\s+(.*)', text)
+    id_match = re.search(r'NATIONAL ID\s+:\s+(\d+)', text)
+    bio_data = {
+        "Name": _group(name_match, style["missing_name"]),
+        "National ID": _group(id_match, "N/A"),
+    }
+    if style["contacts"]:
+        bio_data["Phone Number(s)"] = _group(re.search(r'Phone Number\(s\)[^\n]*\n\s*([\d, ]+)', text), "N/A")
+        bio_data["Email"] = _group(re.search(r'Email Address[^\n]*\n\s*([^\s]+@[^\s]+)', text), "N/A")
+
+    emp_match = re.search(r'Employer\s*:\s*(.*)', text, re.IGNORECASE)
+    salary_match = re.search(r'Salary\s*:\s*K?([\d,]+)', text, re.IGNORECASE)
+    dept_match = re.search(r'Department\s*:\s*(.*)', text, re.IGNORECASE)
+    employment = {
+        "Employer": _group(emp_match, "N/A"),
+        "Salary": salary_match.group(1).replace(",", "") if salary_match else "N/A",
+        "Department": _group(dept_match, "N/A"),
+    }
+
+    account_match = re.search(r'Total\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)', text)
+    balance_match = style["balance"].search(text)
+    counts = [int(v) for v in account_match.groups()] if account_match else [0, 0, 0, 0]
+    account_summary = {
+        "Total Accounts": counts[0],
+        "Non-Performing Accounts": counts[1],
+        "Performing Accounts With Default History": counts[2],
+        "Performing Accounts Without Default History": counts[3],
+        "Total Outstanding Balance": float(balance_match.group(1).replace(",", "")) if balance_match else 0.0,
+    }
+
+    return {
+        "Bio Data": bio_data,
+        "Employment": employment,
+        "Credit Scores": _crb_scores(text, style),
+        "Account Summary": account_summary,
+    }
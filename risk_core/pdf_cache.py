@@ -0,0 +1,289 @@
+"""Process-wide cache of opened (and decrypted) PDF documents.
+
+Streamlit reruns the whole script on every widget change, and each rerun used
+to reopen and re-decrypt every uploaded PDF. ``open_pdf`` keeps the opened
+``fitz.Document`` per document hash together with the text of the pages read
+so far, so reruns and the M-PESA / CRB / bank sections share one handle.
+``open_pdf`` hands out the handle acquired; callers release it when done
+(``with open_pdf(...) as handle:``). A handle evicted (or replaced) while
+another session is still reading it is only retired: it closes when its last
+user releases it, so an eviction never breaks an extraction in flight.
+
+An encrypted document is only served from the cache to a caller that supplies
+the password (or a candidate list containing the password) that unlocked it;
+the cache keeps a salted digest of that password, never the password itself.
+
+``open_pdf`` takes the PDF's bytes or a path: large uploads arrive as their
+spill file (``risk_core.uploads``), which PyMuPDF reads pages from as needed,
+so a cached handle doesn't pin a copy of the document.
+
+``span_text`` re-reads only the pages between two anchors (the balances either
+side of a row ``risk_core.reconcile`` found missing), in reading order
+(``sort=True``) rather than PyMuPDF's content-stream order.
+
+When no password is given, ``open_pdf`` tries the candidates built by
+``password_candidates`` (statement passwords are usually the applicant's ID
+number or phone number) in a small process pool and stops at the first hit.
+"""
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import fitz
+
+from risk_core.crb_pages import anchor_pages, section_text
+from risk_core.instrumentation import record
+
+MAX_HANDLES = int(os.environ.get("RISK_PDF_CACHE_SIZE", "16"))
+PASSWORD_WORKERS = int(os.environ.get("RISK_PDF_PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many candidates the pool costs more than it saves
+PARALLEL_MIN_CANDIDATES = 6
+# Patterns tried for each hint; {id} for ID numbers, {phone*} for phone numbers
+PASSWORD_PATTERNS = tuple(os.environ.get(
+    "RISK_PDF_PASSWORD_PATTERNS", "{id},{phone_local},{phone_intl},{phone_plus},{phone_short}").split(","))
+
+_SALT = secrets.token_bytes(16)
+
+
+def _secret_digest(password):
+    return hashlib.sha256(_SALT + password.encode("utf-8")).digest()
+
+
+class PdfHandle:
+    def __init__(self, doc, digest, password=None):
+        self.doc = doc
+        self.digest = digest
+        self.page_count = doc.page_count
+        self.encrypted = bool(password)
+        self._password_digest = _secret_digest(password) if password else None
+        self._pages = {}
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def unlocked_by(self, passwords):
+        if not self.encrypted:
+            return True
+        return any(p and _secret_digest(p) == self._password_digest for p in passwords)
+
+    def page_text(self, number, sort=False):
+        key = (number, sort)
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = self.doc[number].get_text(sort=sort)
+            return self._pages[key]
+
+    def text(self, pages=None, sort=False):
+        numbers = range(self.page_count) if pages is None else pages
+        return "\n".join(self.page_text(n, sort) for n in numbers)
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._retired and self._users <= 0 and not self.doc.is_closed:
+                self.doc.close()
+
+    def retire(self):
+        """Out of the cache: close now if nobody holds it, else when the last user releases it."""
+        with self._lock:
+            self._retired = True
+            if self._users <= 0 and not self.doc.is_closed:
+                self.doc.close()
+
+    def close(self):
+        with self._lock:
+            if not self.doc.is_closed:
+                self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class PdfCache:
+    def __init__(self, max_handles=MAX_HANDLES):
+        self.max_handles = max_handles
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest, passwords):
+        """The cached handle, acquired, or None. Acquired under the cache lock, so it can't be retired first."""
+        with self._lock:
+            handle = self._handles.get(digest)
+            if handle is None or not handle.unlocked_by(passwords):
+                return None
+            self._handles.move_to_end(digest)
+            return handle.acquire()
+
+    def put(self, handle):
+        with self._lock:
+            old = self._handles.pop(handle.digest, None)
+            self._handles[handle.digest] = handle
+            evicted = []
+            while len(self._handles) > self.max_handles:
+                evicted.append(self._handles.popitem(last=False)[1])
+        for h in evicted + ([old] if old is not None and old is not handle else []):
+            h.retire()
+
+    def clear(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for h in handles:
+            h.retire()
+
+
+_cache = PdfCache()
+
+
+def _open(source):
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _digest(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    return hashlib.sha256(source).hexdigest()
+
+
+def open_pdf(source, password=None, candidates=(), digest=None):
+    """Return a cached, authenticated PdfHandle, acquired; raise ValueError if it stays locked.
+
+    ``source`` is the PDF's bytes or a path; ``digest`` its SHA-256 when the caller already has it.
+    Release the handle when done with it (``with open_pdf(...) as handle:``).
+    """
+    digest = digest or _digest(source)
+    tried = [password, *candidates]
+    handle = _cache.get(digest, tried)
+    if handle is not None:
+        return handle
+
+    doc = _open(source)
+    used = None
+    if doc.needs_pass:
+        if password and doc.authenticate(password):
+            used = password
+        else:
+            used = find_password(source, [c for c in candidates if c and c != password])
+            if used is None or not doc.authenticate(used):
+                doc.close()
+                raise ValueError("PDF is encrypted and password is missing or incorrect.")
+    handle = PdfHandle(doc, digest, used).acquire()
+    _cache.put(handle)
+    return handle
+
+
+def pdf_text(source, password=None, candidates=(), sections=None, digest=None):
+    """Text of the PDF (only the ``sections`` anchor pages when given) and its page count.
+
+    Takes and returns plain values so it can run in a ``risk_core.workers`` process.
+    """
+    with open_pdf(source, password=password, candidates=candidates, digest=digest) as handle:
+        text = section_text(handle, sections) if sections else handle.text()
+        return text, handle.page_count
+
+
+def span_text(source, anchors, password=None, candidates=(), digest=None):
+    """Text of the pages from the first to the last one containing an anchor, in reading order, and their numbers.
+
+    ("", ()) when no page contains any anchor.
+    """
+    with open_pdf(source, password=password, candidates=candidates, digest=digest) as handle:
+        found = anchor_pages(handle, anchors)
+        if not found:
+            return "", ()
+        pages = tuple(range(min(found.values()), max(found.values()) + 1))
+        record(pages_read=len(pages))
+        return handle.text(pages, sort=True), pages
+
+
+# PASSWORD CANDIDATES
+def password_candidates(*hints, patterns=PASSWORD_PATTERNS):
+    """Expand ID numbers and phone numbers into likely statement passwords."""
+    candidates = []
+    for hint in hints:
+        tokens = []
+        for part in re.split(r"[,;/\n]+", hint or ""):
+            # "0712 345 678" is one phone number, "31234567 0712345678" is two values
+            tokens.extend([part] if len(re.sub(r"\D", "", part)) <= 12 else part.split())
+        for token in tokens:
+            digits = re.sub(r"\D", "", token)
+            if not digits:
+                continue
+            values = {"id": digits}
+            if len(digits) >= 9 and digits.lstrip("0").startswith(("7", "1", "2547", "2541")):
+                local = digits[-9:]
+                values.update(phone_local="0" + local, phone_intl="254" + local,
+                              phone_plus="+254" + local, phone_short=local)
+            for pattern in patterns:
+                try:
+                    candidate = pattern.format(**values)
+                except KeyError:
+                    continue
+                if candidate not in candidates:
+                    candidates.append(candidate)
+    return candidates
+
+
+def _try_passwords(source, candidates):
+    doc = _open(source)
+    try:
+        for candidate in candidates:
+            if doc.authenticate(candidate):
+                return candidate
+        return None
+    finally:
+        doc.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _password_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: forking the multi-threaded Streamlit server directly is unsafe
+            _pool = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS,
+                                        mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+
+def find_password(source, candidates):
+    if not candidates:
+        return None
+    # Inside a worker process (risk_core.workers) guess in place rather than nesting pools
+    if len(candidates) < PARALLEL_MIN_CANDIDATES or PASSWORD_WORKERS <= 1 or multiprocessing.parent_process():
+        return _try_passwords(source, candidates)
+
+    size = math.ceil(len(candidates) / (PASSWORD_WORKERS * 2))
+    pool = _password_pool()
+    pending = {pool.submit(_try_passwords, source, candidates[i:i + size]) for i in range(0, len(candidates), size)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found = future.result()
+                if found is not None:
+                    return found
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
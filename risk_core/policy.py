@@ -0,0 +1,126 @@
+"""Policy rules that decline or cap an application whatever else it shows.
+
+Some CRB results settle an application on their own: PPI M7–M9, or a high
+probability of default, is a decline however good the statements look. The
+``policy`` section of ``rules.json`` lists them:
+
+    "policy": [
+      {"name": "ppi", "input": "ppi", "at_least": 7, "action": "decline",
+       "reason": "PPI M7–M9: serious late payment history"},
+      {"name": "default_cap", "input": "probability_of_default", "at_least": 15, "action": "cap",
+       "limit": 100000, "reason": "Probability of default of 15% or more: at most KSh 100,000"}
+    ]
+
+A rule fires when ``at_least <= value`` and ``value < below`` (either bound
+may be left out), and every condition in its ``and`` list holds too. Inputs
+are read like scorecard characteristics ("M7" is 7, "34 %" is 34); a missing
+or unreadable input never fires, so a report without a PPI is left to the
+scorecard. A ``grade`` rule names the grade to give in place of a
+scorecard's, for the cases a card's points can't reach:
+
+    {"name": "m1_large_loan", "input": "ppi", "below": 2,
+     "and": [{"input": "max_principal", "at_least": 1000}],
+     "action": "grade", "grade": "HIGH RISK", "reason": "..."}
+
+``evaluate`` checks whole columns at once and gives, per row, whether a rule
+declined it, the lowest cap that fired, the first grade that fired and the
+reasons. Credit_Analysis1 checks it on the CRB scores and parses the
+statements of a declined application only when the officer asks.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from risk_core.scorecard import numeric
+
+ACTIONS = ("decline", "cap", "grade")
+
+
+@dataclass(frozen=True)
+class PolicyRule:
+    name: str
+    input: str
+    action: str
+    reason: str
+    at_least: Optional[float] = None
+    below: Optional[float] = None
+    limit: Optional[float] = None
+    grade: Optional[str] = None
+    also: tuple = ()  # ((input, at_least, below), ...) that must hold as well
+
+    @property
+    def inputs(self):
+        return (self.input, *(name for name, _, _ in self.also))
+
+    def fires(self, values):
+        return _within(values, self.at_least, self.below)
+
+
+def _within(values, at_least, below):
+    values = numeric(values)
+    fired = ~np.isnan(values)
+    if at_least is not None:
+        fired &= values >= at_least
+    if below is not None:
+        fired &= values < below
+    return fired
+
+
+def _bounds(entry):
+    return tuple(None if entry.get(k) is None else float(entry[k]) for k in ("at_least", "below"))
+
+
+def load_policy(raw):
+    rules = []
+    for entry in raw:
+        name = entry["name"]
+        if entry["action"] not in ACTIONS:
+            raise ValueError(f"policy {name}: action must be one of {', '.join(ACTIONS)}")
+        conditions = [entry, *entry.get("and", ())]
+        if any(c.get("at_least") is None and c.get("below") is None for c in conditions):
+            raise ValueError(f"policy {name}: every condition needs at_least or below")
+        if entry["action"] == "cap" and entry.get("limit") is None:
+            raise ValueError(f"policy {name}: a cap needs a limit")
+        if entry["action"] == "grade" and not entry.get("grade"):
+            raise ValueError(f"policy {name}: a grade rule needs a grade")
+        rules.append(PolicyRule(name, entry["input"], entry["action"], entry.get("reason", name), *_bounds(entry),
+                                limit=None if entry.get("limit") is None else float(entry["limit"]),
+                                grade=entry.get("grade"),
+                                also=tuple((c["input"], *_bounds(c)) for c in entry.get("and", ()))))
+    return tuple(rules)
+
+
+def evaluate(rules, inputs):
+    """declined, limit (NaN when no cap fired), grade (None when no grade rule fired) and reasons for each row of
+    ``inputs``.
+
+    ``inputs`` is a DataFrame or a mapping of input name to array or scalar;
+    rules with an input that is absent don't fire.
+    """
+    if not isinstance(inputs, pd.DataFrame):
+        # An empty mapping is one application with nothing known yet
+        inputs = pd.DataFrame({k: np.atleast_1d(np.asarray(v, dtype=object)) for k, v in inputs.items()}) \
+            if inputs else pd.DataFrame(index=range(1))
+    n = len(inputs)
+    declined = np.zeros(n, dtype=bool)
+    limit = np.full(n, np.inf)
+    grade = np.full(n, None, dtype=object)
+    reasons = [[] for _ in range(n)]
+    for rule in rules:
+        if any(name not in inputs.columns for name in rule.inputs):
+            continue
+        fired = rule.fires(inputs[rule.input])
+        for name, at_least, below in rule.also:
+            fired &= _within(inputs[name], at_least, below)
+        if rule.action == "decline":
+            declined |= fired
+        elif rule.action == "grade":
+            grade = np.where(fired & pd.isna(grade), rule.grade, grade)
+        else:
+            limit = np.where(fired, np.minimum(limit, rule.limit), limit)
+        for i in np.flatnonzero(fired):
+            reasons[i].append(rule.reason)
+    return pd.DataFrame({"declined": declined, "limit": np.where(np.isinf(limit), np.nan, limit),
+                         "grade": grade, "reasons": reasons}, index=inputs.index)
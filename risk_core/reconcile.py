@@ -0,0 +1,123 @@
+"""Check a parsed statement against its own running balance.
+
+Every row of an M-PESA or bank statement prints the balance after it, so each
+balance must be the one before it plus the row's signed amount. The parsers
+used to throw the balances away; they now keep them in ``Balance`` and
+``balance_breaks`` checks every row at once with ``np.diff``. Statements are
+printed oldest first or newest first; the order in which more rows chain is
+the one used. A row that doesn't chain is
+
+* ``sign``: it chains with its amount on the other side (the M-PESA amount
+  pattern drops the minus of a withdrawal printed on the "Completed" line);
+* ``gap``: the balance moved by something else: rows between it and its
+  neighbour were dropped or misread. ``gap`` is the unexplained movement.
+
+``reconcile`` flips the rows the balance proves mis-signed. For each gap it
+can ask ``reparse`` (the app's parser over ``pdf_cache.span_text``) for the
+rows on just the pages between the two balances, read again in reading
+order, and splice them in when they close the gap, instead of re-running the
+whole document. Rows without a readable balance are not checked.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from risk_core.features import signed_amounts
+from risk_core.instrumentation import record
+from risk_core.parsers import OTHER_SPLIT
+
+TOLERANCE = float(os.environ.get("RISK_RECONCILE_TOLERANCE", "0.01"))
+BREAK_COLUMNS = ["row", "previous", "amount", "balance", "expected", "gap", "kind"]
+
+
+def balance_breaks(amounts, balances, tolerance=TOLERANCE):
+    """One row per balance that doesn't follow from its neighbour's and its own signed amount."""
+    amounts = np.asarray(amounts, dtype=float)
+    balances = np.asarray(balances, dtype=float)
+    if len(amounts) < 2:
+        return pd.DataFrame(columns=BREAK_COLUMNS)
+    moved = np.diff(balances)
+    # Oldest first, row i moves the balance from row i-1; newest first, row i-1 moves it from row i
+    orders = {"oldest_first": (np.arange(1, len(amounts)), moved - amounts[1:]),
+              "newest_first": (np.arange(len(amounts) - 1), -moved - amounts[:-1])}
+
+    def chained(row, error):
+        return (np.abs(error) <= tolerance) | (np.abs(error + 2 * amounts[row]) <= tolerance)
+    newest_first = chained(*orders["newest_first"]).sum() > chained(*orders["oldest_first"]).sum()
+    row, error = orders["newest_first" if newest_first else "oldest_first"]
+    broken = np.flatnonzero(np.abs(error) > tolerance)  # NaN balances compare False: not checked
+    row, error = row[broken], error[broken]
+    previous = row + 1 if newest_first else row - 1
+    kind = np.where(np.abs(error + 2 * amounts[row]) <= tolerance, "sign", "gap")
+    return pd.DataFrame({"row": row, "previous": previous, "amount": amounts[row], "balance": balances[row],
+                         "expected": balances[row] - error, "gap": error, "kind": kind}, columns=BREAK_COLUMNS)
+
+
+def fix_signs(df, rows, splits=OTHER_SPLIT):
+    """``df`` with ``rows`` (positions) moved to the other side, split categories included."""
+    if not len(rows):
+        return df
+    df = df.copy()
+    rows = np.asarray(rows)
+    if "Inflow/Outflow" not in df.columns:
+        df.iloc[rows, df.columns.get_loc("Amount")] = -df["Amount"].to_numpy()[rows]
+        return df
+    direction = df.columns.get_loc("Inflow/Outflow")
+    flipped = np.where(df["Inflow/Outflow"].to_numpy()[rows] == "Inflow", "Outflow", "Inflow")
+    df.iloc[rows, direction] = flipped
+    if "Category" in df.columns:
+        other_side = {a: b for pair in splits.values() for a, b in (pair, pair[::-1])}
+        categories = df["Category"].to_numpy()[rows]
+        df.iloc[rows, df.columns.get_loc("Category")] = [other_side.get(c, c) for c in categories]
+    return df
+
+
+def _printed(balance):
+    return f"{abs(balance):,.2f}"
+
+
+def _splice(df, gap, reparse, tolerance, splits):
+    """``df`` with the re-read rows between ``gap``'s two balances inserted, or None when they don't close it."""
+    low, high = sorted((int(gap["previous"]), int(gap["row"])))
+    balances = df["Balance"].to_numpy(dtype=float)
+    rows = reparse((_printed(balances[low]), _printed(balances[high])))
+    if rows is None or not len(rows) or "Balance" not in rows.columns:
+        return None
+    found = rows["Balance"].to_numpy(dtype=float)
+    starts = np.flatnonzero(np.abs(found - balances[low]) <= tolerance)
+    ends = np.flatnonzero(np.abs(found - balances[high]) <= tolerance)
+    if not len(starts) or not len(ends[ends > starts[0]]):
+        return None
+    # The two rows either side, as re-read, so the inserted ones are checked against both balances
+    segment = rows.iloc[starts[0]:ends[ends > starts[0]][0] + 1].reset_index(drop=True)
+    breaks = balance_breaks(signed_amounts(segment), segment["Balance"], tolerance)
+    if (breaks["kind"] == "gap").any():
+        return None
+    segment = fix_signs(segment, breaks["row"][breaks["kind"] == "sign"], splits)
+    return pd.concat([df.iloc[:low + 1], segment.iloc[1:-1][df.columns], df.iloc[high:]], ignore_index=True)
+
+
+def reconcile(df, reparse=None, tolerance=TOLERANCE, splits=OTHER_SPLIT):
+    """(df, gaps): missing rows re-read through ``reparse`` when given, mis-signed rows fixed, and the gaps left.
+
+    ``reparse(anchors)`` gets the printed balances either side of a gap and
+    returns the parsed rows of the pages between them (with ``Balance``), or None.
+    """
+    if df is None or "Balance" not in df.columns:
+        return df, pd.DataFrame(columns=BREAK_COLUMNS)
+    breaks = balance_breaks(signed_amounts(df), df["Balance"], tolerance)
+    gaps = breaks[breaks["kind"] == "gap"]
+    if reparse is not None and len(gaps):
+        spliced = 0
+        # From the end, so inserting rows into one gap doesn't move the ones before it
+        for _, gap in gaps.iloc[::-1].iterrows():
+            fixed = _splice(df, gap, reparse, tolerance, splits)
+            if fixed is not None:
+                df, spliced = fixed, spliced + 1
+        record(gaps_reparsed=spliced)
+        if spliced:
+            breaks = balance_breaks(signed_amounts(df), df["Balance"], tolerance)
+    signs = breaks["kind"] == "sign"
+    record(sign_fixes=int(signs.sum()))
+    return fix_signs(df, breaks["row"][signs], splits), breaks[~signs].reset_index(drop=True)
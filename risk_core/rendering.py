@@ -0,0 +1,116 @@
+"""Cheaper rendering of large tables, raw text and charts in the apps.
+
+* ``show_table`` sends one page of a big frame to the browser instead of all rows.
+* ``show_text`` previews the start of an extracted document instead of all of it.
+* ``show_chart`` renders charts to PNG once per (data hash, chart spec) and
+  reuses the bytes on later reruns. Figures are built with
+  ``matplotlib.figure.Figure`` and closed after rendering, so pyplot's global
+  figure registry never grows and sessions don't share figure state.
+"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+import streamlit as st
+from matplotlib.figure import Figure
+
+from risk_core.instrumentation import stage
+
+PAGE_SIZE = 200
+PREVIEW_CHARS = 5000
+MAX_CHART_POINTS = 2000
+CHART_CACHE_SIZE = 64
+
+_chart_cache = OrderedDict()
+_chart_lock = threading.Lock()
+
+
+# TABLES
+def show_table(df, key, page_size=PAGE_SIZE):
+    with stage("render_table", rows=len(df)):
+        if len(df) <= page_size:
+            st.dataframe(df)
+            return
+        pages = (len(df) - 1) // page_size + 1
+        page = st.number_input(f"Page (1–{pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+        start = (page - 1) * page_size
+        end = min(start + page_size, len(df))
+        st.dataframe(df.iloc[start:end])
+        st.caption(f"Rows {start + 1:,}–{end:,} of {len(df):,}")
+
+
+# RAW TEXT
+def show_text(text, label, limit=PREVIEW_CHARS):
+    with st.expander(label):
+        if len(text) <= limit:
+            st.text(text)
+        else:
+            st.text(text[:limit])
+            st.caption(f"Showing the first {limit:,} of {len(text):,} characters.")
+
+
+# CHARTS
+def data_hash(data):
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        digest = pd.util.hash_pandas_object(data, index=True).values.tobytes()
+        return hashlib.sha1(digest).hexdigest()
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def downsample(series, max_points=MAX_CHART_POINTS):
+    """Keep every n-th point (and the last one) so long series plot quickly."""
+    if len(series) <= max_points:
+        return series
+    step = -(-len(series) // max_points)
+    sampled = series.iloc[::step]
+    if sampled.index[-1] != series.index[-1]:
+        sampled = pd.concat([sampled, series.iloc[-1:]])
+    return sampled
+
+
+def _draw(kind, data, spec):
+    fig = Figure()
+    ax = fig.subplots()
+    if kind == "pie":
+        data.plot(kind="pie", autopct="%1.1f%%", ax=ax, title=spec.get("title"))
+    elif kind == "line":
+        data = downsample(data)
+        ax.plot(data.index, data.values, marker=spec.get("marker"), linestyle="-", color=spec.get("color"))
+        ax.set_title(spec.get("title", ""))
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+    ax.set_xlabel(spec.get("xlabel", ""))
+    ax.set_ylabel(spec.get("ylabel", ""))
+    if spec.get("grid"):
+        ax.grid(True)
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
+
+
+def chart_png(kind, data, **spec):
+    key = (kind, data_hash(data), json.dumps(spec, sort_keys=True))
+    with _chart_lock:
+        if key in _chart_cache:
+            _chart_cache.move_to_end(key)
+            return _chart_cache[key]
+    png = _draw(kind, data, spec)
+    with _chart_lock:
+        _chart_cache[key] = png
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return png
+
+
+def show_chart(kind, data, **spec):
+    with stage("render_chart", points=len(data)):
+        st.image(chart_png(kind, data, **spec))
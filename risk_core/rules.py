@@ -0,0 +1,154 @@
+"""Category rules, FSV pools and interest-rate tiers shared by the apps.
+
+The tables live in ``rules.json`` next to this module (or the file named by
+``RISK_RULES_FILE``) so analysts can tune them without a redeploy. The file is
+compiled once into immutable structures: each profile's keywords and
+patterns become a ``MerchantIndex`` (words, phrases and paybill/till numbers
+to categories) behind an LRU cache of narrations, and each app selects its
+profile by name. The ``scorecards`` section is compiled into ``Scorecard``
+objects (see ``scorecard.py``) stamped with the rules version, and the
+``policy`` section into ``PolicyRule`` knock-outs and grade overrides (see
+``policy.py``). ``notes`` is for people: per version, what changed grades and
+why.
+
+``current_rules()`` re-reads the file only when its mtime changes, and checks
+the mtime at most once every ``RISK_RULES_CHECK_SECONDS``, so calling it per
+transaction costs next to nothing. A file that fails to load leaves the
+previous rules in place.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional
+
+from risk_core.merchants import MerchantIndex
+from risk_core.policy import load_policy
+from risk_core.scorecard import load_scorecard
+
+RULES_FILE = os.environ.get("RISK_RULES_FILE", os.path.join(os.path.dirname(__file__), "rules.json"))
+CHECK_SECONDS = float(os.environ.get("RISK_RULES_CHECK_SECONDS", "2"))
+NARRATION_CACHE_SIZE = int(os.environ.get("RISK_NARRATION_CACHE_SIZE", "50000"))
+
+logger = logging.getLogger("risk_core.rules")
+
+
+@dataclass(frozen=True)
+class Rules:
+    version: str
+    mtime: float
+    default_category: str
+    categories: MappingProxyType  # profile -> ((category, keywords, compiled pattern or None), ...)
+    matchers: MappingProxyType    # profile -> cached MerchantIndex.categorize
+    fsv_pools: tuple              # ((pool, models, ((start, end, percent), ...)), ...)
+    rate_tiers: tuple             # ((min_months, max_months, rate), ...)
+    default_rate: float
+    scorecards: MappingProxyType  # name -> Scorecard
+    collateral_stress: MappingProxyType  # Monte Carlo assumptions per FSV pool, see collateral.py
+    affordability: MappingProxyType  # amortization method and debt-service cap, see amortization.py
+    policy: tuple                 # PolicyRule knock-outs and grade overrides, see policy.py
+
+    def categorize(self, profile, description):
+        return self.matchers[profile](description)
+
+    def fsv(self, model, year) -> Optional[float]:
+        match = self.fsv_pool(model, year)
+        return match[1] if match else None
+
+    def fsv_pool(self, model, year) -> Optional[tuple]:
+        """(pool, percent) of the first FSV matrix entry for this model and year."""
+        model = model.lower()
+        for pool, models, year_ranges in self.fsv_pools:
+            if any(m in model for m in models):
+                for start, end, percent in year_ranges:
+                    if start <= year <= end:
+                        return pool, percent
+        return None
+
+    def interest_rate(self, period_in_months) -> float:
+        for low, high, rate in self.rate_tiers:
+            if low <= period_in_months <= high:
+                return rate
+        return self.default_rate
+
+
+def _compile_rule(rule):
+    if "pattern" in rule:
+        return rule["category"], (), re.compile(rule["pattern"])
+    return rule["category"], tuple(k.lower() for k in rule["keywords"]), None
+
+
+def load_rules(path=RULES_FILE):
+    mtime = os.stat(path).st_mtime
+    with open(path, encoding="utf-8") as fh:
+        raw = json.load(fh)
+    default_category = raw.get("default_category", "Other")
+    categories = {
+        profile: tuple(_compile_rule(rule) for rule in rules)
+        for profile, rules in raw["categories"].items()
+    }
+    merchants = tuple(raw.get("merchants", ()))
+    matchers = {
+        profile: lru_cache(maxsize=NARRATION_CACHE_SIZE)(
+            MerchantIndex(rules, merchants, default=default_category).categorize)
+        for profile, rules in categories.items()
+    }
+    version = str(raw["version"])
+    return Rules(
+        version=version,
+        mtime=mtime,
+        default_category=default_category,
+        categories=MappingProxyType(categories),
+        matchers=MappingProxyType(matchers),
+        fsv_pools=tuple(
+            (pool, tuple(m.lower() for m in entry["models"]), tuple(tuple(r) for r in entry["year_ranges"]))
+            for pool, entries in raw["fsv_pools"].items() for entry in entries
+        ),
+        rate_tiers=tuple((t["min_months"], t["max_months"], float(t["rate"])) for t in raw["rate_tiers"]),
+        default_rate=float(raw["default_rate"]),
+        scorecards=MappingProxyType({name: load_scorecard(name, card, version)
+                                     for name, card in raw.get("scorecards", {}).items()}),
+        collateral_stress=MappingProxyType(raw.get("collateral_stress", {})),
+        affordability=MappingProxyType(raw.get("affordability", {})),
+        policy=load_policy(raw.get("policy", ())),
+    )
+
+
+_rules = None
+_next_check = 0.0
+_failed_mtime = None
+_lock = threading.Lock()
+
+
+def current_rules():
+    global _rules, _next_check, _failed_mtime
+    now = time.monotonic()
+    if _rules is not None and now < _next_check:
+        return _rules
+    with _lock:
+        if _rules is None:
+            _rules = load_rules()
+        elif now >= _next_check:
+            try:
+                mtime = os.stat(RULES_FILE).st_mtime
+                if mtime not in (_rules.mtime, _failed_mtime):
+                    _failed_mtime = mtime
+                    _rules = load_rules()
+                    logger.info("Reloaded rules version %s", _rules.version)
+            except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+                logger.warning("Keeping rules version %s, reload failed: %s", _rules.version, e)
+        _next_check = now + CHECK_SECONDS
+        return _rules
+
+
+def categorize(profile, description):
+    return current_rules().categorize(profile, description)
+
+
+def scorecard(name):
+    return current_rules().scorecards[name]
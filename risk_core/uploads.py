@@ -0,0 +1,118 @@
+"""Uploaded files handed to the extractors without copying them.
+
+Streamlit's ``UploadedFile`` is a ``BytesIO`` over the upload's bytes, and
+``getvalue()`` returns those same bytes as long as nothing writes to the file
+or calls ``getbuffer()`` (which makes ``BytesIO`` take a private copy). The
+copies came from what happened next: each pool job pickled the whole
+document to a worker, the password guesses pickled it once per chunk, and a
+cached PDF handle kept the bytes it was opened from alive, in every process
+that opened it, long after the session had gone.
+
+* ``upload_digest`` hashes ``getvalue()`` and remembers the digest for that
+  upload object, so the fingerprint and the extractors hash it once.
+* ``upload_source`` is what the extractors open, in a ``with`` block: the
+  bytes of a small upload, or for one of ``RISK_UPLOAD_SPILL_BYTES`` or more
+  a file in a private directory of this process (created 0700 under
+  ``RISK_UPLOAD_SPILL_DIR``, the system temp directory by default, and
+  removed at exit). PyMuPDF and zipfile read pages and parts from the file
+  as needed, so a cached PDF handle holds a file descriptor instead of the
+  document and a pool worker gets a path. Sessions spilling the same
+  document share one file, and it is deleted when the last of their blocks
+  ends: a statement is on disk only while a job is reading it.
+* ``upload_text`` decodes a text upload from its bytes wherever the read
+  position is.
+
+A cached PDF handle keeps reading a deleted spill file through its open
+descriptor; the space is freed when the handle closes, and the next
+``upload_source`` block writes the file again if a job needs it.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+
+from risk_core.instrumentation import record
+
+SPILL_BYTES = int(os.environ.get("RISK_UPLOAD_SPILL_BYTES", str(8 << 20)))
+SPILL_DIR = os.environ.get("RISK_UPLOAD_SPILL_DIR")  # parent of this process's spill directory
+
+_digests = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_spills = {}  # spill file path -> blocks using it
+_spill_dir = None
+_spill_lock = threading.Lock()
+
+
+def upload_digest(file):
+    """SHA-256 (hex) of an upload."""
+    with _lock:
+        known = _digests.get(file)
+    if known is not None and known[0] == file.size:
+        return known[1]
+    digest = hashlib.sha256(file.getvalue()).hexdigest()
+    with _lock:
+        _digests[file] = (file.size, digest)
+    return digest
+
+
+def upload_text(file, encoding="utf-8"):
+    return file.getvalue().decode(encoding)
+
+
+def _directory():
+    global _spill_dir
+    if _spill_dir is None:
+        _spill_dir = tempfile.mkdtemp(prefix="risk_uploads_", dir=SPILL_DIR)
+        atexit.register(shutil.rmtree, _spill_dir, True)
+    return _spill_dir
+
+
+def _spill(file):
+    """The upload's spill file, written if no block is using it yet."""
+    digest = upload_digest(file)
+    with _spill_lock:
+        path = os.path.join(_directory(), digest + os.path.splitext(file.name)[1].lower())
+        if _spills.get(path):
+            record(spilled_bytes=0)
+        else:
+            # Written under a temporary name and renamed, so a reader never sees half a file
+            fd, partial = tempfile.mkstemp(dir=_spill_dir, suffix=".partial")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    out.write(file.getvalue())
+                os.replace(partial, path)
+            except BaseException:
+                os.unlink(partial)
+                raise
+            record(spilled_bytes=file.size)
+        _spills[path] = _spills.get(path, 0) + 1
+    return path
+
+
+def _unspill(path):
+    with _spill_lock:
+        _spills[path] -= 1
+        if _spills[path] > 0:
+            return
+        del _spills[path]
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def upload_source(file):
+    """The upload's bytes, or the path of its spill file when it is large, for the duration of the block."""
+    if file.size < SPILL_BYTES:
+        yield file.getvalue()
+        return
+    path = _spill(file)
+    try:
+        yield path
+    finally:
+        _unspill(path)
@@ -0,0 +1,116 @@
+"""Rolling-window inflow totals over a dated statement.
+
+``InflowIndex`` sorts the dated inflows once and keeps their prefix sums, so
+the total for any date window is two binary searches and a subtraction.
+Officers can then compare eligibility over 1, 3, 6 or 12 months without the
+statement being parsed again.
+
+Windows end, and months covered are counted, over the statement's period
+(``statement_period``: its first and last dates), not over the inflows alone:
+a three-month statement whose only inflows came in its last fortnight
+averages them over three months, not one.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# "2025-01-15 10:22:11" (M-PESA exports) or "15/01/2025" (pasted bank style)
+STATEMENT_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b|\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+AVG_MONTH_DAYS = 30.4375
+
+
+def iso_date(line):
+    """The line's date as a "YYYY-MM-DD" string (these order like the dates), or None."""
+    match = STATEMENT_DATE.search(line)
+    if not match:
+        return None
+    if match.group(1):
+        return match.group(0)
+    return f"{match.group(6)}-{match.group(5).zfill(2)}-{match.group(4).zfill(2)}"
+
+
+def _as_date(match):
+    return find_date(match.group(0)) if match else None
+
+
+def statement_period(text):
+    """(first, last) date printed in the statement text, or Nones when it has none.
+
+    Statements run in date order (either way), so the first date from the top
+    and the last from the bottom bound it; the latter is looked for a line at a
+    time from the end, which is usually one line.
+    """
+    first = _as_date(STATEMENT_DATE.search(text))
+    if first is None:
+        return None, None
+    last, end = None, len(text)
+    while last is None and end > 0:
+        start = text.rfind("\n", 0, end) + 1
+        matches = list(STATEMENT_DATE.finditer(text, start, end))
+        last = _as_date(matches[-1]) if matches else None
+        end = start - 1
+    return (first, first) if last is None else (min(first, last), max(first, last))
+
+
+def find_date(line):
+    date = iso_date(line)
+    if date is None:
+        return None
+    try:
+        return np.datetime64(date, "D")
+    except ValueError:
+        return None
+
+
+class InflowIndex:
+    def __init__(self, dates, amounts, start=None, end=None, undated=0):
+        """``start`` / ``end``: the statement's first and last dates (widened to the inflows').
+        ``undated``: how many inflows had no readable date and so are in no window."""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        amounts = np.asarray(amounts, dtype=float)
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+        self.prefix = np.concatenate(([0.0], np.cumsum(amounts[order])))
+        self.start = self.end = None
+        self.undated = undated
+        if len(self):
+            self.start = self.dates[0] if start is None else min(np.datetime64(start, "D"), self.dates[0])
+            self.end = self.dates[-1] if end is None else max(np.datetime64(end, "D"), self.dates[-1])
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def first(self):
+        """First day of the statement period."""
+        return self.start
+
+    @property
+    def last(self):
+        """Last day of the statement period."""
+        return self.end
+
+    def total(self, start=None, end=None):
+        """Sum of inflows dated after ``start`` and up to and including ``end``."""
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, "D"), side="right")
+        hi = len(self) if end is None else np.searchsorted(self.dates, np.datetime64(end, "D"), side="right")
+        return float(self.prefix[hi] - self.prefix[lo]) if hi > lo else 0.0
+
+    def window_start(self, months, end=None):
+        end = self.last if end is None else np.datetime64(end, "D")
+        return np.datetime64((pd.Timestamp(end) - pd.DateOffset(months=months)).date(), "D")
+
+    def months_covered(self, months, end=None):
+        """Months of the window the statement actually covers (at most ``months``)."""
+        if not len(self):
+            return 0
+        end = self.last if end is None else np.datetime64(end, "D")
+        span = max((end - self.first).astype(int) + 1, 1)
+        return min(months, max(1, int(np.ceil(span / AVG_MONTH_DAYS))))
+
+    def average_monthly(self, months, end=None):
+        if not len(self):
+            return 0.0
+        end = self.last if end is None else np.datetime64(end, "D")
+        return self.total(self.window_start(months, end), end) / self.months_covered(months, end)
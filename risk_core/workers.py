@@ -0,0 +1,188 @@
+"""Shared, bounded process pool for CPU-heavy parsing, scheduled fairly per user.
+
+With ``RISK_DEPLOY_MODE=pool`` the apps hand document extraction and parsing
+to ``run_job``, which queues the job under the current user and waits for the
+result. Each node runs one ``FairPool``:
+
+* at most ``RISK_POOL_WORKERS`` jobs run at once, in a process pool, so one
+  officer uploading a 300-page report cannot take every core;
+* users are served round-robin, one job per turn, and each user has at most
+  ``RISK_POOL_PER_USER`` jobs running and ``RISK_POOL_MAX_QUEUED`` waiting
+  (beyond that ``submit`` raises ``QueueFull``);
+* queue depth, running jobs and waiting users are published as gauges, and
+  each job's queue wait is recorded on its stage as ``queue_seconds``.
+
+The user is the Streamlit session, or the value of the ``RISK_USER_HEADER``
+request header when a proxy in front of the apps sets one. In the default
+``inline`` mode ``run_job`` just calls the function, as before.
+
+Jobs must be picklable: module-level functions from ``risk_core`` with plain
+arguments (bytes rather than upload objects).
+"""
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from risk_core.instrumentation import gauge, record, stage
+
+DEPLOY_MODE = os.environ.get("RISK_DEPLOY_MODE", "inline").lower()
+POOL_WORKERS = int(os.environ.get("RISK_POOL_WORKERS", str(os.cpu_count() or 1)))
+PER_USER = int(os.environ.get("RISK_POOL_PER_USER", "1"))
+MAX_QUEUED = int(os.environ.get("RISK_POOL_MAX_QUEUED", "16"))
+JOB_TIMEOUT = float(os.environ.get("RISK_POOL_TIMEOUT_SECONDS", "300"))
+USER_HEADER = os.environ.get("RISK_USER_HEADER")
+# Imported once in the fork server so new workers start warm
+PRELOAD = ["risk_core.pdf_cache", "risk_core.docx_stream", "risk_core.crb_accounts", "pandas"]
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class FairPool:
+    def __init__(self, workers=POOL_WORKERS, per_user=PER_USER, max_queued=MAX_QUEUED):
+        self.workers = workers
+        self.per_user = per_user
+        self.max_queued = max_queued
+        self._executor = None
+        self._queues = {}       # user -> deque of (future, fn, args, kwargs, enqueued_at)
+        self._ready = deque()   # users with queued jobs, in round-robin order
+        self._inflight = defaultdict(int)
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(PRELOAD)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def submit(self, user, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(user)
+            if queue is None:
+                queue = self._queues[user] = deque()
+                self._ready.append(user)
+            if len(queue) >= self.max_queued:
+                raise QueueFull(f"{len(queue)} documents are already waiting for this user; try again shortly.")
+            queue.append((future, fn, args, kwargs, time.perf_counter()))
+        self._pump()
+        return future
+
+    def _pump(self):
+        with self._lock:
+            started = self._dispatch()
+        # Outside the lock: a job that already finished runs its callback right here
+        for user, future, inner in started:
+            inner.add_done_callback(functools.partial(self._done, user, future))
+
+    def _dispatch(self):
+        # Called with the lock held. Users at their in-flight cap keep their place in the rotation.
+        started = []
+        capped = 0
+        while self._running < self.workers and capped < len(self._ready):
+            user = self._ready.popleft()
+            if self._inflight[user] >= self.per_user:
+                self._ready.append(user)
+                capped += 1
+                continue
+            capped = 0
+            queue = self._queues[user]
+            future, fn, args, kwargs, enqueued = queue.popleft()
+            if queue:
+                self._ready.append(user)
+            else:
+                del self._queues[user]
+            if not future.set_running_or_notify_cancel():
+                continue
+            future.queued_seconds = time.perf_counter() - enqueued
+            self._running += 1
+            self._inflight[user] += 1
+            try:
+                inner = self._pool().submit(fn, *args, **kwargs)
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._executor = None
+                self._release(user)
+                future.set_exception(e)
+                continue
+            started.append((user, future, inner))
+        self._publish()
+        return started
+
+    def _release(self, user):
+        self._running -= 1
+        self._inflight[user] -= 1
+        if not self._inflight[user]:
+            del self._inflight[user]
+
+    def _done(self, user, future, inner):
+        with self._lock:
+            self._release(user)
+            if isinstance(inner.exception(), BrokenProcessPool):
+                self._executor = None
+        if inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+        self._pump()
+
+    def _publish(self):
+        depths = [len(q) for q in self._queues.values()]
+        gauge("risk_pool_queue_depth", sum(depths))
+        gauge("risk_pool_queue_depth_max_user", max(depths, default=0))
+        gauge("risk_pool_users_waiting", len(depths))
+        gauge("risk_pool_running", self._running)
+
+    def stats(self):
+        with self._lock:
+            return {"queued": sum(len(q) for q in self._queues.values()), "running": self._running,
+                    "users_waiting": len(self._queues)}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FairPool()
+        return _shared
+
+
+def current_user():
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "local"
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return "local"
+    if USER_HEADER:
+        value = st.context.headers.get(USER_HEADER)
+        if value:
+            return value
+    return ctx.session_id
+
+
+def run_job(fn, *args, **kwargs):
+    if DEPLOY_MODE != "pool":
+        return fn(*args, **kwargs)
+    with stage(f"pool_{fn.__name__}"):
+        future = shared_pool().submit(current_user(), fn, *args, **kwargs)
+        try:
+            result = future.result(timeout=JOB_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise
+        record(queue_seconds=future.queued_seconds)
+        return result
@@ -1,12 +1,23 @@
 import streamlit as st
-import pdfplumber
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import re
 from io import StringIO
+from risk_core.instrumentation import timed, stage, record, start_request, finish_request, render_debug_panel
+from risk_core.rendering import show_table, show_chart
+from risk_core.features import features_for_document
+from risk_core.pdf_cache import open_pdf, password_candidates
+from risk_core.uploads import upload_digest, upload_source
+from risk_core.document import Document
+from risk_core.crb_accounts import parse_accounts, LoanIntervals
+from risk_core.csv_ingest import read_statement_csv
+from risk_core.rules import categorize, scorecard, current_rules
+from risk_core.policy import evaluate as evaluate_policy
+from risk_core.parsers import ksh_transactions
 
 st.set_page_config(page_title=" Credit Risk Analysis Tool", layout="wide")
 st.title(" Credit Risk Analysis Dashboard")
+start_request("scoring")
 st.markdown("""
 Upload files and analyze:
 -  MPESA Statement (PDF/CSV): Spending habits.
@@ -16,131 +27,118 @@ Upload files and analyze:
 
 #  HELPER FUNCTIONS
 def categorize_mpesa(description):
-    description_lower = description.lower()
-    if "airtime" in description_lower:
-        return "Airtime"
-    if "bet" in description_lower or "game" in description_lower or "Betika" in description_lower or "Sportpesa" in description_lower:
-        return "Betting"
-    if "petroleum" in description_lower or "fuel" in description_lower or "gas" in description_lower or "diesel" in description_lower or "oil" in description_lower:
-        return "Petroleum"
-    if "loan" in description_lower or "overdraft" in description_lower or "fuliza" in description_lower:
-        return "Loans"
-    else:
-        return "Other"
-
-def extract_text_from_pdf(file, password=None):
-    with pdfplumber.open(file, password=password) as pdf:
-        return "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+    return categorize("scoring", description)
+
+@timed()
+def extract_text_from_pdf(file, password=None, candidates=()):
+    record(bytes=file.size)
+    with upload_source(file) as source, open_pdf(source, password=password, candidates=candidates,
+                                                  digest=upload_digest(file)) as handle:
+        record(pages=handle.page_count)
+        return Document(handle.text())
 # extract_text_from_pdf(file):
  #   with pdfplumber.open(file) as pdf:
   #      return "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
 
+@timed()
 def parse_mpesa_from_text(text):
-    lines = text.split('\n')
-    transactions = []
-    for line in lines:
-        if "Ksh" in line:
-            parts = line.split()
-            try:
-                amount = float(parts[-1].replace(",", "").replace("Ksh", ""))
-                transactions.append({"Description": " ".join(parts[:-1]), "Amount": amount})
-            except:
-                continue
-    return pd.DataFrame(transactions)
+    return ksh_transactions(text)
 
+@timed()
 def parse_bank_from_text(text):
-    lines = text.split('\n')
-    transactions = []
-    for line in lines:
-        if "Ksh" in line:
-            parts = line.split()
-            try:
-                amount = float(parts[-1].replace(",", "").replace("Ksh", ""))
-                transactions.append({"Description": " ".join(parts[:-1]), "Amount": amount})
-            except:
-                continue
-    return pd.DataFrame(transactions)
+    return ksh_transactions(text, dates=True)
 
 def extract_ppi(text):
     match = re.search(r"The metropol PPI.*?indicates an average late payment of 0 to 10 days.*?M(\d)", text, re.IGNORECASE)
     return f"M{match.group(1)}" if match else "Unknown"
 
+@timed()
 def extract_accounts(text):
-    pattern = r"Performing Account Without Default History.*?Principal Amount\s+(\d+\.\d+).*?Account Opened\s+(\d{4}-\d{2}-\d{2})"
-    matches = re.findall(pattern, text, re.DOTALL)
-    return [{"amount": float(m[0]), "opened": pd.to_datetime(m[1])} for m in matches]
+    accounts = parse_accounts(text)
+    record(accounts=len(accounts))
+    return accounts
 
 def assess_risk(ppi, accounts):
-    if ppi == "M1" and all(a['amount'] < 1000 for a in accounts):
-        return " LOW RISK"
-    elif ppi in ["M2", "M3"]:
-        return " MODERATE RISK"
-    else:
-        return " HIGH RISK"
+    # Cut-offs live in the "crb" scorecard in risk_core/rules.json; a "grade" policy rule there overrides it
+    max_principal = accounts["principal"].max() if len(accounts) else None
+    inputs = {"ppi": ppi, "max_principal": max_principal}
+    override = evaluate_policy(current_rules().policy, inputs)["grade"].iloc[0]
+    return f" {override or scorecard('crb').score(inputs)['grade'].iloc[0]}"
 
 # MPESA ANALYSIS
-def mpesa_analysis():
+def mpesa_analysis(pdf_password, password_guesses):
     st.subheader("MPESA Statement Analysis")
     uploaded_file = st.file_uploader("Upload MPESA Statement (PDF or CSV):", type=["pdf", "csv"])
 
-    pdf_password = st.text_input("Enter PDF Password (if any):", type="password")
     if uploaded_file:
         if uploaded_file.type == "text/csv":
-            df = pd.read_csv(uploaded_file)
+            with stage("read_csv", bytes=uploaded_file.size):
+                df = read_statement_csv(uploaded_file)
+                record(transactions=len(df))
         else:
-            text = extract_text_from_pdf(uploaded_file, password=pdf_password)
+            text = extract_text_from_pdf(uploaded_file, password=pdf_password, candidates=password_guesses)
             df = parse_mpesa_from_text(text)
 
         st.write("MPESA Statement Loaded.")
         st.dataframe(df.head())
 
         if "Details" in df.columns and "Amount" in df.columns:
-            df["Category"] = df["Details"].apply(categorize_mpesa)
+            with stage("categorize_mpesa", transactions=len(df)):
+                df["Category"] = df["Details"].apply(categorize_mpesa)
             spend_data = df[df["Amount"] < 0].groupby("Category")["Amount"].sum().abs()
             st.write("Spending by Category:", spend_data)
-            fig, ax = plt.subplots()
-            spend_data.plot(kind="pie", autopct="%1.1f%%", ax=ax, title="Spending Habits")
-            ax.set_ylabel("")
-            st.pyplot(fig)
+            show_chart("pie", spend_data, title="Spending Habits")
 
 #  CRB ANALYSIS
-def crb_analysis():
+def crb_analysis(pdf_password, password_guesses):
     st.subheader(" CRB Report Analyzer")
     uploaded_file = st.file_uploader("Upload CRB Report (PDF only):", type=["pdf"])
     if uploaded_file:
-        text = extract_text_from_pdf(uploaded_file)
+        text = extract_text_from_pdf(uploaded_file, password=pdf_password, candidates=password_guesses)
         ppi = extract_ppi(text)
         accounts = extract_accounts(text)
         risk_level = assess_risk(ppi, accounts)
 
         st.markdown(f"**Payment Performance Index (PPI):** `{ppi}`")
         st.markdown(f"**Number of Accounts:** `{len(accounts)}`")
-        st.markdown(f"**Total Borrowed:** `KES {sum(a['amount'] for a in accounts):,.2f}`")
+        st.markdown(f"**Total Borrowed:** `KES {accounts['principal'].sum():,.2f}`")
         st.markdown(f"**Risk Assessment:** `{risk_level}`")
 
-        if accounts:
-            df = pd.DataFrame(accounts).sort_values("opened")
+        if not accounts.empty:
+            df = accounts.sort_values("opened")
             st.subheader(" Credit Activity Over Time")
-            fig, ax = plt.subplots()
-            ax.plot(df["opened"], df["amount"], marker='o', linestyle='-')
-            ax.set_title("Loan Amounts vs. Date Opened")
-            ax.set_xlabel("Date Opened")
-            ax.set_ylabel("KES Amount")
-            ax.grid(True)
-            st.pyplot(fig)
+            show_chart("line", df.set_index("opened")["principal"], title="Loan Amounts vs. Date Opened",
+                       xlabel="Date Opened", ylabel="KES Amount", marker="o", grid=True)
+
+            loans = LoanIntervals(accounts)
+            if len(loans):
+                st.subheader(" Exposure")
+                as_of = np.datetime64(st.date_input("Exposure as of:", value=pd.Timestamp.today()), "D")
+                window = st.slider("Window (days):", 30, 365, 90, step=30)
+                since = as_of - np.timedelta64(window, "D")
+                st.markdown(f"**Open Loans:** `{int(loans.open_at(as_of))}`")
+                st.markdown(f"**Exposure (Principal of Open Loans):** `KES {float(loans.exposure_at(as_of)):,.2f}`")
+                st.markdown(f"**Loans Opened in Window:** `{int(loans.opened_during(since, as_of))}`")
+                st.markdown(f"**Loans Open During Window:** `{int(loans.open_during(since, as_of))}`")
+                months = pd.date_range(loans.starts[0], as_of, freq="MS")
+                if len(months):
+                    show_chart("line", pd.Series(loans.exposure_at(months.to_numpy()), index=months),
+                               title="Open Exposure Over Time", xlabel="Month", ylabel="KES Amount", grid=True)
 
             st.subheader(" Account Breakdown")
-            st.dataframe(df.rename(columns={"amount": "Amount (KES)", "opened": "Date Opened"}))
+            show_table(df.rename(columns={"principal": "Amount (KES)", "opened": "Date Opened"}), key="crb_accounts")
 
 #  BANK ANALYSIS
-def bank_analysis():
+def bank_analysis(pdf_password, password_guesses):
     st.subheader(" Bank Statement Analysis")
     uploaded_file = st.file_uploader("Upload Bank Statement (PDF or CSV):", type=["pdf", "csv"])
     if uploaded_file:
         if uploaded_file.type == "text/csv":
-            df = pd.read_csv(uploaded_file)
+            with stage("read_csv", bytes=uploaded_file.size):
+                df = read_statement_csv(uploaded_file)
+                record(transactions=len(df))
         else:
-            text = extract_text_from_pdf(uploaded_file)
+            text = extract_text_from_pdf(uploaded_file, password=pdf_password, candidates=password_guesses)
             df = parse_bank_from_text(text)
 
         st.write(" Bank Statement Loaded.")
@@ -148,23 +146,34 @@ def bank_analysis():
 
         if "Amount" in df.columns:
             total_inflow = df[df["Amount"] > 0]["Amount"].sum()
-            total_outflow = df[df["Amount"] < 0]["Amount"].sum().abs()
+            total_outflow = abs(df[df["Amount"] < 0]["Amount"].sum())
             trend = df["Amount"].cumsum()
 
             st.write(f"**Total Inflow:** KSh {total_inflow:,.2f}")
             st.write(f"**Total Outflow:** KSh {total_outflow:,.2f}")
 
-            fig, ax = plt.subplots()
-            trend.plot(title="Cash Flow Trend Over Time", ax=ax, color="green")
-            ax.set_xlabel("Transactions")
-            ax.set_ylabel("Cumulative Balance")
-            st.pyplot(fig)
+            show_chart("line", trend, title="Cash Flow Trend Over Time", color="green",
+                       xlabel="Transactions", ylabel="Cumulative Balance")
+
+            if "Date" in df.columns and df["Date"].notna().any():
+                details_col = next((c for c in ("Details", "Description", "Narration") if c in df.columns), None)
+                if "Category" not in df.columns and details_col:
+                    df["Category"] = df[details_col].astype(str).apply(categorize_mpesa)
+                with stage("cashflow_features"):
+                    features = features_for_document(upload_digest(uploaded_file), df)
+                st.subheader(" Cash-Flow Features")
+                st.dataframe(pd.Series(features, name="Value"))
 
 # MAIN TABS
 tabs = st.selectbox("Choose Analysis Type:", ["MPESA Statement", "CRB Report", "Bank Statement"])
+pdf_password = st.text_input("Enter PDF Password (if any):", type="password")
+password_hints = st.text_input("Applicant ID or phone number (tried as the PDF password, optional):")
+password_guesses = password_candidates(password_hints)
 if tabs == "MPESA Statement":
-    mpesa_analysis()
+    mpesa_analysis(pdf_password, password_guesses)
 elif tabs == "CRB Report":
-    crb_analysis()
+    crb_analysis(pdf_password, password_guesses)
 elif tabs == "Bank Statement":
-    bank_analysis()
+    bank_analysis(pdf_password, password_guesses)
+
+render_debug_panel(finish_request())